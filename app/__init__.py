@@ -20,12 +20,32 @@ def load_user(user_id):
     from app.models import User
     return User.query.get(int(user_id))
 
+# Bibliotecas pesadas que as rotas importam sob demanda. O master do Gunicorn as
+# carrega uma única vez antes do fork (preload), e os workers as herdam por copy-on-write.
+DEPENDENCIAS_PESADAS = (
+    'pandas',
+    'sklearn.cluster',
+    'sklearn.preprocessing',
+    'sklearn.metrics',
+    'googleapiclient.discovery',
+    'googleapiclient.http',
+    'google_auth_oauthlib.flow',
+    'google.auth.transport.requests',
+    'httpx',
+    'google.generativeai',
+    'sib_api_v3_sdk',
+)
+
+def precarregar_dependencias():
+    """Importa as bibliotecas pesadas de uma vez (usado pelo master do Gunicorn)."""
+    import importlib
+    for modulo in DEPENDENCIAS_PESADAS:
+        importlib.import_module(modulo)
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
-
     db.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
@@ -34,4 +54,16 @@ def create_app(config_class=Config):
     from app.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
+    from app.api import api as api_blueprint
+    app.register_blueprint(api_blueprint)
+
+    from app.metrics import init_metrics
+    init_metrics(app)
+
+    from app.assets import init_assets
+    init_assets(app)
+
+    from app.cache import cache_paginas
+    cache_paginas.max_entradas = app.config.get('CACHE_PAGINAS_MAX', 256)
+
     return app
\ No newline at end of file
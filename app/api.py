@@ -0,0 +1,105 @@
+"""
+API JSON com as séries dos gráficos (/api/v1/graficos/...).
+
+Os templates buscam essas séries de forma assíncrona em vez de recebê-las
+embutidas no HTML. As respostas passam pelo cache por versão dos dados
+(ETag/304, e cache longo no navegador quando a URL traz ?v=<token da versão>)
+e são comprimidas com brotli ou gzip conforme o Accept-Encoding do cliente.
+"""
+import gzip
+from flask import Blueprint, jsonify, request
+from flask_login import current_user, login_required
+from app.cache import cache_por_versao
+from app.dados import carregar_estudantes_df, segmentacao_do_usuario
+from app.utils import serie_contagem, serie_distribuicao_segmentos, serie_idade_por_segmento, serie_timeline_cadastros
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele as respostas usam só gzip
+    brotli = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+TAMANHO_MINIMO_COMPRESSAO = 500
+MAX_DIAS_TIMELINE = 365
+SERIE_VAZIA = {'labels': [], 'values': []}
+
+
+def _estudantes_df(*colunas):
+    return carregar_estudantes_df(current_user.id, colunas, 'api.read_sql')
+
+
+def _segmentos():
+    return segmentacao_do_usuario(current_user.id)['segmentos']
+
+
+def _limite():
+    return request.args.get('limite', type=int)
+
+
+@api.route('/graficos/cursos')
+@login_required
+@cache_por_versao
+def serie_cursos():
+    df = _estudantes_df('curso_interesse')
+    return jsonify(serie_contagem(df['curso_interesse'], _limite()) if not df.empty else SERIE_VAZIA)
+
+
+@api.route('/graficos/cidades')
+@login_required
+@cache_por_versao
+def serie_cidades():
+    df = _estudantes_df('cidade')
+    return jsonify(serie_contagem(df['cidade'], _limite()) if not df.empty else SERIE_VAZIA)
+
+
+@api.route('/graficos/dispositivos')
+@login_required
+@cache_por_versao
+def serie_dispositivos():
+    df = _estudantes_df('dispositivo_acesso')
+    return jsonify(serie_contagem(df['dispositivo_acesso'], _limite()) if not df.empty else SERIE_VAZIA)
+
+
+@api.route('/graficos/segmentos')
+@login_required
+@cache_por_versao
+def serie_segmentos():
+    return jsonify(serie_distribuicao_segmentos(_segmentos()))
+
+
+@api.route('/graficos/idade-por-segmento')
+@login_required
+@cache_por_versao
+def serie_idade_segmentos():
+    return jsonify(serie_idade_por_segmento(_segmentos()))
+
+
+@api.route('/graficos/timeline')
+@login_required
+@cache_por_versao
+def serie_timeline():
+    """Cadastros por dia; ?dias=N escolhe a janela (padrão 7, máximo 365)."""
+    dias = min(max(request.args.get('dias', 7, type=int), 1), MAX_DIAS_TIMELINE)
+    df = _estudantes_df('timestamp_cadastro')
+    return jsonify(serie_timeline_cadastros(df, dias) if not df.empty else SERIE_VAZIA)
+
+
+@api.after_request
+def comprimir(response):
+    """Comprime as respostas JSON com brotli (se disponível) ou gzip."""
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or not response.is_json):
+        return response
+    response.vary.add('Accept-Encoding')
+    dados = response.get_data()
+    if len(dados) < TAMANHO_MINIMO_COMPRESSAO:
+        return response
+    aceitos = request.accept_encodings
+    if brotli is not None and aceitos['br']:
+        response.set_data(brotli.compress(dados, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif aceitos['gzip']:
+        response.set_data(gzip.compress(dados, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
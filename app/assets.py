@@ -0,0 +1,97 @@
+"""
+Arquivos estáticos com hash do conteúdo no nome (css/style.3f2a9c1d.css).
+
+No build, `flask gerar-manifesto` grava app/static/manifest.json com o nome
+versionado de cada arquivo. Com o manifesto carregado, url_for('static', ...)
+passa a gerar as URLs versionadas, que são servidas com Cache-Control
+immutable de um ano: o navegador não volta a pedir o arquivo até o conteúdo
+(e portanto o nome) mudar. Sem manifesto, o mapa é calculado na inicialização;
+em modo debug os arquivos são servidos pelo nome original, sem cache.
+"""
+import hashlib
+import json
+import os
+import re
+import click
+from flask import send_from_directory
+
+NOME_MANIFESTO = 'manifest.json'
+MAX_AGE_IMUTAVEL = 31536000
+# style.3f2a9c1d.css -> style.css
+_PADRAO_VERSIONADO = re.compile(r'^(?P<base>.+)\.[0-9a-f]{8}(?P<ext>\.[^./]+)$')
+
+
+def _hash_arquivo(caminho):
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(65536), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()[:8]
+
+
+def gerar_manifesto(pasta_static):
+    """Mapeia cada arquivo da pasta estática ('css/style.css') para o nome versionado."""
+    manifesto = {}
+    for raiz, _, arquivos in os.walk(pasta_static):
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            relativo = os.path.relpath(caminho, pasta_static).replace(os.sep, '/')
+            if relativo == NOME_MANIFESTO:
+                continue
+            base, ext = os.path.splitext(relativo)
+            manifesto[relativo] = f"{base}.{_hash_arquivo(caminho)}{ext}"
+    return dict(sorted(manifesto.items()))
+
+
+def carregar_manifesto(pasta_static):
+    caminho = os.path.join(pasta_static, NOME_MANIFESTO)
+    if os.path.exists(caminho):
+        with open(caminho) as f:
+            return json.load(f)
+    print("Manifesto de arquivos estáticos não encontrado; calculando na inicialização.")
+    return gerar_manifesto(pasta_static)
+
+
+def versao_assets(manifesto):
+    """Resumo do manifesto, para invalidar o cache de páginas que citam URLs antigas."""
+    conteudo = json.dumps(manifesto, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(conteudo).hexdigest()[:12]
+
+
+def init_assets(app):
+    """Liga as URLs versionadas à rota 'static' e registra o comando de build."""
+
+    @app.cli.command('gerar-manifesto')
+    def gerar_manifesto_comando():
+        """Grava app/static/manifest.json com os nomes versionados dos arquivos estáticos."""
+        manifesto = gerar_manifesto(app.static_folder)
+        with open(os.path.join(app.static_folder, NOME_MANIFESTO), 'w') as f:
+            json.dump(manifesto, f, indent=2)
+        click.echo(f"{len(manifesto)} arquivos no manifesto.")
+
+    if app.debug or not app.config.get('ASSETS_VERSIONADOS', True):
+        app.config['ASSETS_VERSAO'] = None
+        return
+
+    manifesto = carregar_manifesto(app.static_folder)
+    originais = {versionado: original for original, versionado in manifesto.items()}
+    app.config['ASSETS_VERSAO'] = versao_assets(manifesto)
+
+    @app.url_defaults
+    def url_versionada(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifesto:
+            values['filename'] = manifesto[values['filename']]
+
+    def servir_static(filename):
+        original = originais.get(filename)
+        if original is not None:
+            resposta = send_from_directory(app.static_folder, original, max_age=MAX_AGE_IMUTAVEL)
+            resposta.headers['Cache-Control'] = f'public, max-age={MAX_AGE_IMUTAVEL}, immutable'
+            return resposta
+        # Hash antigo (página gerada antes do deploy): serve o arquivo atual sem cache longo
+        encontrado = _PADRAO_VERSIONADO.match(filename)
+        if encontrado and encontrado['base'] + encontrado['ext'] in manifesto:
+            filename = encontrado['base'] + encontrado['ext']
+        return app.send_static_file(filename)
+
+    app.view_functions['static'] = servir_static
@@ -0,0 +1,208 @@
+"""
+Cache das páginas de análise por versão dos dados do usuário.
+
+Cada usuário tem uma versão (VersaoDados) que é incrementada quando seus dados
+mudam. As páginas decoradas com @cache_por_versao são guardadas por
+(usuário, rota) junto com a versão em que foram geradas, e respondem com ETag:
+recarregar uma página sem mudanças custa só a consulta da versão (304 ou HTML
+já pronto), sem pandas, scikit-learn ou Gemini.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from flask import current_app, g, has_request_context, make_response, request, session
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import VersaoDados
+
+
+def versao_dados(user_id):
+    """Versão atual dos dados do usuário (0 se nunca houve ingestão)."""
+    registro = db.session.get(VersaoDados, user_id)
+    return registro.versao if registro else 0
+
+
+def incrementar_versao_dados(user_id):
+    """Incrementa a versão dos dados do usuário. Deve ser chamada antes do commit da alteração."""
+    # O k da segmentação vale só para a versão em que foi escolhido
+    atualizados = VersaoDados.query.filter_by(user_id=user_id).update({VersaoDados.versao: VersaoDados.versao + 1,
+                                                                       VersaoDados.segmentos_k: None})
+    if atualizados:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(VersaoDados(user_id=user_id, versao=1))
+    except IntegrityError:
+        # Outra requisição criou o registro ao mesmo tempo
+        VersaoDados.query.filter_by(user_id=user_id).update({VersaoDados.versao: VersaoDados.versao + 1,
+                                                             VersaoDados.segmentos_k: None})
+
+
+def k_da_versao(user_id):
+    """(versão atual dos dados, k da segmentação já escolhido nela ou None)."""
+    registro = db.session.get(VersaoDados, user_id)
+    return (registro.versao, registro.segmentos_k) if registro else (0, None)
+
+
+def registrar_k_da_versao(user_id, versao, k):
+    """
+    Grava o k escolhido para a `versao` se nenhum worker gravou antes e devolve o
+    k que vale para ela (o de quem gravou primeiro). Se a versão já mudou, devolve `k`.
+    """
+    gravados = (VersaoDados.query
+                .filter(VersaoDados.user_id == user_id, VersaoDados.versao == versao,
+                        VersaoDados.segmentos_k.is_(None))
+                .update({VersaoDados.segmentos_k: k}, synchronize_session=False))
+    db.session.commit()
+    if gravados:
+        return k
+    atual, registrado = k_da_versao(user_id)
+    return registrado if atual == versao and registrado is not None else k
+
+
+class CachePaginas:
+    """LRU em memória (por worker) com uma entrada por (usuário, rota)."""
+
+    def __init__(self, max_entradas=256):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, versao):
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada[0] != versao:
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada[1]
+
+    def guardar(self, chave, versao, conteudo):
+        with self._trava:
+            self._entradas[chave] = (versao, conteudo)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+
+
+cache_paginas = CachePaginas()
+
+
+@lru_cache(maxsize=None)
+def _versao_templates(pasta):
+    """Hash dos templates, para que um deploy com layout novo invalide os ETags antigos."""
+    resumo = hashlib.sha1()
+    for raiz, _, arquivos in sorted(os.walk(pasta)):
+        for nome in sorted(arquivos):
+            with open(os.path.join(raiz, nome), 'rb') as f:
+                resumo.update(f.read())
+    return resumo.hexdigest()[:12]
+
+
+def _versao_app():
+    # Inclui a versão dos arquivos estáticos: o HTML guardado cita as URLs versionadas deles
+    return current_app.config.get('APP_VERSION') or "{}-{}".format(
+        _versao_templates(os.path.join(current_app.root_path, current_app.template_folder)),
+        current_app.config.get('ASSETS_VERSAO'))
+
+
+def gerar_etag(user_id, versao, rota):
+    """ETag determinístico: igual em todos os workers para a mesma versão dos dados."""
+    base = f"{_versao_app()}:{user_id}:{versao}:{rota}"
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()
+
+
+def token_versao(user_id, versao):
+    """
+    Token usado como ?v= nas URLs da API de gráficos. Muda quando os dados do
+    usuário mudam, então a resposta dessa URL pode ficar no cache do navegador.
+    """
+    base = f"{_versao_app()}:{user_id}:{versao}"
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()[:16]
+
+
+cache_resultados = CachePaginas(max_entradas=32)
+
+
+def memorizar_por_versao(nome, user_id, produzir):
+    """
+    Guarda o resultado de um cálculo caro (ex.: segmentação) enquanto os dados do
+    usuário não mudarem. O resultado fica em memória em cada worker: use para
+    agregados pequenos (dicts, listas de totais), nunca para DataFrames inteiros.
+    """
+    if not current_app.config.get('CACHE_PAGINAS_ATIVO', True):
+        return produzir()
+    versao = versao_dados(user_id)
+    chave = (user_id, nome)
+    resultado = cache_resultados.obter(chave, versao)
+    if resultado is None:
+        resultado = produzir()
+        cache_resultados.guardar(chave, versao, resultado)
+    return resultado
+
+
+def guardar_por_versao(nome, user_id, versao, resultado):
+    """Guarda para memorizar_por_versao um resultado já calculado com os dados da `versao`."""
+    if current_app.config.get('CACHE_PAGINAS_ATIVO', True):
+        cache_resultados.guardar((user_id, nome), versao, resultado)
+
+
+def nao_guardar_em_cache():
+    """
+    Impede que a resposta da requisição atual entre no cache por versão (nem
+    como ETag): ex.: uma página montada com os insights de contingência porque o
+    Gemini falhou deve ser gerada de novo no próximo acesso.
+    """
+    if has_request_context():
+        g.nao_guardar_em_cache = True
+
+
+def cache_por_versao(view):
+    """
+    Responde 304 quando o navegador já tem a versão atual da página (ou JSON) e
+    serve o conteúdo guardado quando outro acesso já o gerou. Use depois de
+    @login_required. Disponibiliza g.versao_dados e g.token_versao para a view.
+
+    Os ETags são fracos: a mesma versão dos dados pode gerar bytes diferentes
+    (insights do Gemini, compressão), mas o conteúdo é equivalente.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Mensagens flash pendentes fazem parte do HTML; nesse caso a página é gerada normalmente
+        if not current_app.config.get('CACHE_PAGINAS_ATIVO', True) or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        rota = request.full_path
+        versao = versao_dados(current_user.id)
+        g.versao_dados = versao
+        g.token_versao = token_versao(current_user.id, versao)
+        etag = gerar_etag(current_user.id, versao, rota)
+        if request.if_none_match.contains_weak(etag):
+            resposta = make_response('', 304)
+        else:
+            chave = (current_user.id, rota)
+            guardado = cache_paginas.obter(chave, versao)
+            if guardado is None:
+                resposta = make_response(view(*args, **kwargs))
+                # Redirecionamentos (ex.: sem dados), erros e respostas provisórias não entram no cache
+                if resposta.status_code != 200 or g.get('nao_guardar_em_cache'):
+                    return resposta
+                cache_paginas.guardar(chave, versao, (resposta.get_data(), resposta.mimetype))
+            else:
+                conteudo, mimetype = guardado
+                resposta = make_response(conteudo)
+                resposta.mimetype = mimetype
+        resposta.set_etag(etag, weak=True)
+        if request.args.get('v') == g.token_versao:
+            # URL com o token da versão atual: o conteúdo dela nunca muda
+            resposta.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        else:
+            resposta.headers['Cache-Control'] = 'private, no-cache'
+        return resposta
+    return wrapper
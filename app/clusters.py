@@ -0,0 +1,187 @@
+"""
+Escolha automática do número de segmentos do K-Means (ml_analysis).
+
+Cada k de SEGMENTOS_K_MIN a SEGMENTOS_K_MAX é avaliado numa amostra
+estratificada por curso (SEGMENTOS_AMOSTRA linhas), em paralelo nos processos do
+pool reutilizável do joblib (loky), com a silhueta ou o cotovelo da inércia
+(SEGMENTOS_CRITERIO). A escolha respeita SEGMENTOS_ORCAMENTO_SEGUNDOS: vale o
+melhor k entre os avaliados até o prazo, e se nenhum terminou a tempo usa-se
+SEGMENTOS_NUM_CLUSTERS. Os centros do k escolhido inicializam o ajuste final
+nos dados completos, que então precisa de uma única inicialização.
+
+Como o resultado depende do que termina dentro do prazo, o k escolhido é
+gravado com a versão dos dados (VersaoDados.segmentos_k, app/dados.py); os
+outros workers refazem só o ajuste desse k com centros_da_amostra() e chegam
+aos mesmos segmentos.
+
+Subir o pool (processos novos importando a aplicação e o scikit-learn) leva
+mais que o orçamento; por isso o gunicorn.conf.py o aquece em cada worker logo
+após o fork, com aquecer_pool().
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from flask import current_app, has_app_context
+
+CRITERIOS = ('silhueta', 'cotovelo')
+# A silhueta é O(n²): cada avaliação a calcula sobre no máximo esta quantidade de linhas
+AMOSTRA_SILHUETA = 2000
+
+
+def _config(chave, padrao):
+    return current_app.config.get(chave, padrao) if has_app_context() else padrao
+
+
+def amostra_estratificada(estratos, tamanho, seed=42):
+    """Posições de uma amostra de até `tamanho` linhas com a proporção de cada estrato (ex.: curso)."""
+    import numpy as np
+    import pandas as pd
+    estratos = pd.Series(pd.Categorical(estratos)).reset_index(drop=True)
+    if len(estratos) <= tamanho:
+        return np.arange(len(estratos))
+    fracao = tamanho / len(estratos)
+    amostra = estratos.groupby(estratos, observed=True, group_keys=False).sample(frac=fracao, random_state=seed)
+    return np.sort(amostra.index.to_numpy())
+
+
+def _avaliar_k(features, k, criterio, seed=42):
+    """Ajusta o K-Means com `k` grupos na amostra. Devolve (k, pontuação, inércia, centros)."""
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import silhouette_score
+    kmeans = KMeans(n_clusters=k, random_state=seed, n_init=3).fit(features)
+    pontuacao = None
+    if criterio == 'silhueta' and len(set(kmeans.labels_)) > 1:
+        pontuacao = float(silhouette_score(features, kmeans.labels_, random_state=seed,
+                                           sample_size=min(len(features), AMOSTRA_SILHUETA)))
+    return k, pontuacao, float(kmeans.inertia_), kmeans.cluster_centers_
+
+
+def _cotovelo(avaliacoes):
+    """k no joelho da curva de inércia: o ponto mais distante da reta entre o primeiro e o último k."""
+    pontos = sorted((k, inercia) for k, _, inercia, _ in avaliacoes)
+    if len(pontos) < 3:
+        return pontos[0][0]
+    (k0, i0), (k1, i1) = pontos[0], pontos[-1]
+    escala_k, escala_i = (k1 - k0) or 1, (i0 - i1) or 1
+
+    def distancia(ponto):
+        # Fração do k percorrida contra fração da queda de inércia já obtida
+        x, y = (ponto[0] - k0) / escala_k, (i0 - ponto[1]) / escala_i
+        return y - x
+    return max(pontos, key=distancia)[0]
+
+
+def _numero_de_processos():
+    """Tamanho do pool; é sempre o mesmo, porque o loky reinicia o pool quando ele muda."""
+    processos = _config('SEGMENTOS_PROCESSOS', 2) or os.cpu_count() or 1
+    return min(processos, _config('SEGMENTOS_K_MAX', 8) - _config('SEGMENTOS_K_MIN', 2) + 1)
+
+
+def _importar_sklearn():
+    import sklearn.cluster  # noqa: F401
+    import sklearn.metrics  # noqa: F401
+
+
+def _executor(processos):
+    """
+    Pool reutilizável do loky. timeout=None: sem isso os processos encerram após
+    10 s ociosos e o próximo ml_analysis teria de subi-los de novo, gastando o orçamento.
+    """
+    from joblib.externals.loky import get_reusable_executor
+    return get_reusable_executor(max_workers=processos, timeout=None)
+
+
+def aquecer_pool():
+    """Sobe o pool de processos e importa o scikit-learn neles, sem esperar (usado no post_fork)."""
+    if not _config('SEGMENTOS_K_AUTOMATICO', True):
+        return
+    processos = _numero_de_processos()
+    if processos > 1:
+        executor = _executor(processos)
+        for _ in range(processos):
+            executor.submit(_importar_sklearn)
+
+
+def _executar_em_paralelo(features, ks, criterio, processos, prazo):
+    """Avalia os `ks` no pool de processos até o prazo; os que não terminaram a tempo ficam de fora."""
+    executor = _executor(processos)
+    pendentes = {executor.submit(_avaliar_k, features, k, criterio) for k in ks}
+    avaliacoes = []
+    while pendentes:
+        restante = prazo - time.perf_counter()
+        if restante <= 0:
+            break
+        prontos, pendentes = wait(pendentes, timeout=restante, return_when=FIRST_COMPLETED)
+        avaliacoes.extend(futuro.result() for futuro in prontos if futuro.exception() is None)
+    # Os que ainda não começaram são cancelados; os em execução terminam no pool e são descartados
+    for futuro in pendentes:
+        futuro.cancel()
+    return avaliacoes
+
+
+def _executar_em_sequencia(features, ks, criterio, prazo):
+    avaliacoes = []
+    for k in ks:
+        if time.perf_counter() >= prazo:
+            break
+        avaliacoes.append(_avaliar_k(features, k, criterio))
+    return avaliacoes
+
+
+def _amostra(features, estratos):
+    import numpy as np
+    return np.asarray(features)[amostra_estratificada(estratos, _config('SEGMENTOS_AMOSTRA', 5000))]
+
+
+def centros_da_amostra(features, estratos, k):
+    """
+    Centros do K-Means com `k` grupos na mesma amostra de escolher_num_clusters():
+    para um k já escolhido, refaz o resultado dele sem avaliar os demais. None se
+    a amostra tiver menos de k linhas.
+    """
+    amostra = _amostra(features, estratos)
+    if len(amostra) < k:
+        return None
+    # O critério não altera os centros; 'cotovelo' só evita calcular a silhueta
+    return _avaliar_k(amostra, k, 'cotovelo')[3]
+
+
+def escolher_num_clusters(features, estratos):
+    """
+    Escolhe o número de segmentos para `features` (matriz já codificada).
+    `estratos` (ex.: o curso de cada linha) orienta a amostragem. Devolve
+    (k, centros da amostra ou None, quantos k foram avaliados).
+    """
+    inicio = time.perf_counter()
+    padrao = _config('SEGMENTOS_NUM_CLUSTERS', 3)
+    criterio = _config('SEGMENTOS_CRITERIO', 'silhueta')
+    if criterio not in CRITERIOS:
+        raise ValueError(f"SEGMENTOS_CRITERIO deve ser um de {CRITERIOS}, não '{criterio}'.")
+    prazo = inicio + _config('SEGMENTOS_ORCAMENTO_SEGUNDOS', 2.0)
+
+    amostra = _amostra(features, estratos)
+    # A silhueta exige 2 <= k <= amostras - 1
+    ks = list(range(_config('SEGMENTOS_K_MIN', 2), min(_config('SEGMENTOS_K_MAX', 8), len(amostra) - 1) + 1))
+    if not ks:
+        return min(padrao, len(features)), None, 0
+
+    processos = _numero_de_processos()
+    if processos > 1 and len(ks) > 1:
+        avaliacoes = _executar_em_paralelo(amostra, ks, criterio, processos, prazo)
+    else:
+        avaliacoes = _executar_em_sequencia(amostra, ks, criterio, prazo)
+
+    if criterio == 'silhueta':
+        avaliacoes = [a for a in avaliacoes if a[1] is not None]
+    if not avaliacoes:
+        print(f"Escolha de k: nenhum k avaliado em {time.perf_counter() - inicio:.2f} s; usando k={padrao}.")
+        return min(padrao, len(features)), None, 0
+
+    if criterio == 'silhueta':
+        k = max(avaliacoes, key=lambda a: a[1])[0]
+    else:
+        k = _cotovelo(avaliacoes)
+    centros = next(a[3] for a in avaliacoes if a[0] == k)
+    print(f"Escolha de k: k={k} entre {len(avaliacoes)}/{len(ks)} valores ({criterio}, "
+          f"{len(amostra)} linhas, {processos} processos) em {time.perf_counter() - inicio:.2f} s.")
+    return k, centros, len(avaliacoes)
@@ -0,0 +1,176 @@
+"""
+Carregamento dos dados de estudantes para as rotas de análise e para a API de gráficos.
+"""
+from flask import current_app, g
+from sqlalchemy import func, select
+from app.cache import guardar_por_versao, k_da_versao, memorizar_por_versao, registrar_k_da_versao
+from app.metrics import medir_etapa
+from app.models import Cidade, Curso, Estudante
+from app.remocao import estudantes_visiveis
+from app.replica import consultar_analitico
+from app.utils import mais_frequentes, segmentar_estudantes
+
+
+# Colunas que as análises podem pedir; 'nome' só é lido quando a tela lista os estudantes
+COLUNAS_ANALISE = ('id', 'nome', 'idade', 'cidade', 'curso_interesse', 'timestamp_cadastro', 'dispositivo_acesso')
+# Colunas usadas pela segmentação e pela lista de estudantes de cada perfil
+COLUNAS_SEGMENTACAO = ('id', 'nome', 'idade', 'cidade', 'curso_interesse')
+# cidade e curso_interesse vêm das dimensões: a consulta lê só o id e o DataFrame
+# monta a categoria a partir da tabela da dimensão, sem trafegar os textos
+DIMENSOES = {'cidade': (Estudante.cidade_id, Cidade), 'curso_interesse': (Estudante.curso_id, Curso)}
+COLUNAS_CATEGORICAS = ('cidade', 'curso_interesse', 'dispositivo_acesso')
+
+
+def _reduzir_idade(idades):
+    """Idade como inteiro de 16 bits com nulos (Int16), ou 32 bits se algum valor não couber."""
+    import pandas as pd
+    idades = pd.to_numeric(idades, errors='coerce')
+    maximo = idades.abs().max()
+    return idades.astype('Int32' if pd.notna(maximo) and maximo > 32767 else 'Int16')
+
+
+def _ler_dimensao(conexao, coluna, modelo, user_id):
+    """
+    (posição de cada id, nomes) de uma dimensão, para montar Categoricals a partir
+    dos ids. Lê só as linhas citadas pelos estudantes do usuário, não a tabela inteira.
+    """
+    import numpy as np
+    usados = select(coluna).where(Estudante.user_id == user_id, coluna.is_not(None)).distinct()
+    linhas = conexao.execute(select(modelo.id, modelo.nome).where(modelo.id.in_(usados))
+                             .order_by(modelo.id)).all()
+    ids = np.array([linha[0] for linha in linhas], dtype='int64')
+    posicoes = np.full(int(ids.max()) + 1 if len(ids) else 1, -1, dtype='int64')
+    posicoes[ids] = np.arange(len(ids))
+    return posicoes, [linha[1] for linha in linhas]
+
+
+def _categoria_da_dimensao(ids, dimensao):
+    import numpy as np
+    import pandas as pd
+    posicoes, nomes = dimensao
+    valores = pd.to_numeric(ids, errors='coerce').fillna(-1).astype('int64').to_numpy()
+    validos = (valores >= 0) & (valores < len(posicoes))
+    codigos = np.where(validos, posicoes[np.where(validos, valores, 0)], -1)
+    return pd.Categorical.from_codes(codigos, categories=nomes)
+
+
+def _compactar(df, dimensoes):
+    """Converte os ids das dimensões e os textos repetitivos em categorias e reduz a idade."""
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in dimensoes:
+            df[coluna] = _categoria_da_dimensao(df[coluna], dimensoes[coluna])
+        elif coluna in df:
+            df[coluna] = df[coluna].astype('category')
+    if 'idade' in df:
+        df['idade'] = _reduzir_idade(df['idade'])
+    return df
+
+
+def _concatenar(partes):
+    """Junta os blocos lidos mantendo as colunas categóricas (com a união das categorias)."""
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+    if len(partes) == 1:
+        return partes[0]
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in partes[0]:
+            categorias = union_categoricals([p[coluna] for p in partes]).categories
+            for parte in partes:
+                parte[coluna] = parte[coluna].cat.set_categories(categorias)
+    return pd.concat(partes, ignore_index=True)
+
+
+def consulta_estudantes(user_id, colunas=COLUNAS_ANALISE):
+    """SELECT das `colunas` dos estudantes visíveis do usuário (cidade/curso como ids das dimensões)."""
+    selecionadas = [DIMENSOES[c][0].label(c) if c in DIMENSOES else getattr(Estudante, c) for c in colunas]
+    return (select(*selecionadas).where(Estudante.user_id == user_id, estudantes_visiveis())
+            .order_by(Estudante.id))
+
+
+def consulta_contagem(user_id):
+    """SELECT do total de estudantes visíveis do usuário."""
+    return (select(func.count()).select_from(Estudante)
+            .where(Estudante.user_id == user_id, estudantes_visiveis()))
+
+
+def carregar_estudantes_df(user_id, colunas=COLUNAS_ANALISE, etapa='read_sql', chunksize=None):
+    """
+    DataFrame com as `colunas` pedidas dos estudantes do usuário, lido da réplica
+    quando possível. cidade/curso_interesse/dispositivo_acesso vêm como category
+    e idade como Int16. A leitura é feita em blocos de `chunksize` linhas
+    (padrão ANALISE_CHUNKSIZE), compactados um a um, para que o resultado
+    completo nunca exista em memória como objetos Python.
+    """
+    import pandas as pd
+    chunksize = chunksize or current_app.config.get('ANALISE_CHUNKSIZE', 50000)
+    consulta = consulta_estudantes(user_id, colunas)
+
+    def ler(engine):
+        with engine.connect() as conexao:
+            dimensoes = {c: _ler_dimensao(conexao, *DIMENSOES[c], user_id) for c in colunas if c in DIMENSOES}
+            conexao = conexao.execution_options(stream_results=True)
+            partes = [_compactar(bloco, dimensoes) for bloco in pd.read_sql(consulta, conexao, chunksize=chunksize)]
+        if not partes:
+            return _compactar(pd.DataFrame(columns=list(colunas)), dimensoes)
+        return _concatenar(partes)
+
+    with medir_etapa(etapa):
+        return consultar_analitico(ler, user_id)
+
+
+def contar_estudantes(user_id):
+    """Total de estudantes do usuário, contado na réplica quando possível."""
+    consulta = consulta_contagem(user_id)
+
+    def contar(engine):
+        with engine.connect() as conexao:
+            return conexao.execute(consulta).scalar()
+    return consultar_analitico(contar, user_id)
+
+
+def _segmentar(user_id):
+    """
+    (segmentos com a lista de alunos, resumo da segmentação) calculados a partir do
+    banco. O k escolhido automaticamente é gravado na versão dos dados: a página e
+    os gráficos, em qualquer worker, mostram os mesmos perfis.
+    """
+    versao, k = k_da_versao(user_id)
+    df = carregar_estudantes_df(user_id, COLUNAS_SEGMENTACAO, 'ml_analysis.read_sql')
+    if len(df) < 3:
+        return [], {'total_estudantes': len(df), 'segmentos': []}
+    df, segmentos = segmentar_estudantes(df, k_escolhido=k)
+    # Sem registro de versão (nenhuma ingestão pelo app) não há onde gravar o k
+    if k is None and versao and current_app.config.get('SEGMENTOS_K_AUTOMATICO', True):
+        escolhido = df.attrs['num_clusters']
+        k = registrar_k_da_versao(user_id, versao, escolhido)
+        if k != escolhido:
+            # Outro worker escolheu antes para esta versão: vale o k dele
+            df, segmentos = segmentar_estudantes(df, k_escolhido=k)
+    resumo = {'total_estudantes': len(df), 'idade_media_geral': round(float(df['idade'].mean()), 1),
+              'cursos_populares': mais_frequentes(df['curso_interesse']),
+              'cidades_principais': mais_frequentes(df['cidade']),
+              'segmentos': [{k: v for k, v in s.items() if k != 'alunos'} for s in segmentos]}
+    return segmentos, resumo
+
+
+def segmentacao_do_usuario(user_id):
+    """
+    Resumo da segmentação (totais, valores mais frequentes e perfis, sem a lista
+    de alunos), calculado uma vez por versão dos dados e usado pela API de
+    gráficos. Com menos de 3 estudantes a lista de segmentos vem vazia.
+    """
+    return memorizar_por_versao('segmentacao', user_id, lambda: _segmentar(user_id)[1])
+
+
+def segmentacao_com_alunos(user_id):
+    """
+    (segmentos com a lista de alunos, resumo) para a página ml_analysis. A página
+    já fica no cache por versão; aqui só o resumo é guardado, para que os gráficos
+    que ela carrega em seguida não rodem o K-Means de novo.
+    """
+    # A versão lida por @cache_por_versao antes da consulta (ausente com o cache desligado)
+    versao = g.get('versao_dados')
+    segmentos, resumo = _segmentar(user_id)
+    if versao is not None:
+        guardar_por_versao('segmentacao', user_id, versao, resumo)
+    return segmentos, resumo
@@ -0,0 +1,134 @@
+"""
+Tabelas de dimensão de cidades e cursos.
+
+Os textos vindos dos formulários são canonicalizados antes de virar uma linha de
+Cidade/Curso: espaços repetidos são colapsados, maiúsculas/minúsculas e acentos
+são ignorados na comparação e, nas cidades, o sufixo de UF ("/SP", " - RJ") é
+removido. Assim "São Paulo", "sao paulo " e "SÃO PAULO/SP" viram a mesma cidade.
+Durante uma importação, CacheDimensoes guarda chave -> id em memória para que
+cada texto distinto custe no máximo uma consulta.
+"""
+import re
+import unicodedata
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Cidade, Curso
+
+TAMANHO_MAXIMO = 100
+# Chaves por consulta em CacheDimensoes.precarregar()
+LOTE_PRECARGA = 500
+_ESPACOS = re.compile(r'\s+')
+_SUFIXO_UF = re.compile(r'\s*[/-]\s*[A-Za-z]{2}$')
+_PARTICULAS = {'de', 'da', 'do', 'das', 'dos', 'e'}
+
+
+def normalizar_espacos(texto):
+    return _ESPACOS.sub(' ', texto).strip()
+
+
+def remover_acentos(texto):
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def chave_canonica(texto):
+    """Chave de comparação: sem acentos, sem diferença de maiúsculas e com espaços simples."""
+    return remover_acentos(normalizar_espacos(texto)).casefold()[:TAMANHO_MAXIMO]
+
+
+def nome_exibicao(texto):
+    """Nome exibido: o texto como veio, mas textos todo em minúsculas ou maiúsculas viram 'Título'."""
+    texto = normalizar_espacos(texto)
+    if texto.islower() or texto.isupper():
+        palavras = texto.lower().split(' ')
+        texto = ' '.join(p if i and p in _PARTICULAS else p.capitalize() for i, p in enumerate(palavras))
+    return texto[:TAMANHO_MAXIMO]
+
+
+def limpar_cidade(texto):
+    return _SUFIXO_UF.sub('', normalizar_espacos(texto))
+
+
+PREPARO = {Cidade: limpar_cidade, Curso: normalizar_espacos}
+
+
+def obter_ou_criar(modelo, chave, nome):
+    """Id da linha da dimensão com essa chave, criando-a se for nova."""
+    registro = modelo.query.filter_by(chave=chave).first()
+    if registro:
+        return registro.id
+    try:
+        with db.session.begin_nested():
+            registro = modelo(chave=chave, nome=nome)
+            db.session.add(registro)
+        return registro.id
+    except IntegrityError:
+        # Outra importação criou a mesma linha ao mesmo tempo
+        return modelo.query.filter_by(chave=chave).first().id
+
+
+class CacheDimensoes:
+    """
+    Cache chave -> id das dimensões, válido durante uma importação (uma transação)
+    ou, se limpar() for chamado a cada rollback, durante várias.
+    """
+
+    def __init__(self):
+        self._ids = {Cidade: {}, Curso: {}}
+
+    def _chave(self, modelo, texto):
+        if texto is None:
+            return None, None
+        texto = PREPARO[modelo](str(texto))
+        if not texto:
+            return None, None
+        return chave_canonica(texto), texto
+
+    def precarregar(self, modelo, textos):
+        """
+        Busca de uma vez (WHERE chave IN ...) os ids dos textos ainda fora do cache,
+        em vez de uma consulta por texto distinto. Os que não existem são criados
+        depois, em resolver().
+        """
+        ids = self._ids[modelo]
+        chaves = {self._chave(modelo, texto)[0] for texto in textos}
+        chaves = [chave for chave in chaves if chave is not None and chave not in ids]
+        for inicio in range(0, len(chaves), LOTE_PRECARGA):
+            lote = chaves[inicio:inicio + LOTE_PRECARGA]
+            ids.update(db.session.query(modelo.chave, modelo.id).filter(modelo.chave.in_(lote)).all())
+
+    def precarregar_respostas(self, linhas, column_map):
+        """precarregar() das colunas de cidade e curso de respostas de formulário (listas de células)."""
+        for modelo, campo in ((Cidade, 'cidade'), (Curso, 'curso_interesse')):
+            indice = column_map.get(campo)
+            if indice is not None:
+                self.precarregar(modelo, (row[indice] for row in linhas if len(row) > indice))
+
+    def resolver(self, modelo, texto):
+        chave, texto = self._chave(modelo, texto)
+        if chave is None:
+            return None
+        ids = self._ids[modelo]
+        if chave not in ids:
+            ids[chave] = obter_ou_criar(modelo, chave, nome_exibicao(texto))
+        return ids[chave]
+
+    def limpar(self):
+        """Esquece os ids guardados; use depois de um rollback, que pode ter desfeito linhas novas."""
+        for ids in self._ids.values():
+            ids.clear()
+
+    def id_cidade(self, texto):
+        return self.resolver(Cidade, texto)
+
+    def id_curso(self, texto):
+        return self.resolver(Curso, texto)
+
+    def converter_linhas(self, linhas):
+        """Troca 'cidade'/'curso_interesse' (texto) por 'cidade_id'/'curso_id' em dicionários de inserção em massa."""
+        self.precarregar(Cidade, (linha.get('cidade') for linha in linhas))
+        self.precarregar(Curso, (linha.get('curso_interesse') for linha in linhas))
+        for linha in linhas:
+            linha['cidade_id'] = self.id_cidade(linha.pop('cidade', None))
+            linha['curso_id'] = self.id_curso(linha.pop('curso_interesse', None))
+        return linhas
@@ -0,0 +1,83 @@
+"""
+Cliente assíncrono (httpx) das APIs do Google usadas pela rota search_sheets.
+
+A rota passa quase todo o tempo esperando o Google. As chamadas independentes
+(o forms.get de cada formulário encontrado no Drive) saem juntas, até
+GOOGLE_CONCORRENCIA por vez, em vez de uma depois da outra. A view continua
+síncrona: ela roda formularios_com_planilhas() com asyncio.run() num laço de
+eventos só seu, e o banco e o template ficam fora dele. As chamadas são
+cronometradas pela camada de métricas como as do googleapiclient.
+
+Se GOOGLE_API_ENDPOINT estiver definido, as chamadas vão para esse servidor
+(usado nos testes de carga), como em build_google_service().
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from flask import current_app
+from app.metrics import medir_google
+
+# Raiz de cada API; com GOOGLE_API_ENDPOINT todas usam o endpoint informado
+RAIZES = {
+    'drive': 'https://www.googleapis.com/drive/v3/',
+    'forms': 'https://forms.googleapis.com/',
+}
+
+
+class CredenciaisGoogleExpiradas(Exception):
+    """O Google recusou o token de acesso (401): o usuário precisa reconectar a conta."""
+
+
+def _url(servico, caminho):
+    endpoint = os.environ.get('GOOGLE_API_ENDPOINT')
+    return (endpoint.rstrip('/') + '/' if endpoint else RAIZES[servico]) + caminho
+
+
+@asynccontextmanager
+async def cliente_google():
+    """Cliente HTTP assíncrono, aberto e fechado dentro da requisição."""
+    import httpx
+    async with httpx.AsyncClient(timeout=current_app.config.get('GOOGLE_TIMEOUT_SEGUNDOS', 30)) as cliente:
+        yield cliente
+
+
+async def _get(cliente, credentials, method_id, servico, caminho, params=None):
+    with medir_google(method_id):
+        resposta = await cliente.get(_url(servico, caminho), params=params,
+                                     headers={'Authorization': f'Bearer {credentials.token}'})
+        if resposta.status_code == 401:
+            raise CredenciaisGoogleExpiradas(f'Token has been expired or revoked ({method_id}).')
+        resposta.raise_for_status()
+        return resposta.json()
+
+
+async def listar_formularios(cliente, credentials):
+    """Os 50 Google Forms modificados mais recentemente no Drive do usuário."""
+    resultado = await _get(cliente, credentials, 'drive.files.list', 'drive', 'files', params={
+        'q': "mimeType='application/vnd.google-apps.form'", 'pageSize': 50,
+        'fields': 'files(id, name, modifiedTime, webViewLink)', 'orderBy': 'modifiedTime desc'})
+    return resultado.get('files', [])
+
+
+async def formularios_com_planilhas(credentials):
+    """
+    Lista os formulários do Drive e busca, ao mesmo tempo, a planilha de
+    respostas de cada um (response_sheet_id; None se a consulta falhar).
+    """
+    limite = asyncio.Semaphore(current_app.config.get('GOOGLE_CONCORRENCIA', 10))
+
+    async def com_planilha(cliente, form):
+        try:
+            async with limite:
+                info = await _get(cliente, credentials, 'forms.forms.get', 'forms', f"v1/forms/{form['id']}")
+            form['response_sheet_id'] = info.get('linkedSheetId')
+        except CredenciaisGoogleExpiradas:
+            raise
+        except Exception as e:
+            print(f"Erro ao buscar info do formulário {form['name']}: {e}")
+            form['response_sheet_id'] = None
+        return form
+
+    async with cliente_google() as cliente:
+        forms = await listar_formularios(cliente, credentials)
+        return list(await asyncio.gather(*(com_planilha(cliente, form) for form in forms)))
@@ -1,5 +1,7 @@
 import os
 import json
+from functools import lru_cache
+from app.metrics import medir_google
 
 def get_google_client_secret():
     """
@@ -18,4 +20,32 @@ def get_google_client_secret():
         return filepath
     
     # Se a variável de ambiente não existir, usa o arquivo local (para desenvolvimento)
-    return 'client_secret.json'
\ No newline at end of file
+    return 'client_secret.json'
+
+
+@lru_cache(maxsize=None)
+def _classe_request_instrumentada():
+    """HttpRequest do googleapiclient que registra o tempo de cada execute()."""
+    from googleapiclient.http import HttpRequest
+
+    class InstrumentedHttpRequest(HttpRequest):
+        def execute(self, http=None, num_retries=0):
+            with medir_google(self.methodId):
+                return super().execute(http=http, num_retries=num_retries)
+
+    return InstrumentedHttpRequest
+
+
+def build_google_service(nome, versao, credentials):
+    """
+    Cria um cliente das APIs do Google (Sheets, Drive, Forms...) cujas chamadas
+    são cronometradas pela camada de métricas. Se GOOGLE_API_ENDPOINT estiver
+    definido, as chamadas vão para esse servidor (usado nos testes de carga).
+    """
+    from googleapiclient.discovery import build
+    client_options = None
+    endpoint = os.environ.get('GOOGLE_API_ENDPOINT')
+    if endpoint:
+        client_options = {'api_endpoint': endpoint}
+    return build(nome, versao, credentials=credentials, requestBuilder=_classe_request_instrumentada(),
+                 client_options=client_options)
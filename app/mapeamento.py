@@ -0,0 +1,133 @@
+"""
+Mapeamento local dos cabeçalhos dos formulários para o esquema de Estudante.
+
+Cada cabeçalho é normalizado (sem acentos, minúsculas, só letras e números) e
+comparado com sinônimos em português, inglês e espanhol. A pontuação de um par
+(campo, cabeçalho) é:
+  - 1,0 quando o cabeçalho é exatamente um sinônimo;
+  - 0,7 a 0,95 quando contém um sinônimo como palavra(s) inteira(s), crescendo
+    com a fração do cabeçalho coberta pelo sinônimo ("Nome completo" vence
+    "Nome do curso" para o campo nome);
+  - semelhança aproximada (difflib) para erros de digitação, até 0,85.
+Os pares são atribuídos do maior para o menor, sem repetir campo nem coluna, e
+a pontuação atribuída é a confiança do campo. get_column_mapping_from_ai só
+consulta o Gemini quando essa confiança é baixa.
+"""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+CAMPOS = ('nome', 'idade', 'cidade', 'curso_interesse')
+
+SINONIMOS = {
+    'nome': [
+        'nome', 'nome completo', 'seu nome', 'nome do aluno', 'nome do estudante', 'nome e sobrenome',
+        'aluno', 'estudante', 'candidato',
+        'name', 'full name', 'your name', 'student name', 'first and last name',
+        'nombre', 'nombre completo', 'su nombre', 'nombre y apellido', 'alumno',
+    ],
+    'idade': [
+        'idade', 'sua idade', 'quantos anos voce tem', 'idade anos',
+        'age', 'your age', 'how old are you',
+        'edad', 'su edad', 'cuantos anos tienes',
+    ],
+    'cidade': [
+        'cidade', 'cidade onde mora', 'sua cidade', 'em qual cidade voce mora', 'municipio', 'localidade',
+        'city', 'town', 'city of residence', 'hometown',
+        'ciudad', 'ciudad de residencia', 'localidad',
+    ],
+    'curso_interesse': [
+        'curso', 'curso de interesse', 'curso desejado', 'qual curso', 'interesse', 'area de interesse',
+        'course', 'course of interest', 'program', 'programme', 'desired course', 'major',
+        'carrera', 'curso de interes', 'programa', 'carrera de interes',
+    ],
+}
+
+PONTUACAO_MINIMA = 0.6
+SEMELHANCA_MINIMA = 0.8
+_NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar_cabecalho(texto):
+    """'Cidade onde mora?' -> 'cidade onde mora'; 'Nombre Completo' -> 'nombre completo'."""
+    sem_acentos = ''.join(c for c in unicodedata.normalize('NFKD', str(texto)) if not unicodedata.combining(c))
+    return _NAO_ALFANUMERICO.sub(' ', sem_acentos.casefold()).strip()
+
+
+# Sinônimos normalizados e compilados uma única vez, na importação
+_PADROES = {
+    campo: [(normalizar_cabecalho(s), re.compile(r'\b' + re.escape(normalizar_cabecalho(s)) + r'\b'))
+            for s in sinonimos]
+    for campo, sinonimos in SINONIMOS.items()
+}
+
+
+def pontuar(campo, cabecalho_normalizado):
+    """Pontuação (0 a 1) de um cabeçalho já normalizado para um campo."""
+    if not cabecalho_normalizado:
+        return 0.0
+    melhor = 0.0
+    for sinonimo, padrao in _PADROES[campo]:
+        if cabecalho_normalizado == sinonimo:
+            return 1.0
+        if padrao.search(cabecalho_normalizado):
+            cobertura = len(sinonimo) / len(cabecalho_normalizado)
+            melhor = max(melhor, 0.7 + 0.25 * cobertura)
+            continue
+        semelhanca = SequenceMatcher(None, cabecalho_normalizado, sinonimo).ratio()
+        if semelhanca >= SEMELHANCA_MINIMA:
+            melhor = max(melhor, 0.85 * semelhanca)
+    return melhor
+
+
+def mapear_colunas_local(header_row):
+    """
+    Devolve (mapeamento, confiança): o índice da coluna de cada campo (ou None)
+    e a pontuação com que ela foi escolhida (0 quando nenhuma coluna serve).
+    """
+    normalizados = [normalizar_cabecalho(h) for h in header_row]
+    candidatos = sorted(
+        ((pontuar(campo, h), campo, indice) for campo in CAMPOS for indice, h in enumerate(normalizados)),
+        key=lambda c: (-c[0], c[2]))
+    mapeamento = dict.fromkeys(CAMPOS)
+    confianca = dict.fromkeys(CAMPOS, 0.0)
+    usadas = set()
+    for pontuacao, campo, indice in candidatos:
+        if pontuacao < PONTUACAO_MINIMA:
+            break
+        if mapeamento[campo] is not None or indice in usadas:
+            continue
+        mapeamento[campo] = indice
+        confianca[campo] = round(pontuacao, 3)
+        usadas.add(indice)
+    return mapeamento, confianca
+
+
+def confianca_suficiente(confianca, limiar):
+    """
+    O mapeamento local basta quando 'nome' passa do limiar e nenhum outro campo
+    ficou em dúvida (achado com pontuação abaixo do limiar). Campos sem nenhuma
+    coluna candidata são aceitos como ausentes.
+    """
+    if confianca['nome'] < limiar:
+        return False
+    return all(c == 0 or c >= limiar for c in confianca.values())
+
+
+def validar_mapeamento(mapeamento, total_colunas):
+    """Confere um mapeamento vindo do Gemini: só os campos do esquema, índices válidos e sem repetição."""
+    if not isinstance(mapeamento, dict):
+        return None
+    validado, usados = {}, set()
+    for campo in CAMPOS:
+        indice = mapeamento.get(campo)
+        if isinstance(indice, str) and indice.strip().isdigit():
+            indice = int(indice)
+        if indice is None:
+            validado[campo] = None
+            continue
+        if isinstance(indice, bool) or not isinstance(indice, int) or not 0 <= indice < total_colunas or indice in usados:
+            return None
+        validado[campo] = indice
+        usados.add(indice)
+    return validado if validado['nome'] is not None else None
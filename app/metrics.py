@@ -0,0 +1,254 @@
+"""
+Instrumentação da aplicação: histogramas de tempo expostos em formato Prometheus
+na rota /metrics e um log estruturado (JSON) com o tempo gasto em cada requisição.
+
+Cada requisição (e cada tarefa envolvida em perfil_consultas) tem um
+PerfilConsultas: total de consultas SQL, tempo no banco e quantas vezes cada
+comando foi executado. Um mesmo comando repetido CONSULTAS_REPETIDAS_LIMITE vezes
+ou mais é candidato a N+1 e aparece no log e na métrica db_n_plus_one_total.
+orcamento_consultas() usa o mesmo perfil para falhar quando um bloco passa de um
+número máximo de consultas (ver benchmarks/consultas.py).
+
+Com o Gunicorn, defina PROMETHEUS_MULTIPROC_DIR (o gunicorn.conf.py já faz isso)
+para que os valores de todos os workers sejam somados na coleta.
+"""
+import os
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import Response, current_app, g, request, has_app_context, has_request_context
+from prometheus_client import (Counter, Histogram, CollectorRegistry, REGISTRY,
+                               generate_latest, CONTENT_TYPE_LATEST, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Origens aceitas em /metrics quando METRICS_TOKEN não está definido
+ENDERECOS_LOCAIS = ('127.0.0.1', '::1')
+
+BUCKETS_RAPIDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Tempo de resposta por rota.',
+                             ['endpoint', 'method', 'status'])
+GOOGLE_API_DURATION = Histogram('google_api_duration_seconds', 'Tempo das chamadas às APIs do Google.',
+                                ['service', 'method'])
+GOOGLE_API_ERRORS = Counter('google_api_errors_total', 'Chamadas às APIs do Google que falharam.',
+                            ['service', 'method'])
+GEMINI_DURATION = Histogram('gemini_duration_seconds', 'Tempo das chamadas ao Gemini.', ['operation'])
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'Tempo de cada consulta SQL.',
+                              buckets=BUCKETS_RAPIDOS)
+DB_QUERIES_PER_REQUEST = Histogram('db_queries_per_request', 'Consultas SQL por requisição.', ['endpoint'],
+                                   buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144))
+REPLICA_ROTEAMENTO = Counter('replica_routing_total', 'Consultas de análise por banco escolhido e motivo.',
+                             ['destino', 'motivo'])
+MAPEAMENTO_COLUNAS = Counter('column_mapping_total', 'Mapeamentos de cabeçalhos por origem (local, gemini, fallback).',
+                             ['origem'])
+N_MAIS_UM = Counter('db_n_plus_one_total', 'Requisições e tarefas com um comando SQL repetido (candidatas a N+1).',
+                    ['origem'])
+STAGE_DURATION = Histogram('stage_duration_seconds', 'Tempo das etapas de pandas/sklearn.', ['stage'])
+
+
+def _acumular(chave, segundos):
+    """Soma o tempo no contador da requisição atual, usado no log estruturado."""
+    if has_request_context():
+        tempos = g.setdefault('tempos_metricas', {})
+        tempos[chave] = tempos.get(chave, 0.0) + segundos
+
+
+@contextmanager
+def medir_etapa(nome):
+    """Mede uma etapa de processamento (ex.: 'analysis.read_sql', 'ml_analysis.kmeans')."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        STAGE_DURATION.labels(stage=nome).observe(duracao)
+        _acumular(f'etapa:{nome}', duracao)
+
+
+@contextmanager
+def medir_gemini(operacao):
+    """Mede uma chamada ao Gemini (ex.: 'column_mapping', 'insights')."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        GEMINI_DURATION.labels(operation=operacao).observe(duracao)
+        _acumular('gemini', duracao)
+
+
+@contextmanager
+def medir_google(method_id):
+    """Mede uma chamada às APIs do Google; method_id no formato 'sheets.spreadsheets.values.get'."""
+    servico, _, metodo = (method_id or 'desconhecido.desconhecido').partition('.')
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        GOOGLE_API_ERRORS.labels(service=servico, method=metodo).inc()
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        GOOGLE_API_DURATION.labels(service=servico, method=metodo).observe(duracao)
+        _acumular('google_api', duracao)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('inicio_consultas', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    duracao = time.perf_counter() - conn.info['inicio_consultas'].pop()
+    DB_QUERY_DURATION.observe(duracao)
+    for perfil in _perfis_ativos.get():
+        perfil.registrar(statement, duracao)
+    _acumular('db', duracao)
+
+
+class PerfilConsultas:
+    """Consultas SQL de uma requisição ou tarefa: total, tempo e execuções de cada comando."""
+
+    def __init__(self, nome, limite_repeticoes=None):
+        if limite_repeticoes is None:
+            limite_repeticoes = current_app.config.get('CONSULTAS_REPETIDAS_LIMITE', 5) if has_app_context() else 5
+        self.nome = nome
+        self.limite_repeticoes = limite_repeticoes
+        self.total = 0
+        self.segundos = 0.0
+        self.por_comando = {}
+
+    def registrar(self, statement, duracao):
+        self.total += 1
+        self.segundos += duracao
+        vezes, segundos = self.por_comando.get(statement, (0, 0.0))
+        self.por_comando[statement] = (vezes + 1, segundos + duracao)
+
+    def repetidas(self):
+        """Comandos executados limite_repeticoes vezes ou mais, do mais repetido para o menos."""
+        return sorted(((sql, vezes) for sql, (vezes, _) in self.por_comando.items()
+                       if vezes >= self.limite_repeticoes), key=lambda item: -item[1])
+
+    def candidatas_n_mais_um(self, tamanho_sql=200):
+        return [{'sql': ' '.join(sql.split())[:tamanho_sql], 'vezes': vezes} for sql, vezes in self.repetidas()]
+
+
+# Perfis abertos no contexto atual; um bloco de orcamento_consultas() em volta de uma
+# requisição do cliente de testes também recebe as consultas dela
+_perfis_ativos = ContextVar('perfis_consultas', default=())
+
+
+def _abrir_perfil(perfil):
+    return _perfis_ativos.set(_perfis_ativos.get() + (perfil,))
+
+
+@contextmanager
+def perfil_consultas(nome, registrar=True):
+    """
+    Perfila as consultas de um bloco fora de requisições (ex.: 'sync_all_sheets',
+    'tarefa.processar'). Com registrar=True, imprime o resumo em JSON e conta os
+    candidatos a N+1 na métrica.
+    """
+    perfil = PerfilConsultas(nome)
+    token = _abrir_perfil(perfil)
+    inicio = time.perf_counter()
+    try:
+        yield perfil
+    finally:
+        _perfis_ativos.reset(token)
+        if registrar:
+            candidatas = perfil.candidatas_n_mais_um()
+            if candidatas:
+                N_MAIS_UM.labels(origem=nome).inc()
+            print(json.dumps({'evento': 'perfil_consultas', 'nome': nome,
+                              'duracao_ms': round((time.perf_counter() - inicio) * 1000, 2),
+                              'consultas_db': perfil.total, 'db_ms': round(perfil.segundos * 1000, 2),
+                              'n_mais_um': candidatas}, ensure_ascii=False), flush=True)
+
+
+class OrcamentoConsultasExcedido(AssertionError):
+    pass
+
+
+@contextmanager
+def orcamento_consultas(maximo, nome='bloco'):
+    """
+    Para testes e benchmarks: falha com OrcamentoConsultasExcedido se o bloco
+    fizer mais de `maximo` consultas SQL. A mensagem lista os comandos repetidos.
+    """
+    with perfil_consultas(nome, registrar=False) as perfil:
+        yield perfil
+    if perfil.total > maximo:
+        detalhes = ''.join(f"\n  {c['vezes']}x {c['sql']}" for c in perfil.candidatas_n_mais_um())
+        raise OrcamentoConsultasExcedido(f"'{nome}' fez {perfil.total} consultas SQL (orçamento: {maximo}).{detalhes}")
+
+
+def _coletar_metricas():
+    """Gera o texto Prometheus, agregando os workers quando em modo multiprocesso."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def init_metrics(app):
+    """Registra os ganchos de tempo por requisição e a rota /metrics."""
+
+    @app.before_request
+    def _iniciar_cronometro():
+        g.inicio_requisicao = time.perf_counter()
+        g.perfil_consultas = PerfilConsultas(request.endpoint or 'desconhecido')
+        g.token_perfil_consultas = _abrir_perfil(g.perfil_consultas)
+
+    @app.teardown_request
+    def _fechar_perfil(_erro=None):
+        token = g.pop('token_perfil_consultas', None)
+        if token is not None:
+            _perfis_ativos.reset(token)
+
+    @app.after_request
+    def _registrar_requisicao(response):
+        inicio = g.pop('inicio_requisicao', None)
+        if inicio is None or request.endpoint == 'metrics':
+            return response
+        duracao = time.perf_counter() - inicio
+        endpoint = request.endpoint or 'desconhecido'
+        perfil = g.get('perfil_consultas')
+        consultas = perfil.total if perfil else 0
+        candidatas = perfil.candidatas_n_mais_um() if perfil else []
+        if candidatas:
+            N_MAIS_UM.labels(origem=endpoint).inc()
+        REQUEST_DURATION.labels(endpoint=endpoint, method=request.method,
+                                status=response.status_code).observe(duracao)
+        DB_QUERIES_PER_REQUEST.labels(endpoint=endpoint).observe(consultas)
+        if app.config.get('METRICS_LOG_REQUESTS', True):
+            registro = {
+                'evento': 'requisicao',
+                'endpoint': endpoint,
+                'metodo': request.method,
+                'status': response.status_code,
+                'duracao_ms': round(duracao * 1000, 2),
+                'consultas_db': consultas,
+            }
+            if candidatas:
+                registro['n_mais_um'] = candidatas
+            for chave, segundos in g.get('tempos_metricas', {}).items():
+                registro[f'{chave}_ms'] = round(segundos * 1000, 2)
+            print(json.dumps(registro, ensure_ascii=False), flush=True)
+        return response
+
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if token:
+            if request.headers.get('Authorization') != f'Bearer {token}':
+                return Response('Não autorizado', status=401)
+        elif request.remote_addr not in ENDERECOS_LOCAIS or 'X-Forwarded-For' in request.headers:
+            # Sem token, só quem está na própria máquina (e não atrás de um proxy) lê as métricas
+            return Response('Acesso negado', status=403)
+        return Response(_coletar_metricas(), mimetype=CONTENT_TYPE_LATEST)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -40,26 +40,138 @@ class Planilha(db.Model):
     spreadsheet_id = db.Column(db.String(100), nullable=False)
     range_name = db.Column(db.String(100), nullable=False)
     data_cadastro = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Preenchida pela rota remove_sheet; os dados são apagados depois em segundo plano (app/remocao.py)
+    removida_em = db.Column(db.DateTime, nullable=True, index=True)
+    # version e modifiedTime do arquivo no Drive na última sincronização gravada;
+    # enquanto não mudarem, o sync_sheets.py não baixa a planilha de novo
+    drive_versao = db.Column(db.BigInteger, nullable=True)
+    drive_modificada_em = db.Column(db.String(40), nullable=True)
     
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        # Dashboard e Gerenciar Formulários; no PostgreSQL o índice é parcial (só as não removidas)
+        db.Index('ix_planilha_user_id_data_cadastro', 'user_id', 'data_cadastro',
+                 postgresql_where=removida_em.is_(None)),
+    )
+
     def __repr__(self):
         return f"Planilha('{self.nome_amigavel}', '{self.spreadsheet_id}')"
 
+class Cidade(db.Model):
+    """Dimensão de cidades. `chave` é o nome canônico (ver app/dimensoes.py); `nome` é o exibido."""
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False)
+    chave = db.Column(db.String(100), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"Cidade('{self.nome}')"
+
+class Curso(db.Model):
+    """Dimensão de cursos. `chave` é o nome canônico (ver app/dimensoes.py); `nome` é o exibido."""
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False)
+    chave = db.Column(db.String(100), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"Curso('{self.nome}')"
+
 class Estudante(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(255), nullable=False)
     idade = db.Column(db.Integer, nullable=True)
-    cidade = db.Column(db.String(100), nullable=True)
-    curso_interesse = db.Column(db.String(100), nullable=False)
+    # Cidade e curso ficam nas tabelas de dimensão (migrar_dimensoes.py converte bancos antigos)
+    cidade_id = db.Column(db.Integer, db.ForeignKey('cidade.id'), nullable=True)
+    curso_id = db.Column(db.Integer, db.ForeignKey('curso.id'), nullable=True)
     
     # --- COLUNAS "IoT" ATUALIZADAS ---
     timestamp_cadastro = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     dispositivo_acesso = db.Column(db.String(50), nullable=True)
 
     # Chaves estrangeiras
-    planilha_origem_id = db.Column(db.Integer, db.ForeignKey('planilha.id'), nullable=False)
+    planilha_origem_id = db.Column(db.Integer, db.ForeignKey('planilha.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    # Índices criados pela migração 0002 (migrations/versions/)
+    __table_args__ = (
+        # Análises, API de gráficos e total do dashboard: estudantes do usuário em ordem de id.
+        # No PostgreSQL o INCLUDE cobre a contagem, a página de análise e os gráficos (index-only scan)
+        db.Index('ix_estudante_user_id_id', 'user_id', 'id',
+                 postgresql_include=['curso_id', 'cidade_id', 'idade', 'planilha_origem_id']),
+        # Sincronização, tarefas e purga apagam os estudantes de um formulário
+        db.Index('ix_estudante_planilha_origem_id', 'planilha_origem_id'),
+        # Dados Processados: estudantes do usuário ordenados por nome
+        db.Index('ix_estudante_user_id_nome_id', 'user_id', 'nome', 'id'),
+    )
+
+    cidade_ref = db.relationship('Cidade', lazy='joined')
+    curso_ref = db.relationship('Curso', lazy='joined')
+
+    @property
+    def cidade(self):
+        return self.cidade_ref.nome if self.cidade_ref else None
+
+    @property
+    def curso_interesse(self):
+        return self.curso_ref.nome if self.curso_ref else None
+
+    def __repr__(self):
+        return f"Estudante('{self.nome}', '{self.curso_interesse}')"
+
+class VersaoDados(db.Model):
+    """
+    Versão dos dados de cada usuário. É incrementada sempre que estudantes ou
+    formulários do usuário mudam, e invalida o cache das páginas de análise.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    # k escolhido pela segmentação automática nesta versão; todos os workers segmentam com ele
+    segmentos_k = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f"VersaoDados('{self.user_id}', '{self.versao}')"
+
+class LeaseSincronizacao(db.Model):
+    """
+    Lease de sincronização de uma planilha. Os workers do sync_sheets.py
+    reivindicam as linhas com SELECT ... FOR UPDATE SKIP LOCKED, renovam o
+    lease com heartbeats e o liberam ao terminar; um lease expirado (worker
+    que caiu) pode ser reivindicado por outro worker.
+    """
+    planilha_id = db.Column(db.Integer, db.ForeignKey('planilha.id', ondelete='CASCADE'), primary_key=True)
+    worker_id = db.Column(db.String(100), nullable=True)
+    expira_em = db.Column(db.DateTime, nullable=True)
+    heartbeat_em = db.Column(db.DateTime, nullable=True)
+    sincronizada_em = db.Column(db.DateTime, nullable=True)
+    ultimo_erro = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f"LeaseSincronizacao('{self.planilha_id}', '{self.worker_id}')"
+
+class TarefaProcessamento(db.Model):
+    """
+    Processamento de uma planilha pedido pela rota process_sheet. A rota só cria
+    a linha (status 'pendente'); um worker_tarefas.py a reivindica, executa e
+    atualiza os contadores, que a página da tarefa acompanha por Server-Sent Events.
+    Status: pendente -> executando -> concluida | erro.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    planilha_id = db.Column(db.Integer, db.ForeignKey('planilha.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente', index=True)
+    etapa = db.Column(db.String(50), nullable=True)
+    linhas_buscadas = db.Column(db.Integer, nullable=False, default=0)
+    linhas_lidas = db.Column(db.Integer, nullable=False, default=0)
+    linhas_gravadas = db.Column(db.Integer, nullable=False, default=0)
+    linhas_rejeitadas = db.Column(db.Integer, nullable=False, default=0)
+    mensagem = db.Column(db.Text, nullable=True)
+    worker_id = db.Column(db.String(100), nullable=True)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciada_em = db.Column(db.DateTime, nullable=True)
+    atualizada_em = db.Column(db.DateTime, nullable=True)
+    finalizada_em = db.Column(db.DateTime, nullable=True)
+
+    planilha = db.relationship('Planilha')
+
     def __repr__(self):
-        return f"Estudante('{self.nome}', '{self.curso_interesse}')"
\ No newline at end of file
+        return f"TarefaProcessamento('{self.id}', '{self.status}')"
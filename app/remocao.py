@@ -0,0 +1,70 @@
+"""
+Remoção de formulários em segundo plano.
+
+A rota remove_sheet só preenche planilha.removida_em, o que já esconde o
+formulário e seus estudantes de todas as consultas (listas, análises,
+sincronização e tarefas) e responde em tempo constante. Os estudantes são
+apagados depois pelo worker_tarefas.py em lotes de REMOCAO_LOTE_LINHAS, um lote
+por transação, para não segurar locks nem gerar um WAL enorme de uma vez; a
+própria planilha sai no último lote e leva junto, pelo ON DELETE CASCADE, o que
+ainda restar (estudantes gravados por uma sincronização concorrente, lease e
+tarefas). Cada lote trava a planilha com SELECT ... FOR NO KEY UPDATE SKIP
+LOCKED, então vários workers podem purgar ao mesmo tempo sem disputar as mesmas linhas.
+"""
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, select
+from app import db
+from app.models import Estudante, Planilha
+
+
+def estudantes_visiveis():
+    """Critério que esconde os estudantes de planilhas removidas e ainda não purgadas."""
+    return Estudante.planilha_origem_id.not_in(select(Planilha.id).where(Planilha.removida_em.is_not(None)))
+
+
+def marcar_removida(planilha):
+    """Esconde a planilha; o commit fica com quem chama. Os dados são apagados por purgar_removidas()."""
+    planilha.removida_em = datetime.utcnow()
+
+
+def purgar_lote(lote=None):
+    """
+    Apaga até `lote` estudantes da planilha removida mais antiga e, quando não
+    restam mais, a própria planilha. Devolve (planilha_id, linhas apagadas,
+    planilha apagada?) ou None se não há o que purgar.
+    """
+    lote = lote or current_app.config.get('REMOCAO_LOTE_LINHAS', 5000)
+    planilha_id = db.session.execute(
+        select(Planilha.id)
+        .where(Planilha.removida_em.is_not(None))
+        .order_by(Planilha.removida_em)
+        .limit(1)
+        .with_for_update(skip_locked=True, key_share=True)).scalar()
+    if planilha_id is None:
+        db.session.commit()
+        return None
+
+    alvo = select(Estudante.id).where(Estudante.planilha_origem_id == planilha_id).limit(lote)
+    apagadas = db.session.execute(delete(Estudante).where(Estudante.id.in_(alvo)),
+                                  execution_options={'synchronize_session': False}).rowcount
+    concluida = apagadas < lote
+    if concluida:
+        db.session.execute(delete(Planilha).where(Planilha.id == planilha_id),
+                           execution_options={'synchronize_session': False})
+    db.session.commit()
+    return planilha_id, apagadas, concluida
+
+
+def purgar_removidas(maximo_lotes=None):
+    """Purga lotes até não haver planilhas removidas (ou até `maximo_lotes`). Devolve quantos lotes executou."""
+    lotes = 0
+    while maximo_lotes is None or lotes < maximo_lotes:
+        resultado = purgar_lote()
+        if resultado is None:
+            break
+        planilha_id, apagadas, concluida = resultado
+        lotes += 1
+        if concluida:
+            print(f"Planilha {planilha_id} removida ({apagadas} estudantes no último lote).")
+    return lotes
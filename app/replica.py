@@ -0,0 +1,125 @@
+"""
+Roteamento das consultas de análise para a réplica de leitura.
+
+Com DATABASE_REPLICA_URL definido, engine_analitico() devolve o engine da
+réplica (bind 'replica'), desde que:
+  - o atraso de replicação esteja dentro de REPLICA_ATRASO_MAXIMO_SEGUNDOS
+    (medido no PostgreSQL e reaproveitado por alguns segundos);
+  - a réplica já tenha a versão atual dos dados do usuário (VersaoDados), para
+    que uma análise logo depois de uma importação não mostre dados antigos;
+  - a réplica esteja respondendo.
+Em qualquer outro caso, e sem réplica configurada, usa o banco principal.
+"""
+import threading
+import time
+from flask import current_app, g
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.cache import versao_dados
+from app.metrics import REPLICA_ROTEAMENTO
+from app.models import VersaoDados
+
+BIND_REPLICA = 'replica'
+VALIDADE_ATRASO_SEGUNDOS = 5
+PAUSA_APOS_FALHA_SEGUNDOS = 30
+
+CONSULTA_ATRASO_POSTGRES = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class _EstadoReplica:
+    """Último atraso medido e pausa após falhas, por processo."""
+
+    def __init__(self):
+        self.atraso = None
+        self.medido_em = 0.0
+        self.indisponivel_ate = 0.0
+        self.trava = threading.Lock()
+
+
+_estado = _EstadoReplica()
+
+
+def _engine_replica():
+    if BIND_REPLICA not in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        return None
+    return db.engines[BIND_REPLICA]
+
+
+def _marcar_indisponivel(erro):
+    print(f"Réplica de leitura indisponível; usando o banco principal. Detalhes: {erro}")
+    _estado.indisponivel_ate = time.monotonic() + PAUSA_APOS_FALHA_SEGUNDOS
+
+
+def atraso_replica(engine):
+    """Atraso de replicação em segundos (0 fora do PostgreSQL, onde não dá para medir)."""
+    agora = time.monotonic()
+    with _estado.trava:
+        if _estado.atraso is not None and agora - _estado.medido_em < VALIDADE_ATRASO_SEGUNDOS:
+            return _estado.atraso
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conexao:
+            atraso = float(conexao.execute(CONSULTA_ATRASO_POSTGRES).scalar() or 0)
+    else:
+        atraso = 0.0
+    with _estado.trava:
+        _estado.atraso, _estado.medido_em = atraso, agora
+    return atraso
+
+
+def _versao_na_replica(engine, user_id):
+    tabela = VersaoDados.__table__
+    with engine.connect() as conexao:
+        versao = conexao.execute(tabela.select().with_only_columns(tabela.c.versao)
+                                 .where(tabela.c.user_id == user_id)).scalar()
+    return versao or 0
+
+
+def _rotear(destino, motivo):
+    REPLICA_ROTEAMENTO.labels(destino=destino, motivo=motivo).inc()
+
+
+def engine_analitico(user_id=None):
+    """Engine para as consultas de análise: a réplica quando ela está em dia, senão o principal."""
+    engine = _engine_replica()
+    if engine is None:
+        return db.engine
+    if time.monotonic() < _estado.indisponivel_ate:
+        _rotear('principal', 'indisponivel')
+        return db.engine
+    try:
+        if atraso_replica(engine) > current_app.config.get('REPLICA_ATRASO_MAXIMO_SEGUNDOS', 30):
+            _rotear('principal', 'atraso')
+            return db.engine
+        if user_id is not None:
+            versao_atual = g.get('versao_dados')
+            if versao_atual is None:
+                versao_atual = versao_dados(user_id)
+            if _versao_na_replica(engine, user_id) < versao_atual:
+                _rotear('principal', 'versao')
+                return db.engine
+    except SQLAlchemyError as e:
+        _marcar_indisponivel(e)
+        _rotear('principal', 'erro')
+        return db.engine
+    _rotear('replica', 'ok')
+    return engine
+
+
+def consultar_analitico(consulta, user_id=None):
+    """
+    Executa consulta(engine) no engine de engine_analitico(); se a réplica falhar
+    no meio da leitura, repete no banco principal.
+    """
+    engine = engine_analitico(user_id)
+    try:
+        return consulta(engine)
+    except SQLAlchemyError as e:
+        if engine is db.engine:
+            raise
+        _marcar_indisponivel(e)
+        _rotear('principal', 'erro')
+        return consulta(db.engine)
@@ -1,20 +1,27 @@
 import os
+import asyncio
 import json
-import pandas as pd
-import random
-from flask import render_template, url_for, flash, redirect, request, Blueprint, session, jsonify
+from flask import render_template, url_for, flash, redirect, request, Blueprint, session, jsonify, Response, stream_with_context
 from app import db, bcrypt
-from app.models import User, Planilha, Estudante
-from app.utils import send_email, get_column_mapping_from_ai, gerar_insights_com_ia, preparar_dados_graficos
+from app.models import User, Planilha, Estudante, TarefaProcessamento
+from app.utils import send_email, gerar_insights_com_ia
+from app.dados import carregar_estudantes_df, contar_estudantes, segmentacao_com_alunos
 from flask_login import login_user, current_user, logout_user, login_required
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from app.google_credentials import build_google_service
+from app.google_async import CredenciaisGoogleExpiradas, formularios_com_planilhas
+from app.metrics import medir_etapa
+from app.cache import cache_por_versao, incrementar_versao_dados
+from app.remocao import estudantes_visiveis, marcar_removida
+from app.tarefas import enfileirar_processamento, eventos_da_tarefa, como_dicionario
 from google.oauth2.credentials import Credentials
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import OneHotEncoder
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 import warnings
 
+# pandas, scikit-learn, googleapiclient e google_auth_oauthlib são importados dentro
+# das rotas que os usam: assim o boot dos workers e o sync_sheets.py não pagam por eles.
+# Com o Gunicorn em modo preload, o master já os carrega antes do fork (ver gunicorn.conf.py).
+
 # Configurações iniciais
 warnings.filterwarnings('ignore', message='.*scope.*')
 os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = '1'
@@ -148,6 +155,7 @@ def confirm_email(token):
 @login_required
 def authorize_google():
     """Inicia o fluxo de autorização do Google OAuth."""
+    from google_auth_oauthlib.flow import Flow
     redirect_uri = url_for('main.google_callback', _external=True, _scheme=get_scheme())
     flow = Flow.from_client_secrets_file('client_secret.json', scopes=SCOPES, redirect_uri=redirect_uri)
     authorization_url, state = flow.authorization_url(access_type='offline', include_granted_scopes='true', prompt='consent')
@@ -161,6 +169,7 @@ def google_callback():
     CORREÇÃO APLICADA:
     Lida com o retorno do Google, salva as credenciais e impede erros de e-mail duplicado.
     """
+    from google_auth_oauthlib.flow import Flow
     state = session.get('google_oauth_state')
     redirect_uri = url_for('main.google_callback', _external=True, _scheme=get_scheme())
     flow = Flow.from_client_secrets_file('client_secret.json', scopes=SCOPES, state=state, redirect_uri=redirect_uri)
@@ -168,7 +177,7 @@ def google_callback():
     try:
         flow.fetch_token(authorization_response=request.url)
         credentials = flow.credentials
-        user_info_service = build('oauth2', 'v2', credentials=credentials)
+        user_info_service = build_google_service('oauth2', 'v2', credentials)
         google_email = user_info_service.userinfo().get().execute().get('email')
 
         # Verifica se o e-mail do Google já está sendo usado por OUTRO usuário
@@ -179,6 +188,7 @@ def google_callback():
 
         # Apenas salva as credenciais no usuário logado, sem alterar seu e-mail
         current_user.google_credentials = credentials.to_json()
+        incrementar_versao_dados(current_user.id)
         db.session.commit()
         flash('Sua conta Google foi conectada com sucesso!', 'success')
 
@@ -201,23 +211,25 @@ def manage_sheets():
             author=current_user
         )
         db.session.add(nova_planilha)
+        incrementar_versao_dados(current_user.id)
         db.session.commit()
         flash('Novo formulário adicionado com sucesso!', 'success')
         return redirect(url_for('main.manage_sheets'))
 
-    planilhas = Planilha.query.filter_by(user_id=current_user.id).all()
+    planilhas = Planilha.query.filter_by(user_id=current_user.id, removida_em=None).all()
     return render_template('manage_sheets.html', title="Gerenciar Formulários", planilhas=planilhas)
 
 @main.route("/remove_sheet/<int:planilha_id>", methods=['POST'])
 @login_required
 def remove_sheet(planilha_id):
-    planilha = Planilha.query.get_or_404(planilha_id)
-    if planilha.author != current_user:
+    planilha = Planilha.query.filter_by(id=planilha_id, removida_em=None).first_or_404()
+    if planilha.user_id != current_user.id:
         flash('Você não tem permissão para remover este formulário.', 'danger')
         return redirect(url_for('main.manage_sheets'))
     try:
-        Estudante.query.filter_by(planilha_origem_id=planilha.id).delete()
-        db.session.delete(planilha)
+        # Some das consultas agora; os estudantes são apagados em lotes pelo worker (app/remocao.py)
+        marcar_removida(planilha)
+        incrementar_versao_dados(current_user.id)
         db.session.commit()
         flash(f'O formulário "{planilha.nome_amigavel}" foi desconectado e seus dados removidos.', 'success')
     except Exception as e:
@@ -234,34 +246,24 @@ def search_sheets():
     try:
         creds = Credentials.from_authorized_user_info(json.loads(current_user.google_credentials))
         if creds.expired and creds.refresh_token:
+            from google.auth.transport.requests import Request
             creds.refresh(Request())
             current_user.google_credentials = creds.to_json()
             db.session.commit()
         
-        drive_service = build('drive', 'v3', credentials=creds)
-        results = drive_service.files().list(q="mimeType='application/vnd.google-apps.form'", pageSize=50, fields="files(id, name, modifiedTime, webViewLink)", orderBy="modifiedTime desc").execute()
-        forms = results.get('files', [])
+        # Lista os formulários no Drive e busca a planilha de respostas de todos ao mesmo tempo.
+        # O laço de eventos é só desta chamada: o banco e o template ficam fora dele, na thread da requisição
+        forms_with_responses = asyncio.run(formularios_com_planilhas(creds))
         
-        if not forms:
+        if not forms_with_responses:
             flash('Nenhum Google Forms foi encontrado na sua conta.', 'info')
             return render_template('search_results.html', title="Selecione um Formulário", spreadsheets=[])
         
-        forms_service = build('forms', 'v1', credentials=creds)
-        forms_with_responses = []
-        for form in forms:
-            try:
-                form_info = forms_service.forms().get(formId=form['id']).execute()
-                form['response_sheet_id'] = form_info.get('linkedSheetId')
-                forms_with_responses.append(form)
-            except Exception as e:
-                print(f"Erro ao buscar info do formulário {form['name']}: {e}")
-                form['response_sheet_id'] = None
-                forms_with_responses.append(form)
-        
         return render_template('search_results.html', title="Selecione um Formulário", spreadsheets=forms_with_responses)
     except Exception as e:
-        if "invalid_grant" in str(e) or "Token has been expired" in str(e):
+        if isinstance(e, CredenciaisGoogleExpiradas) or "invalid_grant" in str(e) or "Token has been expired" in str(e):
             current_user.google_credentials = None
+            incrementar_versao_dados(current_user.id)
             db.session.commit()
             flash('Sua sessão do Google expirou. Por favor, reconecte sua conta.', 'warning')
             return redirect(url_for('main.authorize_google'))
@@ -273,11 +275,12 @@ def search_sheets():
 def select_form(form_id, sheet_id):
     try:
         nome_formulario = request.form.get('nome_formulario')
-        if Planilha.query.filter_by(spreadsheet_id=sheet_id, user_id=current_user.id).first():
+        if Planilha.query.filter_by(spreadsheet_id=sheet_id, user_id=current_user.id, removida_em=None).first():
             flash(f'Formulário "{nome_formulario}" já estava cadastrado!', 'info')
         else:
             nova_planilha = Planilha(nome_amigavel=nome_formulario, spreadsheet_id=sheet_id, range_name="Respostas ao formulário 1!A:Z", author=current_user)
             db.session.add(nova_planilha)
+            incrementar_versao_dados(current_user.id)
             db.session.commit()
             flash(f'Formulário "{nome_formulario}" foi adicionado e selecionado!', 'success')
         return redirect(url_for('main.manage_sheets'))
@@ -288,131 +291,97 @@ def select_form(form_id, sheet_id):
 @main.route("/process_sheet/<int:planilha_id>")
 @login_required
 def process_sheet(planilha_id):
-    planilha = Planilha.query.get_or_404(planilha_id)
-    if planilha.author != current_user:
-        return redirect(url_for('main.manage_sheets'))
-
-    creds = Credentials.from_authorized_user_info(json.loads(current_user.google_credentials))
-    service = build('sheets', 'v4', credentials=creds)
-    values = service.spreadsheets().values().get(spreadsheetId=planilha.spreadsheet_id, range=planilha.range_name).execute().get('values', [])
-
-    if not values or len(values) < 2:
-        flash('Nenhum dado encontrado no formulário para processar.', 'warning')
+    planilha = Planilha.query.filter_by(id=planilha_id, removida_em=None).first_or_404()
+    if planilha.user_id != current_user.id:
         return redirect(url_for('main.manage_sheets'))
+    if not current_user.google_credentials:
+        flash('Por favor, conecte sua conta Google primeiro.', 'warning')
+        return redirect(url_for('main.dashboard'))
+    # O processamento roda no worker_tarefas.py; a página da tarefa acompanha o progresso
+    tarefa_id = enfileirar_processamento(planilha)
+    return redirect(url_for('main.status_tarefa', tarefa_id=tarefa_id))
 
-    Estudante.query.filter_by(planilha_origem_id=planilha.id).delete()
-    db.session.commit()
+@main.route("/tarefas/<int:tarefa_id>")
+@login_required
+def status_tarefa(tarefa_id):
+    tarefa = (TarefaProcessamento.query.options(joinedload(TarefaProcessamento.planilha))
+              .filter_by(id=tarefa_id, user_id=current_user.id).first_or_404())
+    return render_template('tarefa.html', title="Processando Formulário", tarefa=tarefa,
+                           estado=como_dicionario(tarefa))
 
-    header = values[0]
-    column_map = get_column_mapping_from_ai(header)
-    
-    if not column_map or column_map.get('nome') is None:
-        flash('Não foi possível identificar a coluna "nome" no formulário.', 'danger')
-        return redirect(url_for('main.manage_sheets'))
-    
-    estudantes_processados = 0
-    for row in values[1:]:
-        try:
-            db.session.add(Estudante(
-                nome=row[column_map['nome']],
-                idade=int(row[column_map['idade']]) if column_map.get('idade') is not None and len(row) > column_map['idade'] and row[column_map['idade']].isdigit() else None,
-                cidade=row[column_map['cidade']] if column_map.get('cidade') is not None and len(row) > column_map['cidade'] else None,
-                curso_interesse=row[column_map['curso_interesse']] if column_map.get('curso_interesse') is not None and len(row) > column_map['curso_interesse'] else "Não especificado",
-                dispositivo_acesso=random.choice(['Desktop', 'Mobile']),
-                planilha_origem_id=planilha.id,
-                user_id=current_user.id
-            ))
-            estudantes_processados += 1
-        except (IndexError, ValueError, KeyError) as e:
-            print(f"Linha ignorada: {row} | Erro: {e}")
-            continue
-    db.session.commit()
-    flash(f'{estudantes_processados} respostas processadas com sucesso!', 'success' if estudantes_processados > 0 else 'warning')
-    return redirect(url_for('main.view_processed_data'))
+@main.route("/tarefas/<int:tarefa_id>/eventos")
+@login_required
+def eventos_tarefa(tarefa_id):
+    """Progresso da tarefa em Server-Sent Events (text/event-stream)."""
+    TarefaProcessamento.query.filter_by(id=tarefa_id, user_id=current_user.id).first_or_404()
+    eventos = eventos_da_tarefa(tarefa_id, current_user.id)
+    return Response(stream_with_context(eventos), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @main.route("/view_processed_data")
 @login_required
 def view_processed_data():
-    estudantes = Estudante.query.filter_by(user_id=current_user.id).order_by(Estudante.nome).all()
+    estudantes = (Estudante.query.filter_by(user_id=current_user.id).filter(estudantes_visiveis())
+                  .order_by(Estudante.nome).all())
     return render_template('processed_data.html', title="Dados Processados", estudantes=estudantes)
 
 @main.route("/analysis")
 @login_required
+@cache_por_versao
 def analysis():
-    df = pd.read_sql(Estudante.query.filter_by(user_id=current_user.id).statement, db.engine)
+    df = carregar_estudantes_df(current_user.id, ('curso_interesse', 'idade'), 'analysis.read_sql')
     if df.empty:
         flash('Não há dados processados para analisar.', 'warning')
         return redirect(url_for('main.dashboard'))
-    df['idade'] = pd.to_numeric(df['idade'], errors='coerce')
-    return render_template('analysis.html', title="Análise de Dados",
-                           popularidade_cursos=df['curso_interesse'].value_counts().to_dict(),
-                           alunos_por_cidade=df['cidade'].value_counts().to_dict(),
-                           idade_media_por_curso=df.groupby('curso_interesse')['idade'].mean().round(1).to_dict(),
-                           idade_media_geral=round(df['idade'].mean(), 1) if not df['idade'].isnull().all() else 0,
-                           total_estudantes=len(df),
-                           acesso_por_dispositivo=df['dispositivo_acesso'].value_counts().to_dict())
+    # Os gráficos buscam suas séries na API (/api/v1/graficos/...); aqui só a tabela e os totais
+    with medir_etapa('analysis.agregacoes'):
+        media_por_curso = df.groupby('curso_interesse', observed=True)['idade'].mean().astype('float64').round(1)
+        contexto = dict(idade_media_por_curso=media_por_curso.to_dict(),
+                        idade_media_geral=round(df['idade'].mean(), 1) if not df['idade'].isnull().all() else 0,
+                        total_estudantes=len(df))
+    return render_template('analysis.html', title="Análise de Dados", **contexto)
 
 @main.route("/ml_analysis")
 @login_required
+@cache_por_versao
 def ml_analysis():
-    df = pd.read_sql(Estudante.query.filter_by(user_id=current_user.id).statement, db.engine)
-    if len(df) < 3:
+    segmentos_info, resumo = segmentacao_com_alunos(current_user.id)
+    if resumo['total_estudantes'] < 3:
         flash('Você precisa de pelo menos 3 registros de estudantes para a análise de ML.', 'warning')
         return redirect(url_for('main.dashboard'))
-    
-    df['idade'] = pd.to_numeric(df['idade'], errors='coerce').fillna(df['idade'].median() if pd.notna(df['idade'].median()) else 20)
-    df.fillna({'cidade': 'Desconhecida', 'curso_interesse': 'Não especificado'}, inplace=True)
-    df['timestamp_cadastro'] = pd.to_datetime(df['timestamp_cadastro'])
-
-    features = df[['idade', 'cidade', 'curso_interesse']]
-    encoder = OneHotEncoder(handle_unknown='ignore')
-    features_encoded = encoder.fit_transform(features[['cidade', 'curso_interesse']])
-    features_final = pd.concat([features[['idade']].reset_index(drop=True), pd.DataFrame(features_encoded.toarray(), columns=encoder.get_feature_names_out())], axis=1)
-    
-    num_clusters = min(3, len(df.drop_duplicates(subset=['id'])))
-    kmeans = KMeans(n_clusters=num_clusters, random_state=42, n_init=10)
-    df['segmento'] = kmeans.fit_predict(features_final)
 
-    segmentos_info = []
-    dados_para_ia = {'total_estudantes': len(df), 'idade_media_geral': round(df['idade'].mean(), 1), 'cursos_populares': df['curso_interesse'].value_counts().head(3).to_dict(), 'cidades_principais': df['cidade'].value_counts().head(3).to_dict(), 'segmentos': []}
-    for i in range(num_clusters):
-        df_segmento = df[df['segmento'] == i]
-        if not df_segmento.empty:
-            segmento_data = {'id': i, 'total': len(df_segmento), 'idade_media': round(df_segmento['idade'].mean(), 1), 'curso_principal': df_segmento['curso_interesse'].mode()[0], 'cidade_principal': df_segmento['cidade'].mode()[0], 'alunos': df_segmento.to_dict(orient='records')}
-            segmentos_info.append(segmento_data)
-            dados_para_ia['segmentos'].append({'id': i + 1, 'total_alunos': len(df_segmento), 'idade_media': round(df_segmento['idade'].mean(), 1), 'curso_principal': df_segmento['curso_interesse'].mode()[0], 'cidade_principal': df_segmento['cidade'].mode()[0]})
+    dados_para_ia = {'total_estudantes': resumo['total_estudantes'], 'idade_media_geral': resumo['idade_media_geral'], 'cursos_populares': resumo['cursos_populares'], 'cidades_principais': resumo['cidades_principais'],
+                     'segmentos': [{'id': s['id'] + 1, 'total_alunos': s['total'], 'idade_media': s['idade_media'], 'curso_principal': s['curso_principal'], 'cidade_principal': s['cidade_principal']} for s in resumo['segmentos']]}
 
     insights_ia = gerar_insights_com_ia(dados_para_ia)
-    graficos_data = preparar_dados_graficos(df, segmentos_info)
-    return render_template('ml_analysis_enhanced.html', title="Análise ML com IA", segmentos=segmentos_info, insights_ia=insights_ia, graficos_data=graficos_data, total_estudantes=len(df))
+    # Os gráficos buscam suas séries na API (/api/v1/graficos/...)
+    return render_template('ml_analysis_enhanced.html', title="Análise ML com IA", segmentos=segmentos_info, insights_ia=insights_ia, total_estudantes=resumo['total_estudantes'])
 
 # --- ROTAS GERAIS ---
 @main.route("/disconnect_google")
 @login_required
 def disconnect_google():
     current_user.google_credentials = None
+    incrementar_versao_dados(current_user.id)
     db.session.commit()
     flash('Sua conta Google foi desconectada.', 'info')
     return redirect(url_for('main.dashboard'))
 
 @main.route("/dashboard")
 @login_required
+@cache_por_versao
 def dashboard():
-    total_formularios = Planilha.query.filter_by(user_id=current_user.id).count()
-    total_estudantes = Estudante.query.filter_by(user_id=current_user.id).count()
-    ultimos_formularios = Planilha.query.filter_by(user_id=current_user.id).order_by(Planilha.data_cadastro.desc()).limit(5).all()
-    
-    grafico_labels, grafico_values = [], []
-    if total_estudantes > 0:
-        df = pd.read_sql(Estudante.query.filter_by(user_id=current_user.id).statement, db.engine)
-        if not df.empty and 'curso_interesse' in df.columns:
-            cursos_populares = df['curso_interesse'].value_counts().head(5)
-            grafico_labels = cursos_populares.index.tolist()
-            grafico_values = cursos_populares.values.tolist()
-            
+    # Os 5 formulários mais recentes e, na mesma consulta, o total (a janela é calculada antes do LIMIT)
+    recentes = (db.session.query(Planilha, func.count().over())
+                .filter(Planilha.user_id == current_user.id, Planilha.removida_em.is_(None))
+                .order_by(Planilha.data_cadastro.desc())
+                .limit(5).all())
+    ultimos_formularios = [planilha for planilha, _ in recentes]
+    total_formularios = recentes[0][1] if recentes else 0
+    total_estudantes = contar_estudantes(current_user.id)
+
+    # O gráfico de cursos populares busca a série em /api/v1/graficos/cursos?limite=5
     return render_template('dashboard.html', title="Dashboard",
                          total_formularios=total_formularios,
                          total_estudantes=total_estudantes,
-                         ultimos_formularios=ultimos_formularios,
-                         grafico_labels=grafico_labels,
-                         grafico_values=grafico_values)
+                         ultimos_formularios=ultimos_formularios)
@@ -0,0 +1,140 @@
+"""
+Divisão das planilhas entre vários workers de sincronização.
+
+Cada planilha tem uma linha em LeaseSincronizacao. Um worker reivindica um lote de
+planilhas livres (ou com lease expirado) com SELECT ... FOR UPDATE SKIP LOCKED,
+de modo que dois workers nunca pegam a mesma linha; enquanto processa, uma
+thread de heartbeat estende o lease. Se o worker cair, o lease expira e outro
+worker retoma a planilha. Ao gravar os dados, finalizar_lease() confere na
+mesma transação que o lease ainda é do worker (se não for, os dados são
+descartados com rollback).
+
+O SKIP LOCKED só tem efeito no PostgreSQL; no SQLite rode um único worker.
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import LeaseSincronizacao, Planilha
+
+
+def gerar_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def garantir_leases():
+    """Cria a linha de lease das planilhas que ainda não têm uma."""
+    sem_lease = (db.session.query(Planilha.id)
+                 .outerjoin(LeaseSincronizacao, LeaseSincronizacao.planilha_id == Planilha.id)
+                 .filter(LeaseSincronizacao.planilha_id.is_(None), Planilha.removida_em.is_(None))
+                 .all())
+    if not sem_lease:
+        return
+    try:
+        # Normalmente um único INSERT para todas
+        with db.session.begin_nested():
+            db.session.execute(insert(LeaseSincronizacao), [{'planilha_id': i} for (i,) in sem_lease])
+    except IntegrityError:
+        # Outro worker criou algumas das linhas ao mesmo tempo: cria as que faltam uma a uma
+        for (planilha_id,) in sem_lease:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(LeaseSincronizacao(planilha_id=planilha_id))
+            except IntegrityError:
+                pass
+    db.session.commit()
+
+
+def reivindicar_planilhas(worker_id, inicio_execucao, quantidade=1):
+    """
+    Reivindica até `quantidade` planilhas livres e devolve seus ids (lista vazia se não houver).
+
+    Planilhas sincronizadas depois de `inicio_execucao - SYNC_INTERVALO_SEGUNDOS`
+    ficam de fora, então cada planilha é processada uma vez por rodada mesmo
+    com vários workers.
+    """
+    agora = datetime.utcnow()
+    limite = inicio_execucao - timedelta(seconds=current_app.config.get('SYNC_INTERVALO_SEGUNDOS', 300))
+    leases = (LeaseSincronizacao.query
+              .filter(or_(LeaseSincronizacao.worker_id.is_(None), LeaseSincronizacao.expira_em < agora))
+              .filter(or_(LeaseSincronizacao.sincronizada_em.is_(None), LeaseSincronizacao.sincronizada_em < limite))
+              .filter(LeaseSincronizacao.planilha_id.in_(select(Planilha.id).where(Planilha.removida_em.is_(None))))
+              .order_by(LeaseSincronizacao.planilha_id)
+              .limit(quantidade)
+              .with_for_update(skip_locked=True)
+              .all())
+    expira_em = agora + timedelta(seconds=current_app.config.get('SYNC_LEASE_SEGUNDOS', 300))
+    for lease in leases:
+        if lease.worker_id:
+            print(f"Retomando a planilha {lease.planilha_id}: lease do worker '{lease.worker_id}' expirou.")
+        lease.worker_id = worker_id
+        lease.expira_em = expira_em
+        lease.heartbeat_em = agora
+    ids = [lease.planilha_id for lease in leases]
+    db.session.commit()
+    return ids
+
+
+def finalizar_lease(planilha_id, worker_id, erro=None):
+    """
+    Libera o lease e registra o fim da sincronização. Deve ser chamada antes do
+    commit dos dados: devolve False se o lease já não é deste worker.
+    """
+    atualizados = (LeaseSincronizacao.query
+                   .filter_by(planilha_id=planilha_id, worker_id=worker_id)
+                   .update({
+                       LeaseSincronizacao.worker_id: None,
+                       LeaseSincronizacao.expira_em: None,
+                       LeaseSincronizacao.sincronizada_em: datetime.utcnow(),
+                       LeaseSincronizacao.ultimo_erro: erro,
+                   }, synchronize_session=False))
+    return atualizados > 0
+
+
+def liberar_leases(planilha_ids, worker_id):
+    """Como finalizar_lease(), num único UPDATE, para planilhas que não precisaram ser gravadas."""
+    return (LeaseSincronizacao.query
+            .filter(LeaseSincronizacao.planilha_id.in_(planilha_ids), LeaseSincronizacao.worker_id == worker_id)
+            .update({
+                LeaseSincronizacao.worker_id: None,
+                LeaseSincronizacao.expira_em: None,
+                LeaseSincronizacao.sincronizada_em: datetime.utcnow(),
+                LeaseSincronizacao.ultimo_erro: None,
+            }, synchronize_session=False))
+
+
+class Heartbeat:
+    """Renova, em uma thread e conexão próprias, os leases do worker enquanto ele trabalha."""
+
+    def __init__(self, engine, worker_id, intervalo, duracao_lease):
+        self.engine = engine
+        self.worker_id = worker_id
+        self.intervalo = intervalo
+        self.duracao_lease = duracao_lease
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name=f"heartbeat-{worker_id}", daemon=True)
+
+    def _executar(self):
+        tabela = LeaseSincronizacao.__table__
+        while not self._parar.wait(self.intervalo):
+            agora = datetime.utcnow()
+            try:
+                with self.engine.begin() as conexao:
+                    conexao.execute(update(tabela)
+                                    .where(tabela.c.worker_id == self.worker_id)
+                                    .values(expira_em=agora + timedelta(seconds=self.duracao_lease),
+                                            heartbeat_em=agora))
+            except Exception as e:
+                print(f"ERRO ao renovar os leases do worker '{self.worker_id}': {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
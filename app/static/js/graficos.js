@@ -0,0 +1,11 @@
+// Busca uma série de gráfico na API JSON (/api/v1/graficos/...).
+// Retorna uma Promise com {labels: [...], values: [...]}.
+function buscarSerie(url) {
+    return fetch(url, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+        .then(function (resposta) {
+            if (!resposta.ok) {
+                throw new Error('Falha ao carregar ' + url + ': ' + resposta.status);
+            }
+            return resposta.json();
+        });
+}
@@ -0,0 +1,254 @@
+"""
+Processamento de planilhas em segundo plano.
+
+A rota process_sheet só enfileira uma TarefaProcessamento e devolve a página da
+tarefa; quem busca a planilha no Google, mapeia as colunas e grava os estudantes
+é o worker_tarefas.py, em outro processo. O worker reivindica tarefas pendentes
+com SELECT ... FOR UPDATE SKIP LOCKED (como os leases do sync_sheets.py) e grava
+os estudantes em lotes de TAREFAS_LOTE_LINHAS: cada lote é commitado junto com
+os contadores da tarefa, que a página acompanha por Server-Sent Events.
+
+Cada commit confere que a tarefa ainda é do worker. Uma tarefa 'executando' sem
+atualização há mais de TAREFAS_TIMEOUT_SEGUNDOS (worker que caiu) volta a ser
+reivindicável e é refeita do início, apagando o que o worker anterior gravou.
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from google.oauth2.credentials import Credentials
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.cache import incrementar_versao_dados
+from app.dimensoes import CacheDimensoes
+from app.google_credentials import build_google_service
+from app.metrics import medir_etapa, perfil_consultas
+from app.models import Estudante, Planilha, TarefaProcessamento
+from app.utils import get_column_mapping_from_ai
+
+ATIVAS = ('pendente', 'executando')
+FINALIZADAS = ('concluida', 'erro')
+
+
+class TarefaPerdida(Exception):
+    """A tarefa foi reivindicada por outro worker (ou removida) durante a execução."""
+
+
+def enfileirar_processamento(planilha):
+    """Cria a tarefa de processamento da planilha (ou reaproveita a que já está na fila) e devolve seu id."""
+    tarefa_id = (db.session.query(TarefaProcessamento.id)
+                 .filter(TarefaProcessamento.planilha_id == planilha.id, TarefaProcessamento.status.in_(ATIVAS))
+                 .order_by(TarefaProcessamento.id.desc())
+                 .limit(1)
+                 .scalar())
+    if tarefa_id is None:
+        tarefa = TarefaProcessamento(planilha_id=planilha.id, user_id=planilha.user_id)
+        db.session.add(tarefa)
+        db.session.flush()
+        # Lido antes do commit, que expiraria o objeto (e acessar o id faria outra consulta)
+        tarefa_id = tarefa.id
+        db.session.commit()
+    return tarefa_id
+
+
+def reivindicar_tarefa(worker_id):
+    """Reivindica a tarefa pendente mais antiga (ou uma abandonada por um worker que caiu)."""
+    agora = datetime.utcnow()
+    limite = agora - timedelta(seconds=current_app.config.get('TAREFAS_TIMEOUT_SEGUNDOS', 300))
+    tarefa = (TarefaProcessamento.query
+              .filter(or_(TarefaProcessamento.status == 'pendente',
+                          and_(TarefaProcessamento.status == 'executando',
+                               TarefaProcessamento.atualizada_em < limite)))
+              .order_by(TarefaProcessamento.id)
+              .limit(1)
+              .with_for_update(skip_locked=True)
+              .first())
+    if tarefa is None:
+        db.session.commit()
+        return None
+    if tarefa.status == 'executando':
+        print(f"Retomando a tarefa {tarefa.id}: o worker '{tarefa.worker_id}' parou de atualizá-la.")
+    tarefa.status = 'executando'
+    tarefa.etapa = 'na fila do worker'
+    tarefa.worker_id = worker_id
+    tarefa.iniciada_em = tarefa.atualizada_em = agora
+    tarefa.linhas_buscadas = tarefa.linhas_lidas = tarefa.linhas_gravadas = tarefa.linhas_rejeitadas = 0
+    db.session.commit()
+    return tarefa
+
+
+def _atualizar(tarefa_id, worker_id, **campos):
+    """Atualiza a tarefa na transação atual se ela ainda for deste worker; senão, TarefaPerdida."""
+    campos['atualizada_em'] = datetime.utcnow()
+    atualizadas = (TarefaProcessamento.query
+                   .filter_by(id=tarefa_id, worker_id=worker_id, status='executando')
+                   .update(campos, synchronize_session=False))
+    if not atualizadas:
+        db.session.rollback()
+        raise TarefaPerdida(f"Tarefa {tarefa_id} não pertence mais ao worker '{worker_id}'.")
+
+
+def _converter_linha(row, column_map, dimensoes):
+    """Converte uma resposta do formulário nos valores de inserção de Estudante."""
+    def celula(campo, padrao=None):
+        indice = column_map.get(campo)
+        return row[indice] if indice is not None and len(row) > indice else padrao
+
+    idade = celula('idade')
+    return {
+        'nome': row[column_map['nome']],
+        'idade': int(idade) if idade and idade.isdigit() else None,
+        'cidade_id': dimensoes.id_cidade(celula('cidade')),
+        'curso_id': dimensoes.id_curso(celula('curso_interesse', "Não especificado")),
+        'dispositivo_acesso': random.choice(['Desktop', 'Mobile']),
+    }
+
+
+def executar_tarefa(tarefa, worker_id):
+    """Busca a planilha, mapeia as colunas e substitui os estudantes, atualizando o progresso."""
+    tarefa_id, planilha_id, user_id = tarefa.id, tarefa.planilha_id, tarefa.user_id
+    lote = current_app.config.get('TAREFAS_LOTE_LINHAS', 500)
+    dados_alterados = False
+    try:
+        # Planilha e usuário numa consulta só
+        planilha = (Planilha.query.options(joinedload(Planilha.author))
+                    .filter_by(id=planilha_id, removida_em=None).first())
+        if planilha is None:
+            return _finalizar(tarefa_id, worker_id, 'erro', 'O formulário foi desconectado.')
+        print(f"--- Tarefa {tarefa_id}: planilha '{planilha.nome_amigavel}' (ID: {planilha_id}) ---")
+        user = planilha.author
+        if not user or not user.google_credentials:
+            return _finalizar(tarefa_id, worker_id, 'erro', 'Conecte sua conta Google para processar o formulário.')
+
+        _atualizar(tarefa_id, worker_id, etapa='buscando respostas no Google')
+        db.session.commit()
+        with medir_etapa('tarefa.buscar'):
+            creds = Credentials.from_authorized_user_info(json.loads(user.google_credentials))
+            service = build_google_service('sheets', 'v4', creds)
+            values = service.spreadsheets().values().get(spreadsheetId=planilha.spreadsheet_id,
+                                                         range=planilha.range_name).execute().get('values', [])
+        if not values or len(values) < 2:
+            return _finalizar(tarefa_id, worker_id, 'erro', 'Nenhum dado encontrado no formulário para processar.')
+
+        _atualizar(tarefa_id, worker_id, etapa='mapeando colunas', linhas_buscadas=len(values) - 1)
+        db.session.commit()
+        column_map = get_column_mapping_from_ai(values[0])
+        if not column_map or column_map.get('nome') is None:
+            return _finalizar(tarefa_id, worker_id, 'erro', 'Não foi possível identificar a coluna "nome" no formulário.')
+
+        # A remoção dos estudantes antigos vai no mesmo commit do primeiro lote, junto com uma nova
+        # versão dos dados: as páginas em cache deixam de valer assim que a troca começa
+        Estudante.query.filter_by(planilha_origem_id=planilha_id).delete(synchronize_session=False)
+        incrementar_versao_dados(user_id)
+        dados_alterados = True
+        # Os lotes são gravados em commits separados: a próxima sincronização baixa a planilha
+        # de novo em vez de confiar na versão do Drive registrada antes desta gravação
+        planilha.drive_versao = None
+        dimensoes = CacheDimensoes()
+        linhas = values[1:]
+        dimensoes.precarregar_respostas(linhas, column_map)
+        lidas = gravadas = rejeitadas = 0
+        with medir_etapa('tarefa.gravar'):
+            for inicio in range(0, len(linhas), lote):
+                novos = []
+                for row in linhas[inicio:inicio + lote]:
+                    lidas += 1
+                    try:
+                        novos.append(dict(_converter_linha(row, column_map, dimensoes),
+                                          planilha_origem_id=planilha_id, user_id=user_id))
+                    except (IndexError, ValueError, KeyError) as e:
+                        rejeitadas += 1
+                        print(f"Linha ignorada: {row} | Erro: {e}")
+                if novos:
+                    # render_nulls: um INSERT por lote, sem separar as linhas pelos campos vazios
+                    db.session.execute(insert(Estudante).execution_options(render_nulls=True), novos)
+                    gravadas += len(novos)
+                _atualizar(tarefa_id, worker_id, etapa='gravando estudantes', linhas_lidas=lidas,
+                           linhas_gravadas=gravadas, linhas_rejeitadas=rejeitadas)
+                db.session.commit()
+
+        # Páginas geradas durante a gravação viram só parte dos lotes
+        incrementar_versao_dados(user_id)
+        return _finalizar(tarefa_id, worker_id, 'concluida', f'{gravadas} respostas processadas com sucesso!')
+    except TarefaPerdida as e:
+        print(f"AVISO: {e} Resultado descartado.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"ERRO na tarefa {tarefa_id}: {e}")
+        if dados_alterados:
+            # Os lotes já gravados ficam no banco: o cache precisa enxergar essa mudança
+            incrementar_versao_dados(user_id)
+            db.session.commit()
+        try:
+            _finalizar(tarefa_id, worker_id, 'erro', f'Erro ao processar o formulário: {e}')
+        except TarefaPerdida:
+            pass
+
+
+def _finalizar(tarefa_id, worker_id, status, mensagem):
+    _atualizar(tarefa_id, worker_id, status=status, etapa=None, mensagem=mensagem,
+               finalizada_em=datetime.utcnow())
+    db.session.commit()
+    print(f"Tarefa {tarefa_id} {status}: {mensagem}")
+
+
+def processar_pendentes(worker_id, limite=None):
+    """Executa tarefas até a fila esvaziar (ou até `limite` tarefas). Devolve quantas executou."""
+    executadas = 0
+    while limite is None or executadas < limite:
+        tarefa = reivindicar_tarefa(worker_id)
+        if tarefa is None:
+            break
+        with perfil_consultas('tarefa.processar'):
+            executar_tarefa(tarefa, worker_id)
+        executadas += 1
+    return executadas
+
+
+def como_dicionario(tarefa):
+    """Estado da tarefa enviado à página (JSON dos eventos)."""
+    return {
+        'id': tarefa.id,
+        'status': tarefa.status,
+        'etapa': tarefa.etapa,
+        'linhas_buscadas': tarefa.linhas_buscadas,
+        'linhas_lidas': tarefa.linhas_lidas,
+        'linhas_gravadas': tarefa.linhas_gravadas,
+        'linhas_rejeitadas': tarefa.linhas_rejeitadas,
+        'mensagem': tarefa.mensagem,
+    }
+
+
+def eventos_da_tarefa(tarefa_id, user_id):
+    """
+    Gera o fluxo Server-Sent Events de uma tarefa: um evento 'progresso' a cada
+    mudança e um evento 'fim' quando ela termina. Depois de TAREFAS_SSE_DURACAO_MAXIMA
+    segundos o fluxo é encerrado para liberar o worker web; o EventSource do
+    navegador reconecta sozinho e continua de onde parou.
+    """
+    intervalo = current_app.config.get('TAREFAS_SSE_INTERVALO_SEGUNDOS', 0.5)
+    fim = time.monotonic() + current_app.config.get('TAREFAS_SSE_DURACAO_MAXIMA', 55)
+    ultimo, ultimo_envio = None, time.monotonic()
+    yield 'retry: 1000\n\n'
+    while time.monotonic() < fim:
+        tarefa = TarefaProcessamento.query.filter_by(id=tarefa_id, user_id=user_id).first()
+        estado = como_dicionario(tarefa) if tarefa else None
+        # Devolve a conexão ao pool entre as consultas; o fluxo pode durar quase um minuto
+        db.session.close()
+        if estado is None:
+            yield 'event: fim\ndata: {"status": "removida"}\n\n'
+            return
+        if estado != ultimo:
+            ultimo, ultimo_envio = estado, time.monotonic()
+            dados = json.dumps(estado, ensure_ascii=False)
+            if estado['status'] in FINALIZADAS:
+                yield f'event: fim\ndata: {dados}\n\n'
+                return
+            yield f'event: progresso\ndata: {dados}\n\n'
+        elif time.monotonic() - ultimo_envio > 15:
+            # Comentário SSE: mantém a conexão viva em proxies que cortam conexões ociosas
+            ultimo_envio = time.monotonic()
+            yield ': ping\n\n'
+        time.sleep(intervalo)
@@ -1,15 +1,21 @@
 import os
 import json
 import re
-import sib_api_v3_sdk
-from sib_api_v3_sdk.rest import ApiException
-import google.generativeai as genai
+from flask import current_app, has_app_context
+from app.cache import nao_guardar_em_cache
+from app.mapeamento import confianca_suficiente, mapear_colunas_local, validar_mapeamento
+from app.metrics import MAPEAMENTO_COLUNAS, medir_etapa, medir_gemini
+
+# O SDK da Brevo e o google.generativeai são pesados; são importados só quando usados.
 
 # Cache em memória
 column_mapping_cache = {}
 
 def send_email(to_email, subject, html_content):
     """Envia e-mails usando a API da Brevo."""
+    import sib_api_v3_sdk
+    from sib_api_v3_sdk.rest import ApiException
+
     configuration = sib_api_v3_sdk.Configuration()
     configuration.api_key['api-key'] = os.environ.get('BREVO_API_KEY')
     api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
@@ -25,52 +31,133 @@ def send_email(to_email, subject, html_content):
         print(f"Erro ao enviar e-mail: {e}")
 
 
+def configurar_gemini():
+    """
+    Configura e devolve o módulo do Gemini.
+    GEMINI_API_ENDPOINT aponta para outro servidor (testes de carga).
+    """
+    import google.generativeai as genai
+    endpoint = os.environ.get("GEMINI_API_ENDPOINT")
+    if endpoint:
+        genai.configure(api_key=os.environ.get("GEMINI_API_KEY"), transport='rest',
+                        client_options={'api_endpoint': endpoint})
+    else:
+        genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+    return genai
+
+
 def fallback_column_mapping(header_row):
-    """Mapeamento manual com busca por palavras-chave."""
-    mapping = {'nome': None, 'idade': None, 'cidade': None, 'curso_interesse': None}
-    patterns = {
-        'nome': [r'nome', r'name'],
-        'idade': [r'idade', r'age'],
-        'cidade': [r'cidade', r'city'],
-        'curso_interesse': [r'curso', r'interesse']
-    }
-    for field, pattern_list in patterns.items():
-        for idx, header in enumerate(header_row):
-            for pattern in pattern_list:
-                if re.search(pattern, str(header).lower()):
-                    mapping[field] = idx
-                    break
-            if mapping[field] is not None:
-                break
-    return mapping
+    """Mapeamento local por sinônimos (sem IA); ver app/mapeamento.py."""
+    return mapear_colunas_local(header_row)[0]
+
+
+def _mapear_com_gemini(header_row):
+    """Pede ao Gemini o mapeamento de um cabeçalho; devolve None se a resposta não for válida."""
+    genai = configurar_gemini()
+    model = genai.GenerativeModel('models/gemini-pro-latest')
+    prompt = f"""Mapeie os cabeçalhos para o esquema: {json.dumps(header_row)}. Retorne APENAS JSON com as chaves 'nome', 'idade', 'cidade', 'curso_interesse' e seus índices correspondentes ou null."""
+    with medir_gemini('column_mapping'):
+        response = model.generate_content(prompt)
+    cleaned = re.sub(r'```json\s*|```\s*', '', response.text.strip())
+    return validar_mapeamento(json.loads(cleaned), len(header_row))
 
 
 def get_column_mapping_from_ai(header_row):
-    """Mapeia colunas usando IA ou fallback."""
+    """
+    Mapeia colunas com o mapeador local e só consulta a IA quando a confiança
+    local fica abaixo de MAPEAMENTO_CONFIANCA_MINIMA.
+    """
     header_key = tuple(header_row)
     if header_key in column_mapping_cache:
         return column_mapping_cache[header_key]
 
-    try:
-        genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-        model = genai.GenerativeModel('models/gemini-pro-latest')
-        prompt = f"""Mapeie os cabeçalhos para o esquema: {json.dumps(header_row)}. Retorne APENAS JSON com as chaves 'nome', 'idade', 'cidade', 'curso_interesse' e seus índices correspondentes ou null."""
-        response = model.generate_content(prompt)
-        cleaned = re.sub(r'```json\s*|```\s*', '', response.text.strip())
-        mapping = json.loads(cleaned)
-        if mapping.get('nome') is None:
-            raise ValueError("IA não encontrou a coluna 'nome'")
+    mapping, confianca = mapear_colunas_local(header_row)
+    if confianca_suficiente(confianca, _limiar_confianca()):
+        MAPEAMENTO_COLUNAS.labels(origem='local').inc()
         column_mapping_cache[header_key] = mapping
         return mapping
+
+    try:
+        mapping_ia = _mapear_com_gemini(header_row)
+        if mapping_ia is None:
+            raise ValueError("IA não encontrou a coluna 'nome' ou devolveu índices inválidos")
+        MAPEAMENTO_COLUNAS.labels(origem='gemini').inc()
+        column_mapping_cache[header_key] = mapping_ia
+        return mapping_ia
     except Exception as e:
-        print(f"Erro na IA, usando fallback: {e}")
-        return fallback_column_mapping(header_row)
+        print(f"Erro na IA, usando o mapeamento local (confiança {confianca}): {e}")
+        MAPEAMENTO_COLUNAS.labels(origem='fallback').inc()
+        return mapping
+
+
+def mapear_cabecalhos_em_lote(cabecalhos):
+    """
+    Mapeia vários cabeçalhos de uma vez (usado pelo sync_sheets.py). Os que já
+    estão no cache ou que o mapeador local resolve com confiança não vão para a
+    IA; os demais são enviados em prompts com até MAPEAMENTO_LOTE_MAXIMO
+    cabeçalhos cada. Cada resposta é validada individualmente, e entradas
+    inválidas (ou um lote que falhou) ficam com o mapeamento local.
+    Devolve {tuple(cabeçalho): mapeamento}.
+    """
+    limiar = _limiar_confianca()
+    resultado, pendentes = {}, {}
+    for header_row in cabecalhos:
+        chave = tuple(header_row)
+        if chave in resultado or chave in pendentes:
+            continue
+        if chave in column_mapping_cache:
+            resultado[chave] = column_mapping_cache[chave]
+            continue
+        mapping, confianca = mapear_colunas_local(header_row)
+        if confianca_suficiente(confianca, limiar):
+            MAPEAMENTO_COLUNAS.labels(origem='local').inc()
+            column_mapping_cache[chave] = resultado[chave] = mapping
+        else:
+            pendentes[chave] = mapping
+
+    tamanho_lote = current_app.config.get('MAPEAMENTO_LOTE_MAXIMO', 20) if has_app_context() else 20
+    chaves = list(pendentes)
+    for inicio in range(0, len(chaves), tamanho_lote):
+        lote = chaves[inicio:inicio + tamanho_lote]
+        try:
+            respostas = _mapear_lote_com_gemini(lote)
+        except Exception as e:
+            print(f"Erro na IA ao mapear {len(lote)} cabeçalhos em lote, usando o mapeamento local: {e}")
+            respostas = {}
+        for i, chave in enumerate(lote):
+            mapping_ia = validar_mapeamento(respostas.get(str(i)), len(chave))
+            if mapping_ia is None:
+                MAPEAMENTO_COLUNAS.labels(origem='fallback').inc()
+                resultado[chave] = pendentes[chave]
+            else:
+                MAPEAMENTO_COLUNAS.labels(origem='gemini').inc()
+                column_mapping_cache[chave] = resultado[chave] = mapping_ia
+    return resultado
+
+
+def _mapear_lote_com_gemini(lote):
+    """Um único prompt para vários cabeçalhos; devolve {id do conjunto: mapeamento bruto}."""
+    genai = configurar_gemini()
+    model = genai.GenerativeModel('models/gemini-pro-latest')
+    conjuntos = {str(i): list(chave) for i, chave in enumerate(lote)}
+    prompt = f"""Mapeie cada conjunto de cabeçalhos para o esquema 'nome', 'idade', 'cidade', 'curso_interesse'. Retorne APENAS um objeto JSON cujas chaves são os ids dos conjuntos e cujos valores são objetos com essas quatro chaves e os índices correspondentes (a partir de 0) ou null. Conjuntos: {json.dumps(conjuntos, ensure_ascii=False)}"""
+    with medir_gemini('column_mapping_lote'):
+        response = model.generate_content(prompt)
+    cleaned = re.sub(r'```json\s*|```\s*', '', response.text.strip())
+    respostas = json.loads(cleaned)
+    return respostas if isinstance(respostas, dict) else {}
+
+
+def _limiar_confianca():
+    if has_app_context():
+        return current_app.config.get('MAPEAMENTO_CONFIANCA_MINIMA', 0.8)
+    return 0.8
 
 
 def gerar_insights_com_ia(dados):
     """Usa Gemini para gerar insights inteligentes sobre os dados dos estudantes."""
     try:
-        genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+        genai = configurar_gemini()
         model = genai.GenerativeModel('models/gemini-pro-latest')
         
         prompt = f"""Você é um especialista em análise de dados educacionais e marketing. Analise os seguintes dados e forneça insights acionáveis em formato JSON:
@@ -94,7 +181,8 @@ REGRAS:
 - Responda APENAS com JSON válido.
 - Seja profissional e acionável.
 """
-        response = model.generate_content(prompt)
+        with medir_gemini('insights'):
+            response = model.generate_content(prompt)
         cleaned = re.sub(r'```json\s*|```\s*', '', response.text.strip())
         insights = json.loads(cleaned)
         
@@ -107,6 +195,8 @@ REGRAS:
         
     except Exception as e:
         print(f"❌ Erro ao gerar insights com IA: {e}")
+        # A página com os insights de contingência não fica no cache: o próximo acesso tenta o Gemini de novo
+        nao_guardar_em_cache()
         return gerar_insights_fallback(dados)
 
 
@@ -127,24 +217,127 @@ def gerar_insights_fallback(dados):
     }
 
 
-def preparar_dados_graficos(df, segmentos):
+CORES_SEGMENTOS = ['#0049ac', '#fb1515', '#282e47', '#6c757d', '#2a9d8f', '#f4a261', '#8338ec', '#e9c46a']
+
+
+def segmentar_estudantes(df, num_clusters=None, k_escolhido=None):
+    """
+    Prepara os dados (idade, cidade e curso), agrupa os estudantes com K-Means
+    e resume cada segmento. Devolve o DataFrame com a coluna 'segmento' e a lista de segmentos.
+    Sem `num_clusters`, o número de segmentos é escolhido por app/clusters.py
+    (ou vem de SEGMENTOS_NUM_CLUSTERS, se SEGMENTOS_K_AUTOMATICO=0); com
+    `k_escolhido` (o k já escolhido para esses dados), a escolha é pulada e o
+    resultado é o mesmo da segmentação que o escolheu. O k usado fica em
+    df.attrs['num_clusters'].
+    """
+    import pandas as pd
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import OneHotEncoder
+
+    with medir_etapa('ml_analysis.preparo'):
+        idades = pd.to_numeric(df['idade'], errors='coerce').astype('float32')
+        df['idade'] = idades.fillna(idades.median() if pd.notna(idades.median()) else 20)
+        for coluna, padrao in (('cidade', 'Desconhecida'), ('curso_interesse', 'Não especificado')):
+            if isinstance(df[coluna].dtype, pd.CategoricalDtype) and padrao not in df[coluna].cat.categories:
+                df[coluna] = df[coluna].cat.add_categories([padrao])
+            df[coluna] = df[coluna].fillna(padrao)
+        if 'timestamp_cadastro' in df:
+            df['timestamp_cadastro'] = pd.to_datetime(df['timestamp_cadastro'])
+
+    with medir_etapa('ml_analysis.one_hot'):
+        features = df[['idade', 'cidade', 'curso_interesse']]
+        encoder = OneHotEncoder(handle_unknown='ignore')
+        features_encoded = encoder.fit_transform(features[['cidade', 'curso_interesse']])
+        features_final = pd.concat([features[['idade']].reset_index(drop=True), pd.DataFrame(features_encoded.toarray(), columns=encoder.get_feature_names_out())], axis=1)
+
+    centros = None
+    automatico = has_app_context() and current_app.config.get('SEGMENTOS_K_AUTOMATICO', True)
+    if num_clusters is None and automatico:
+        from app.clusters import centros_da_amostra, escolher_num_clusters
+        with medir_etapa('ml_analysis.escolha_k'):
+            matriz = features_final.to_numpy(dtype='float64')
+            if k_escolhido:
+                num_clusters = k_escolhido
+            else:
+                num_clusters, centros, _ = escolher_num_clusters(matriz, df['curso_interesse'])
+            if centros is None:
+                # Também quando o orçamento acabou e vale o k padrão: o ajuste final parte sempre
+                # dos centros da amostra, como em quem repete o k escolhido
+                centros = centros_da_amostra(matriz, df['curso_interesse'], num_clusters)
+    elif num_clusters is None:
+        num_clusters = current_app.config.get('SEGMENTOS_NUM_CLUSTERS', 3) if has_app_context() else 3
+
+    num_clusters = min(num_clusters, len(df))
+    df.attrs['num_clusters'] = num_clusters
+    with medir_etapa('ml_analysis.kmeans'):
+        if centros is not None:
+            # Parte dos centros da amostra: uma inicialização basta
+            kmeans = KMeans(n_clusters=num_clusters, init=centros, n_init=1, random_state=42)
+        else:
+            kmeans = KMeans(n_clusters=num_clusters, random_state=42, n_init=10)
+        df['segmento'] = kmeans.fit_predict(features_final)
+
+    segmentos_info = []
+    with medir_etapa('ml_analysis.segmentos'):
+        for i in range(num_clusters):
+            df_segmento = df[df['segmento'] == i]
+            if not df_segmento.empty:
+                segmentos_info.append({'id': i, 'total': len(df_segmento), 'idade_media': round(float(df_segmento['idade'].mean()), 1), 'curso_principal': df_segmento['curso_interesse'].mode()[0], 'cidade_principal': df_segmento['cidade'].mode()[0], 'alunos': df_segmento.to_dict(orient='records')})
+    return df, segmentos_info
+
+
+def serie_contagem(coluna, limite=None):
+    """Série {labels, values} com a contagem de cada valor de uma coluna (ex.: cursos, cidades)."""
+    contagem = coluna.value_counts()
+    # Colunas categóricas também contam as categorias sem ocorrências
+    contagem = contagem[contagem > 0]
+    if limite:
+        contagem = contagem.head(limite)
+    return {'labels': contagem.index.tolist(), 'values': contagem.values.tolist()}
+
+
+def mais_frequentes(coluna, limite=3):
+    """{valor: contagem} dos `limite` valores mais frequentes de uma coluna."""
+    contagem = coluna.value_counts()
+    return {str(k): int(v) for k, v in contagem[contagem > 0].head(limite).items()}
+
+
+def serie_distribuicao_segmentos(segmentos):
+    return {
+        'labels': [f"Perfil {s['id']+1}" for s in segmentos],
+        'values': [s['total'] for s in segmentos],
+        'cores': [CORES_SEGMENTOS[i % len(CORES_SEGMENTOS)] for i in range(len(segmentos))]
+    }
+
+
+def serie_idade_por_segmento(segmentos):
+    return {
+        'labels': [f"Perfil {s['id']+1}" for s in segmentos],
+        'values': [s['idade_media'] for s in segmentos]
+    }
+
+
+def serie_timeline_cadastros(df, dias=7):
+    """
+    Cadastros por dia nos últimos `dias` dias, contados até o cadastro mais recente.
+    Dias sem cadastro aparecem com zero.
+    """
+    import pandas as pd
+    datas = pd.to_datetime(df['timestamp_cadastro']).dt.normalize()
+    if datas.empty:
+        return {'labels': [], 'values': []}
+    periodo = pd.date_range(end=datas.max(), periods=dias, freq='D')
+    contagem = datas[datas >= periodo[0]].value_counts().reindex(periodo, fill_value=0)
+    return {
+        'labels': periodo.strftime('%Y-%m-%d').tolist(),
+        'values': contagem.values.tolist()
+    }
+
+
+def preparar_dados_graficos(df, segmentos, dias_timeline=7):
     """Prepara dados formatados para visualizações JavaScript/Chart.js."""
-    cores_segmentos = ['#0049ac', '#fb1515', '#282e47', '#6c757d']
-    
-    timeline_data = df.groupby(df['timestamp_cadastro'].dt.date).size()
-    
     return {
-        'distribuicao_segmentos': {
-            'labels': [f"Perfil {s['id']+1}" for s in segmentos],
-            'values': [s['total'] for s in segmentos],
-            'cores': cores_segmentos[:len(segmentos)]
-        },
-        'idade_por_segmento': {
-            'labels': [f"Perfil {s['id']+1}" for s in segmentos],
-            'values': [s['idade_media'] for s in segmentos]
-        },
-        'timeline_cadastros': {
-            'labels': timeline_data.index.astype(str).tolist()[-7:],
-            'values': timeline_data.values.tolist()[-7:]
-        }
-    }
\ No newline at end of file
+        'distribuicao_segmentos': serie_distribuicao_segmentos(segmentos),
+        'idade_por_segmento': serie_idade_por_segmento(segmentos),
+        'timeline_cadastros': serie_timeline_cadastros(df, dias_timeline)
+    }
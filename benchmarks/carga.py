@@ -0,0 +1,307 @@
+"""
+Teste de carga ponta a ponta.
+
+Sobe a aplicação com o Gunicorn apontada para o servidor falso do Google,
+cria um usuário (com um formulário) por usuário virtual e executa em paralelo
+a jornada login -> dashboard -> process_sheet -> analysis -> ml_analysis,
+reportando p50/p95/p99 e vazão por rota. Um worker_tarefas.py executa os
+processamentos enfileirados; 'tarefa' é o tempo entre o pedido e o evento SSE
+de fim da tarefa.
+
+A jornada 'google' (--jornada google) repete só as rotas que esperam o Google
+(search_sheets e process_sheet). Com --capacidade, o teste roda em cada
+quantidade de usuários indicada e informa a maior que o servidor atende com o
+p95 de search_sheets abaixo de --p95-maximo e sem erros.
+
+Uso:
+    python -m benchmarks.carga --usuarios 20 --duracao 60 --workers 4 --latencia 0.3 --taxa-erro 0.02
+    python -m benchmarks.carga --jornada google --capacidade 10 20 40 80 --latencia 0.3
+
+Por padrão usa um SQLite temporário; para resultados realistas com vários
+workers gravando ao mesmo tempo, defina BENCH_DATABASE_URL com um PostgreSQL.
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+import requests
+from sqlalchemy import insert
+
+from config import Config
+from app import create_app, db, bcrypt
+from app.models import User, Planilha, Estudante
+from benchmarks.fake_google_server import FakeGoogleServer
+from benchmarks.fakes import CREDENCIAIS_FALSAS
+from benchmarks.geradores import gerar_estudantes
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRETORIO_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+SENHA = 'senha-carga'
+ROTAS = ['login', 'dashboard', 'search_sheets', 'process_sheet', 'tarefa', 'analysis', 'ml_analysis']
+
+
+def url_banco():
+    return os.environ.get('BENCH_DATABASE_URL',
+                          'sqlite:///' + os.path.join(tempfile.gettempdir(), 'meu_app_carga.sqlite'))
+
+
+def preparar_base(n_usuarios, estudantes_por_usuario):
+    """Recria as tabelas com um usuário e um formulário por usuário virtual."""
+    class CargaConfig(Config):
+        SECRET_KEY = 'carga'
+        SQLALCHEMY_DATABASE_URI = url_banco()
+
+    app = create_app(CargaConfig)
+    senha = bcrypt.generate_password_hash(SENHA).decode('utf-8')
+    usuarios = []
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for i in range(n_usuarios):
+            user = User(username=f'carga{i}', email=f'carga{i}@exemplo.com', confirmed=True,
+                        password_hash=senha, google_credentials=CREDENCIAIS_FALSAS)
+            db.session.add(user)
+            db.session.flush()
+            planilha = Planilha(nome_amigavel=f'Formulário {i}', spreadsheet_id=f'planilha-carga-{i}',
+                                range_name='Respostas ao formulário 1!A:Z', user_id=user.id)
+            db.session.add(planilha)
+            db.session.flush()
+            db.session.execute(insert(Estudante), gerar_estudantes(estudantes_por_usuario, user.id,
+                                                                   planilha.id, seed=i))
+            usuarios.append((user.email, planilha.id))
+        db.session.commit()
+    return usuarios
+
+
+def ambiente(url_google):
+    return dict(os.environ,
+                DATABASE_URL=url_banco(),
+                SECRET_KEY='carga',
+                GOOGLE_API_ENDPOINT=url_google + '/',
+                GEMINI_API_ENDPOINT=url_google,
+                GEMINI_API_KEY='chave-falsa',
+                METRICS_LOG_REQUESTS='0',
+                TAREFAS_INTERVALO_SEGUNDOS='0.2')
+
+
+def subir_worker_tarefas(url_google):
+    return subprocess.Popen([sys.executable, 'worker_tarefas.py', '--worker-id', 'carga'], cwd=RAIZ,
+                            env=ambiente(url_google), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def subir_gunicorn(porta, workers, url_google, worker_class=None):
+    env = ambiente(url_google)
+    # graceful-timeout curto: os workers gthread podem esperar o prazo inteiro ao desligar
+    comando = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--graceful-timeout', '5',
+               '--bind', f'127.0.0.1:{porta}', '--workers', str(workers)]
+    if worker_class:
+        comando += ['--worker-class', worker_class]
+    processo = subprocess.Popen(comando + ['run:app'], cwd=RAIZ, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base = f'http://127.0.0.1:{porta}'
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f"Gunicorn encerrou ao iniciar:\n{processo.stderr.read().decode()}")
+        try:
+            requests.get(base + '/login', timeout=5)
+            return processo, base
+        except requests.RequestException:
+            time.sleep(0.25)
+    processo.terminate()
+    raise RuntimeError('Gunicorn não respondeu em 60 segundos.')
+
+
+class UsuarioVirtual(threading.Thread):
+    def __init__(self, base, email, planilha_id, fim, registros, trava, jornada='completa'):
+        super().__init__(daemon=True)
+        self.base = base
+        self.jornada = jornada
+        self.email = email
+        self.planilha_id = planilha_id
+        self.fim = fim
+        self.registros = registros
+        self.trava = trava
+        self.sessao = requests.Session()
+        self.ultima_resposta = None
+
+    def _chamar(self, rota, metodo, caminho, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            resposta = self.sessao.request(metodo, self.base + caminho, allow_redirects=False,
+                                           timeout=180, **kwargs)
+            status = resposta.status_code
+        except requests.RequestException:
+            resposta, status = None, None
+        self.ultima_resposta = resposta
+        with self.trava:
+            self.registros.append((rota, time.perf_counter() - inicio, status))
+        return status
+
+    def _acompanhar_tarefa(self, inicio):
+        """Segue o fluxo SSE da tarefa (reconectando como o EventSource) até o evento 'fim'."""
+        resposta = self.ultima_resposta
+        caminho = urlsplit(resposta.headers.get('Location', '')).path if resposta is not None else ''
+        status = None
+        try:
+            while caminho and time.perf_counter() - inicio < 180:
+                with self.sessao.get(self.base + caminho + '/eventos',
+                                     stream=True, timeout=180) as resposta:
+                    status = resposta.status_code
+                    if status != 200:
+                        break
+                    if any(linha == 'event: fim' for linha in resposta.iter_lines(decode_unicode=True)):
+                        break
+        except requests.RequestException:
+            status = None
+        with self.trava:
+            self.registros.append(('tarefa', time.perf_counter() - inicio, status))
+
+    def run(self):
+        self._chamar('login', 'POST', '/login', data={'email': self.email, 'password': SENHA})
+        while time.monotonic() < self.fim:
+            if self.jornada == 'google':
+                # Só as rotas que esperam o Google; a tarefa enfileirada não é acompanhada
+                self._chamar('search_sheets', 'GET', '/search_sheets')
+                self._chamar('process_sheet', 'GET', f'/process_sheet/{self.planilha_id}')
+                continue
+            self._chamar('dashboard', 'GET', '/dashboard')
+            inicio = time.perf_counter()
+            self._chamar('process_sheet', 'GET', f'/process_sheet/{self.planilha_id}')
+            self._acompanhar_tarefa(inicio)
+            self._chamar('analysis', 'GET', '/analysis')
+            self._chamar('ml_analysis', 'GET', '/ml_analysis')
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[indice]
+
+
+def resumir(registros, duracao):
+    resumo = {}
+    for rota in ROTAS:
+        tempos = sorted(t for r, t, _ in registros if r == rota)
+        erros = sum(1 for r, _, s in registros if r == rota and (s is None or s >= 500))
+        if not tempos:
+            continue
+        resumo[rota] = {
+            'requisicoes': len(tempos),
+            'erros': erros,
+            'vazao_rps': round(len(tempos) / duracao, 2),
+            'p50_ms': round(percentil(tempos, 50) * 1000, 1),
+            'p95_ms': round(percentil(tempos, 95) * 1000, 1),
+            'p99_ms': round(percentil(tempos, 99) * 1000, 1),
+            'max_ms': round(tempos[-1] * 1000, 1),
+        }
+    return resumo
+
+
+def imprimir(resumo, duracao, total):
+    print(f"\n{'rota':<15}{'req':>7}{'erros':>7}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for rota, r in resumo.items():
+        print(f"{rota:<15}{r['requisicoes']:>7}{r['erros']:>7}{r['vazao_rps']:>8}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+    print(f"\nTotal: {total} requisições em {duracao:.1f} s ({total / duracao:.2f} req/s)")
+
+
+def executar(args):
+    servidor = FakeGoogleServer(latencia=args.latencia, jitter=args.jitter,
+                                taxa_erro=args.taxa_erro, linhas=args.linhas).iniciar()
+    usuarios = preparar_base(args.usuarios, args.linhas)
+    processo, base = subir_gunicorn(args.porta, args.workers, servidor.url, args.worker_class)
+    # Na jornada 'google' as tarefas não são acompanhadas; sem worker, elas só ficam na fila
+    worker_tarefas = subir_worker_tarefas(servidor.url) if args.jornada == 'completa' else None
+    registros, trava = [], threading.Lock()
+    try:
+        inicio = time.monotonic()
+        virtuais = [UsuarioVirtual(base, email, planilha_id, inicio + args.duracao, registros, trava, args.jornada)
+                    for email, planilha_id in usuarios]
+        for v in virtuais:
+            v.start()
+            time.sleep(args.rampa / max(len(virtuais), 1))
+        for v in virtuais:
+            v.join()
+        duracao = time.monotonic() - inicio
+    finally:
+        if worker_tarefas:
+            worker_tarefas.terminate()
+            worker_tarefas.wait(timeout=30)
+        processo.terminate()
+        processo.wait(timeout=30)
+        servidor.shutdown()
+
+    resumo = resumir(registros, duracao)
+    imprimir(resumo, duracao, len(registros))
+    return {
+        'metadados': {'data': datetime.now().isoformat(timespec='seconds'), 'usuarios': args.usuarios,
+                      'workers': args.workers, 'jornada': args.jornada,
+                      'worker_class': args.worker_class or ('gthread' if int(os.environ.get('GUNICORN_THREADS', '4')) > 1 else 'sync'),
+                      'duracao_s': round(duracao, 1), 'latencia_google_s': args.latencia, 'jitter_s': args.jitter,
+                      'taxa_erro': args.taxa_erro, 'linhas': args.linhas, 'chamadas_google': servidor.chamadas},
+        'rotas': resumo,
+    }
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description='Teste de carga com servidor falso do Google.')
+    parser.add_argument('--usuarios', type=int, default=10, help='Usuários virtuais simultâneos.')
+    parser.add_argument('--duracao', type=float, default=30, help='Duração em segundos.')
+    parser.add_argument('--rampa', type=float, default=2, help='Segundos para iniciar todos os usuários.')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do Gunicorn.')
+    parser.add_argument('--worker-class', help='Classe de worker do Gunicorn (padrão: sync).')
+    parser.add_argument('--jornada', choices=('completa', 'google'), default='completa')
+    parser.add_argument('--capacidade', type=int, nargs='+',
+                        help='Quantidades de usuários a testar, uma execução por quantidade.')
+    parser.add_argument('--p95-maximo', type=float, default=2.0,
+                        help='p95 de search_sheets (s) aceito no cálculo da capacidade.')
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia', type=float, default=0.1, help='Latência das APIs falsas (s).')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Variação aleatória da latência (s).')
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração de respostas 429/503.')
+    parser.add_argument('--linhas', type=int, default=200, help='Respostas por formulário.')
+    return parser
+
+
+def capacidade(args):
+    """Roda uma execução por quantidade de usuários; capacidade é a maior atendida dentro do p95 e sem erros."""
+    execucoes = []
+    for usuarios in sorted(args.capacidade):
+        args.usuarios = usuarios
+        print(f"\n=== {usuarios} usuários ===")
+        execucoes.append(executar(args))
+    print(f"\n{'usuários':>9}{'search/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'erros':>7}")
+    atendidos = 0
+    for execucao in execucoes:
+        rota = execucao['rotas'].get('search_sheets', {})
+        p95, erros = rota.get('p95_ms'), rota.get('erros', 0)
+        print(f"{execucao['metadados']['usuarios']:>9}{rota.get('vazao_rps', 0):>10}{rota.get('p50_ms')!s:>10}"
+              f"{p95!s:>10}{erros:>7}")
+        if p95 is not None and p95 <= args.p95_maximo * 1000 and not erros:
+            atendidos = execucao['metadados']['usuarios']
+    print(f"\nCapacidade ({execucoes[0]['metadados']['worker_class']}, {args.workers} workers): "
+          f"{atendidos} usuários simultâneos com p95 de search_sheets <= {args.p95_maximo} s.")
+    return {'capacidade_usuarios': atendidos, 'p95_maximo_s': args.p95_maximo, 'execucoes': execucoes}
+
+
+def main():
+    args = criar_parser().parse_args()
+    resultado = capacidade(args) if args.capacidade else executar(args)
+    os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+    arquivo = os.path.join(DIRETORIO_RESULTADOS, 'carga-' + datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(arquivo, 'w') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultados salvos em {arquivo}")
+
+
+if __name__ == '__main__':
+    main()
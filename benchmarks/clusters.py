@@ -0,0 +1,93 @@
+"""
+Benchmark da escolha automática do número de segmentos (app/clusters.py).
+
+Compara, com os mesmos dados sintéticos:
+  - fixo: k = SEGMENTOS_NUM_CLUSTERS, como antes;
+  - ingênuo: cada k da faixa ajustado nos dados completos com n_init=10, em
+    sequência, escolhendo pela silhueta;
+  - automático: segmentar_estudantes() com a amostra estratificada, o pool de
+    processos e o orçamento de tempo.
+Para cada variante mostra o tempo total, o k usado e a silhueta do resultado
+(medida numa mesma amostra fixa).
+
+Uso:
+    python -m benchmarks.clusters
+    python -m benchmarks.clusters --linhas 200000 --processos 4 --orcamento 1.5
+"""
+import argparse
+import io
+import time
+from contextlib import redirect_stdout
+
+from app import create_app
+from app.clusters import aquecer_pool
+from app.utils import segmentar_estudantes
+from benchmarks.geradores import gerar_estudantes
+from benchmarks.run import BenchConfig
+
+
+def dataframe(linhas):
+    import pandas as pd
+    df = pd.DataFrame(gerar_estudantes(linhas, 1, 1))[['nome', 'idade', 'cidade', 'curso_interesse']]
+    for coluna in ('cidade', 'curso_interesse'):
+        df[coluna] = df[coluna].astype('category')
+    return df.reset_index().rename(columns={'index': 'id'})
+
+
+def silhueta(df):
+    """Silhueta dos segmentos numa amostra fixa, com as mesmas features da segmentação."""
+    import pandas as pd
+    from sklearn.metrics import silhouette_score
+    features = pd.get_dummies(df[['idade', 'cidade', 'curso_interesse']], dtype='float64')
+    if df['segmento'].nunique() < 2:
+        return float('nan')
+    return silhouette_score(features, df['segmento'], sample_size=min(len(df), 5000), random_state=0)
+
+
+def ingenuo(df, k_min, k_max):
+    """Todos os k nos dados completos com n_init=10, em sequência; devolve o melhor pela silhueta."""
+    melhor = None
+    for k in range(k_min, k_max + 1):
+        resultado, _ = segmentar_estudantes(df.copy(), num_clusters=k)
+        pontuacao = silhueta(resultado)
+        if melhor is None or pontuacao > melhor[0]:
+            melhor = (pontuacao, resultado)
+    return melhor[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Escolha automática de k contra k fixo e busca ingênua.')
+    parser.add_argument('--linhas', type=int, default=100000)
+    parser.add_argument('--processos', type=int, default=2, help='SEGMENTOS_PROCESSOS (0 = número de CPUs).')
+    parser.add_argument('--orcamento', type=float, default=2.0, help='SEGMENTOS_ORCAMENTO_SEGUNDOS.')
+    parser.add_argument('--criterio', default='silhueta', choices=('silhueta', 'cotovelo'))
+    parser.add_argument('--ocioso', type=float, default=15,
+                        help='Segundos de pool ocioso antes de medir (o timeout padrão do loky é 10 s).')
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    app.config.update(SEGMENTOS_PROCESSOS=args.processos, SEGMENTOS_ORCAMENTO_SEGUNDOS=args.orcamento,
+                      SEGMENTOS_CRITERIO=args.criterio)
+    df = dataframe(args.linhas)
+    with app.app_context():
+        # Como no Gunicorn, o pool é aquecido no início e a requisição chega depois de um
+        # intervalo ocioso maior que o timeout padrão do loky: o pool precisa continuar de pé
+        aquecer_pool()
+        time.sleep(args.ocioso)
+        k_min, k_max = app.config['SEGMENTOS_K_MIN'], app.config['SEGMENTOS_K_MAX']
+        variantes = [
+            ('fixo', lambda: segmentar_estudantes(df.copy(), num_clusters=app.config['SEGMENTOS_NUM_CLUSTERS'])[0]),
+            (f'ingênuo (k={k_min}..{k_max})', lambda: ingenuo(df, k_min, k_max)),
+            ('automático', lambda: segmentar_estudantes(df.copy())[0]),
+        ]
+        print(f"\n{'variante':<22}{'tempo':>9}{'k':>4}{'silhueta':>10}")
+        for nome, executar in variantes:
+            inicio = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                resultado = executar()
+            duracao = time.perf_counter() - inicio
+            print(f"{nome:<22}{duracao:>7.2f} s{resultado['segmento'].nunique():>4}{silhueta(resultado):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
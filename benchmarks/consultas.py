@@ -0,0 +1,196 @@
+"""
+Orçamento de consultas SQL por rota e por tarefa.
+
+Executa as rotas principais, o worker de tarefas e o sync_sheets.py com o cliente
+de testes, dados sintéticos e os fakes do Google, contando as consultas de cada
+cenário com orcamento_consultas() (app/metrics.py). Sai com código 1 se algum
+cenário passar do orçamento e lista os comandos repetidos (candidatos a N+1).
+
+Os orçamentos não dependem do volume de dados, exceto nos cenários que
+processam cada formulário (sync_all_sheets), cada lote de formulários
+reivindicado (sync_sem_alteracoes) ou cada lote de respostas (tarefa.processar),
+que têm um custo fixo mais um custo por unidade.
+
+Também confere que uma tarefa que falha depois de gravar parte dos lotes muda a
+versão dos dados (senão o cache por versão seguiria servindo as páginas antigas).
+
+Uso:
+    python -m benchmarks.consultas
+    python -m benchmarks.consultas --planilhas 10 --estudantes 500
+"""
+import argparse
+import io
+import sys
+from contextlib import redirect_stdout
+from unittest import mock
+from sqlalchemy import insert
+
+from app import create_app, db, bcrypt, tarefas
+from app.cache import versao_dados
+from app.dimensoes import CacheDimensoes
+from app.metrics import OrcamentoConsultasExcedido, orcamento_consultas
+from app.models import User, Planilha, Estudante, TarefaProcessamento
+from benchmarks.fakes import CREDENCIAIS_FALSAS, FakeGoogleBackend, instalar_fakes
+from benchmarks.geradores import gerar_estudantes, gerar_valores_planilha
+from benchmarks.run import BenchConfig, SENHA, cliente_logado
+import sync_sheets
+
+# Máximo de consultas por cenário; as tuplas são (fixo, por unidade), veja unidades()
+ORCAMENTOS = {
+    'login': 1,
+    'dashboard': 3,
+    'manage_sheets': 2,
+    'view_processed_data': 2,
+    'analysis': 3,
+    'ml_analysis': 5,
+    'api.serie_cursos': 3,
+    'process_sheet': 4,
+    'status_tarefa': 2,
+    'tarefa.processar': (24, 2),
+    'sync_all_sheets': (12, 5),
+    'sync_sem_alteracoes': (2, 4),
+    'remove_sheet': 5,
+}
+
+
+def preparar_base(app, backend, n_planilhas, estudantes):
+    """Recria as tabelas com um usuário e `n_planilhas` formulários de `estudantes` respostas cada."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='consultas', email='bench@exemplo.com', confirmed=True,
+                    password_hash=bcrypt.generate_password_hash(SENHA).decode('utf-8'),
+                    google_credentials=CREDENCIAIS_FALSAS)
+        db.session.add(user)
+        db.session.commit()
+        dimensoes = CacheDimensoes()
+        ids = []
+        for i in range(n_planilhas):
+            planilha = Planilha(nome_amigavel=f'Formulário {i}', spreadsheet_id=f'consultas-{i}',
+                                range_name='Respostas ao formulário 1!A:Z', user_id=user.id)
+            db.session.add(planilha)
+            db.session.flush()
+            db.session.execute(insert(Estudante), dimensoes.converter_linhas(
+                gerar_estudantes(estudantes, user.id, planilha.id, seed=i)))
+            backend.adicionar_planilha(planilha.spreadsheet_id, gerar_valores_planilha(estudantes, seed=i))
+            ids.append(planilha.id)
+        db.session.commit()
+        return ids
+
+
+def cenarios(app, cliente, planilha_id):
+    pagina_tarefa = {}
+
+    def process_sheet():
+        pagina_tarefa['url'] = cliente.get(f'/process_sheet/{planilha_id}').headers['Location']
+
+    def processar():
+        with app.app_context():
+            tarefas.processar_pendentes('consultas')
+
+    return [
+        ('login', lambda: app.test_client().post('/login', data={'email': 'bench@exemplo.com', 'password': SENHA})),
+        ('dashboard', lambda: cliente.get('/dashboard')),
+        ('manage_sheets', lambda: cliente.get('/manage_sheets')),
+        ('view_processed_data', lambda: cliente.get('/view_processed_data')),
+        ('analysis', lambda: cliente.get('/analysis')),
+        ('ml_analysis', lambda: cliente.get('/ml_analysis')),
+        ('api.serie_cursos', lambda: cliente.get('/api/v1/graficos/cursos')),
+        ('process_sheet', process_sheet),
+        ('status_tarefa', lambda: cliente.get(pagina_tarefa['url'])),
+        ('tarefa.processar', processar),
+        ('sync_all_sheets', lambda: sync_sheets.sync_all_sheets(app, 'consultas')),
+        # Nada mudou no Drive desde o cenário anterior: nenhuma planilha é baixada e o custo
+        # depende só do número de lotes reivindicados
+        ('sync_sem_alteracoes', lambda: sync_sheets.sync_all_sheets(app, 'consultas')),
+        ('remove_sheet', lambda: cliente.post(f'/remove_sheet/{planilha_id}')),
+    ]
+
+
+def unidades(nome, app, n_planilhas, estudantes):
+    """Formulários sincronizados, lotes de formulários reivindicados ou lotes de respostas gravados pela tarefa."""
+    if nome == 'tarefa.processar':
+        return -(-estudantes // app.config['TAREFAS_LOTE_LINHAS'])
+    if nome == 'sync_sem_alteracoes':
+        return -(-n_planilhas // app.config['SYNC_LOTE_PLANILHAS'])
+    return n_planilhas
+
+
+def orcamento(nome, app, n_planilhas, estudantes):
+    limite = ORCAMENTOS[nome]
+    if isinstance(limite, tuple):
+        fixo, por_unidade = limite
+        return fixo + por_unidade * unidades(nome, app, n_planilhas, estudantes)
+    return limite
+
+
+def conferir_falha_da_tarefa(app, cliente, planilha_id, lote=50):
+    """
+    Processa a planilha em lotes de `lote` linhas com um erro no segundo lote.
+    Devolve uma mensagem se a versão dos dados não mudou, ou None.
+    """
+    cliente.get(f'/process_sheet/{planilha_id}')
+    atualizar = tarefas._atualizar
+    lotes = []
+
+    def falhar_no_segundo_lote(tarefa_id, worker_id, **campos):
+        if campos.get('etapa') == 'gravando estudantes':
+            lotes.append(campos)
+            if len(lotes) == 2:
+                raise RuntimeError('falha simulada no segundo lote')
+        return atualizar(tarefa_id, worker_id, **campos)
+
+    with app.app_context():
+        user_id = db.session.get(Planilha, planilha_id).user_id
+        antes = versao_dados(user_id)
+        with mock.patch.dict(app.config, TAREFAS_LOTE_LINHAS=lote), \
+                mock.patch.object(tarefas, '_atualizar', falhar_no_segundo_lote), redirect_stdout(io.StringIO()):
+            tarefas.processar_pendentes('consultas')
+        db.session.expire_all()
+        tarefa = TarefaProcessamento.query.order_by(TarefaProcessamento.id.desc()).first()
+        if tarefa.status != 'erro' or len(lotes) < 2:
+            return f"A tarefa com erro no segundo lote terminou como '{tarefa.status}' após {len(lotes)} lotes."
+        if versao_dados(user_id) == antes:
+            return 'Uma tarefa que falhou depois de gravar um lote não mudou a versão dos dados.'
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Confere o orçamento de consultas SQL por rota.')
+    parser.add_argument('--planilhas', type=int, default=6, help='Formulários do usuário.')
+    parser.add_argument('--estudantes', type=int, default=200, help='Respostas por formulário.')
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    backend = FakeGoogleBackend()
+    excedidos = []
+    with instalar_fakes(backend):
+        ids = preparar_base(app, backend, args.planilhas, args.estudantes)
+        cliente = cliente_logado(app)
+        print(f"\n{'cenário':<22}{'consultas':>10}{'orçamento':>11}{'db ms':>9}")
+        for nome, executar in cenarios(app, cliente, ids[0]):
+            maximo = orcamento(nome, app, args.planilhas, args.estudantes)
+            try:
+                with redirect_stdout(io.StringIO()), orcamento_consultas(maximo, nome) as perfil:
+                    executar()
+                marca = ''
+            except OrcamentoConsultasExcedido as erro:
+                excedidos.append(str(erro))
+                marca = '  <-- ACIMA DO ORÇAMENTO'
+            print(f"{nome:<22}{perfil.total:>10}{maximo:>11}{perfil.segundos * 1000:>9.1f}{marca}")
+            for candidata in perfil.candidatas_n_mais_um(tamanho_sql=110):
+                print(f"{'':<4}{candidata['vezes']}x {candidata['sql']}")
+
+        falha = conferir_falha_da_tarefa(app, cliente, ids[-1])
+        print(f"\ntarefa com erro num lote intermediário: {falha or 'versão dos dados alterada'}")
+        if falha:
+            excedidos.append(falha)
+
+    if excedidos:
+        print('\n' + '\n'.join(excedidos))
+        sys.exit(1)
+    print('\nOK')
+
+
+if __name__ == '__main__':
+    main()
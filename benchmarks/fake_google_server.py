@@ -0,0 +1,144 @@
+"""
+Servidor HTTP local que imita as APIs do Google usadas pela aplicação
+(Sheets, Drive, Forms, OAuth2 userinfo e Gemini via REST), com injeção de
+latência e de erros. A aplicação é apontada para ele pelas variáveis
+GOOGLE_API_ENDPOINT e GEMINI_API_ENDPOINT.
+
+Uso isolado:
+    python -m benchmarks.fake_google_server --porta 8089 --latencia 0.2 --taxa-erro 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+from benchmarks.fakes import responder_prompt_gemini
+from benchmarks.geradores import gerar_valores_planilha
+
+ROTA_SHEETS = re.compile(r'^/v4/spreadsheets/([^/]+)/values/(.+)$')
+ROTA_FORMS = re.compile(r'^/v1/forms/([^/]+)$')
+ROTA_GEMINI = re.compile(r'^/v1beta/models/([^/:]+):generateContent$')
+
+
+class FakeGoogleServer(ThreadingHTTPServer):
+    """
+    latencia/jitter: segundos somados a cada resposta.
+    taxa_erro: fração das chamadas que devolve 503 (ou 429, metade das vezes).
+    linhas: quantidade de respostas de cada planilha gerada.
+    """
+    daemon_threads = True
+
+    def __init__(self, endereco=('127.0.0.1', 0), latencia=0.0, jitter=0.0, taxa_erro=0.0, linhas=200, seed=42):
+        super().__init__(endereco, _Handler)
+        self.latencia = latencia
+        self.jitter = jitter
+        self.taxa_erro = taxa_erro
+        self.linhas = linhas
+        self.rng = random.Random(seed)
+        self.planilhas = {}
+        self.formularios = [{'id': f'form-{i}', 'name': f'Formulário {i}', 'linkedSheetId': f'planilha-{i}',
+                             'modifiedTime': '2024-01-01T00:00:00.000Z',
+                             'webViewLink': f'https://docs.google.com/forms/d/form-{i}/edit'} for i in range(5)]
+        self.chamadas = {}
+        self._trava = threading.Lock()
+
+    @property
+    def url(self):
+        host, porta = self.server_address[:2]
+        return f'http://{host}:{porta}'
+
+    def valores(self, spreadsheet_id):
+        with self._trava:
+            if spreadsheet_id not in self.planilhas:
+                self.planilhas[spreadsheet_id] = gerar_valores_planilha(self.linhas, seed=spreadsheet_id)
+            return self.planilhas[spreadsheet_id]
+
+    def sortear(self):
+        """Devolve (atraso, status de erro ou None) para a próxima resposta."""
+        with self._trava:
+            atraso = self.latencia + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+            erro = None
+            if self.taxa_erro and self.rng.random() < self.taxa_erro:
+                erro = 429 if self.rng.random() < 0.5 else 503
+            return atraso, erro
+
+    def contar(self, metodo):
+        with self._trava:
+            self.chamadas[metodo] = self.chamadas.get(metodo, 0) + 1
+
+    def iniciar(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _enviar(self, status, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _responder(self, metodo, produzir):
+        self.server.contar(metodo)
+        atraso, erro = self.server.sortear()
+        if atraso:
+            time.sleep(atraso)
+        if erro:
+            self._enviar(erro, {'error': {'code': erro, 'message': 'Erro injetado pelo servidor falso',
+                                          'status': 'RESOURCE_EXHAUSTED' if erro == 429 else 'UNAVAILABLE'}})
+        else:
+            self._enviar(200, produzir())
+
+    def do_GET(self):
+        caminho = urlparse(self.path).path
+        if m := ROTA_SHEETS.match(caminho):
+            spreadsheet_id, intervalo = unquote(m.group(1)), unquote(m.group(2))
+            return self._responder('sheets.spreadsheets.values.get', lambda: {
+                'range': intervalo, 'majorDimension': 'ROWS', 'values': self.server.valores(spreadsheet_id)})
+        if caminho == '/files':
+            campos = ('id', 'name', 'modifiedTime', 'webViewLink')
+            return self._responder('drive.files.list', lambda: {
+                'files': [{c: f[c] for c in campos} for f in self.server.formularios]})
+        if m := ROTA_FORMS.match(caminho):
+            return self._responder('forms.forms.get', lambda: {'formId': m.group(1),
+                                                                'linkedSheetId': f'planilha-{m.group(1)}'})
+        if caminho == '/oauth2/v2/userinfo':
+            return self._responder('oauth2.userinfo.get', lambda: {'email': 'aluno@exemplo.com'})
+        self._enviar(404, {'error': {'code': 404, 'message': f'Rota desconhecida: {caminho}'}})
+
+    def do_POST(self):
+        caminho = urlparse(self.path).path
+        corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        if ROTA_GEMINI.match(caminho):
+            prompt = ''.join(p.get('text', '') for c in corpo.get('contents', []) for p in c.get('parts', []))
+            return self._responder('gemini.generateContent', lambda: {'candidates': [{
+                'content': {'parts': [{'text': responder_prompt_gemini(prompt)}], 'role': 'model'},
+                'finishReason': 'STOP', 'index': 0}]})
+        self._enviar(404, {'error': {'code': 404, 'message': f'Rota desconhecida: {caminho}'}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor falso das APIs do Google.')
+    parser.add_argument('--porta', type=int, default=8089)
+    parser.add_argument('--latencia', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--taxa-erro', type=float, default=0.0)
+    parser.add_argument('--linhas', type=int, default=200)
+    args = parser.parse_args()
+    servidor = FakeGoogleServer(('127.0.0.1', args.porta), args.latencia, args.jitter, args.taxa_erro, args.linhas)
+    print(f"Servidor falso do Google em {servidor.url}")
+    servidor.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Fakes em processo para Sheets, Drive, Forms, Gemini e Brevo.
+
+Imitam apenas a parte das APIs que a aplicação usa, com latência opcional,
+para que os benchmarks rodem sem navegador nem conta Google.
+"""
+import json
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+from app.utils import fallback_column_mapping
+
+# Credencial com formato válido para Credentials.from_authorized_user_info (nunca é usada na rede)
+CREDENCIAIS_FALSAS = json.dumps({
+    'token': 'token-falso',
+    'refresh_token': 'refresh-falso',
+    'client_id': 'cliente-falso.apps.googleusercontent.com',
+    'client_secret': 'segredo-falso',
+    'scopes': ['https://www.googleapis.com/auth/spreadsheets'],
+    'expiry': '2099-01-01T00:00:00Z',
+})
+
+
+class FakeGoogleBackend:
+    """Estado compartilhado pelos serviços falsos: planilhas, formulários e contadores."""
+
+    def __init__(self, latencia=0.0, email='aluno@exemplo.com'):
+        self.latencia = latencia
+        self.email = email
+        self.planilhas = {}
+        # spreadsheet_id -> version do arquivo no Drive
+        self.versoes = {}
+        self.formularios = []
+        self.chamadas = {}
+
+    def adicionar_planilha(self, spreadsheet_id, valores):
+        self.planilhas[spreadsheet_id] = valores
+        self.versoes[spreadsheet_id] = self.versoes.get(spreadsheet_id, 0) + 1
+
+    def alterar_planilhas(self, *spreadsheet_ids):
+        """Simula novas respostas: incrementa a versão no Drive das planilhas (todas, se nenhuma for indicada)."""
+        for spreadsheet_id in spreadsheet_ids or list(self.planilhas):
+            self.versoes[spreadsheet_id] += 1
+
+    def metadados_drive(self, spreadsheet_id):
+        if spreadsheet_id not in self.versoes:
+            raise ValueError(f'Arquivo {spreadsheet_id} não encontrado')
+        versao = self.versoes[spreadsheet_id]
+        modificada_em = datetime(2024, 1, 1) + timedelta(seconds=versao)
+        return {'id': spreadsheet_id, 'version': str(versao), 'modifiedTime': modificada_em.isoformat() + '.000Z'}
+
+    def adicionar_formulario(self, form_id, nome, linked_sheet_id=None):
+        self.formularios.append({'id': form_id, 'name': nome, 'modifiedTime': '2024-01-01T00:00:00.000Z',
+                                 'webViewLink': f'https://docs.google.com/forms/d/{form_id}/edit',
+                                 'linkedSheetId': linked_sheet_id})
+
+    def _responder(self, metodo, resultado):
+        self.chamadas[metodo] = self.chamadas.get(metodo, 0) + 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        return resultado
+
+
+class _FakeRequest:
+    def __init__(self, backend, metodo, produzir):
+        self._backend = backend
+        self._metodo = metodo
+        self._produzir = produzir
+
+    def execute(self, *args, **kwargs):
+        return self._backend._responder(self._metodo, self._produzir())
+
+
+class _FakeLote:
+    """BatchHttpRequest: várias requisições, uma chamada só; cada resposta vai para o callback."""
+
+    def __init__(self, backend, metodo, callback):
+        self._backend = backend
+        self._metodo = metodo
+        self._callback = callback
+        self._requisicoes = []
+
+    def add(self, requisicao, callback=None, request_id=None):
+        self._requisicoes.append((request_id or str(len(self._requisicoes) + 1), requisicao))
+
+    def execute(self, *args, **kwargs):
+        def produzir():
+            respostas = []
+            for request_id, requisicao in self._requisicoes:
+                try:
+                    respostas.append((request_id, requisicao._produzir(), None))
+                except Exception as e:
+                    respostas.append((request_id, None, e))
+            return respostas
+        for resposta in self._backend._responder(self._metodo, produzir()):
+            self._callback(*resposta)
+
+
+class _Recurso:
+    """Encadeamento estilo googleapiclient: servico.recurso().metodo(...).execute()."""
+
+    def __init__(self, backend, metodos):
+        self._backend = backend
+        self._metodos = metodos
+
+    def __getattr__(self, nome):
+        if nome not in self._metodos:
+            raise AttributeError(nome)
+        return self._metodos[nome]
+
+
+def _servico_sheets(backend):
+    def get(spreadsheetId, range, **kwargs):
+        if spreadsheetId not in backend.planilhas:
+            raise ValueError(f'Planilha {spreadsheetId} não encontrada')
+        return _FakeRequest(backend, 'sheets.spreadsheets.values.get',
+                            lambda: {'range': range, 'values': backend.planilhas[spreadsheetId]})
+    values = _Recurso(backend, {'get': get})
+    return _Recurso(backend, {'spreadsheets': lambda: _Recurso(backend, {'values': lambda: values})})
+
+
+def _servico_drive(backend):
+    def listar(**kwargs):
+        campos = ('id', 'name', 'modifiedTime', 'webViewLink')
+        return _FakeRequest(backend, 'drive.files.list',
+                            lambda: {'files': [{c: f[c] for c in campos} for f in backend.formularios]})
+
+    def obter(fileId, **kwargs):
+        return _FakeRequest(backend, 'drive.files.get', lambda: backend.metadados_drive(fileId))
+    files = _Recurso(backend, {'list': listar, 'get': obter})
+    return _Recurso(backend, {'files': lambda: files,
+                              'new_batch_http_request': lambda callback=None: _FakeLote(backend, 'drive.batch',
+                                                                                        callback)})
+
+
+def _servico_forms(backend):
+    def get(formId, **kwargs):
+        formulario = next((f for f in backend.formularios if f['id'] == formId), None)
+        if formulario is None:
+            raise ValueError(f'Formulário {formId} não encontrado')
+        return _FakeRequest(backend, 'forms.forms.get',
+                            lambda: {'formId': formId, 'linkedSheetId': formulario['linkedSheetId']})
+    return _Recurso(backend, {'forms': lambda: _Recurso(backend, {'get': get})})
+
+
+def _servico_oauth2(backend):
+    def get(**kwargs):
+        return _FakeRequest(backend, 'oauth2.userinfo.get', lambda: {'email': backend.email})
+    return _Recurso(backend, {'userinfo': lambda: _Recurso(backend, {'get': get})})
+
+
+SERVICOS = {'sheets': _servico_sheets, 'drive': _servico_drive, 'forms': _servico_forms, 'oauth2': _servico_oauth2}
+
+
+def responder_prompt_gemini(prompt):
+    """Resposta em texto que o Gemini daria: mapeamento de colunas (um ou um lote) ou insights."""
+    cabecalho = re.search(r'esquema: (\[.*?\])\.', prompt)
+    conjuntos = re.search(r'Conjuntos: (\{.*\})$', prompt, re.S)
+    if conjuntos:
+        texto = json.dumps({i: fallback_column_mapping(h) for i, h in json.loads(conjuntos.group(1)).items()})
+    elif cabecalho:
+        texto = json.dumps(fallback_column_mapping(json.loads(cabecalho.group(1))))
+    else:
+        texto = json.dumps({
+            'resumo_executivo': 'Resumo gerado pelo fake.',
+            'tendencias': ['a', 'b', 'c'],
+            'recomendacoes': ['a', 'b', 'c'],
+            'previsoes': 'Estável.',
+            'segmento_destaque': 'Perfil 1.',
+        })
+    return f'```json\n{texto}\n```'
+
+
+class FakeGemini:
+    """Substitui genai.GenerativeModel; responde mapeamentos de colunas e insights."""
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.chamadas = 0
+
+    def __call__(self, nome_modelo):
+        return self
+
+    def generate_content(self, prompt):
+        self.chamadas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        return mock.Mock(text=responder_prompt_gemini(prompt))
+
+
+class FakeBrevo:
+    """Substitui TransactionalEmailsApi e guarda os e-mails "enviados"."""
+
+    def __init__(self):
+        self.enviados = []
+
+    def __call__(self, api_client=None):
+        return self
+
+    def send_transac_email(self, email):
+        self.enviados.append(email)
+
+
+@contextmanager
+def instalar_fakes(backend=None, gemini=None, brevo=None):
+    """Troca os clientes externos da aplicação pelos fakes durante o bloco."""
+    backend = backend or FakeGoogleBackend()
+    gemini = gemini or FakeGemini()
+    brevo = brevo or FakeBrevo()
+
+    def build_falso(nome, versao, credentials):
+        return SERVICOS[nome](backend)
+
+    with ExitStack() as pilha:
+        # O search_sheets usa HTTP direto (app/google_async.py): para ele, o fake_google_server.py
+        for alvo in ('app.routes.build_google_service', 'app.tarefas.build_google_service',
+                     'sync_sheets.build_google_service'):
+            pilha.enter_context(mock.patch(alvo, build_falso))
+        pilha.enter_context(mock.patch('google.generativeai.configure', lambda **kwargs: None))
+        pilha.enter_context(mock.patch('google.generativeai.GenerativeModel', gemini))
+        pilha.enter_context(mock.patch('sib_api_v3_sdk.TransactionalEmailsApi', brevo))
+        yield backend, gemini, brevo
@@ -0,0 +1,72 @@
+"""
+Geradores de dados sintéticos para os benchmarks: populações de Estudante e
+payloads 'values' da API do Sheets parecidos com respostas reais de formulários.
+"""
+import random
+from datetime import datetime, timedelta
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela',
+         'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Ferreira', 'Almeida']
+CIDADES = ['São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Curitiba', 'Porto Alegre', 'Salvador',
+           'Recife', 'Fortaleza', 'Campinas', 'São José dos Campos', 'Goiânia', 'Brasília']
+CURSOS = ['Análise e Desenvolvimento de Sistemas', 'Direito', 'Medicina', 'Administração',
+          'Engenharia Civil', 'Psicologia', 'Enfermagem', 'Ciência da Computação']
+DISPOSITIVOS = ['Desktop', 'Mobile']
+
+CABECALHO_FORMULARIO = ['Carimbo de data/hora', 'Nome completo', 'Idade', 'Cidade onde mora',
+                        'Curso de interesse', 'E-mail']
+
+
+def _cidade_texto_livre(rng):
+    """Cidade digitada pelo usuário: variações de caixa, acento e espaços."""
+    cidade = rng.choice(CIDADES)
+    variacao = rng.random()
+    if variacao < 0.15:
+        return cidade.lower()
+    if variacao < 0.25:
+        return cidade.upper() + ' '
+    if variacao < 0.32:
+        return cidade.replace('ã', 'a').replace('á', 'a').replace('í', 'i').replace('â', 'a')
+    if variacao < 0.36:
+        return f' {cidade}/SP'
+    return cidade
+
+
+def gerar_valores_planilha(n_linhas, seed=42, cabecalho=None):
+    """
+    Gera um payload no formato de values().get() do Sheets: a primeira linha é o
+    cabeçalho e as demais são respostas. Como na API real, linhas com células
+    finais vazias vêm truncadas (ragged) e alguns campos vêm em branco ou inválidos.
+    """
+    rng = random.Random(seed)
+    valores = [list(cabecalho or CABECALHO_FORMULARIO)]
+    inicio = datetime(2024, 1, 1)
+    for i in range(n_linhas):
+        carimbo = (inicio + timedelta(minutes=7 * i)).strftime('%d/%m/%Y %H:%M:%S')
+        nome = f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}"
+        idade = str(rng.randint(16, 55)) if rng.random() > 0.05 else rng.choice(['', 'vinte', '18 anos'])
+        linha = [carimbo, nome, idade, _cidade_texto_livre(rng), rng.choice(CURSOS),
+                 f"aluno{i}@exemplo.com" if rng.random() > 0.3 else '']
+        while linha and linha[-1] == '':
+            linha.pop()
+        if rng.random() < 0.03:
+            linha = linha[:rng.randint(2, 4)]
+        valores.append(linha)
+    return valores
+
+
+def gerar_estudantes(n, user_id, planilha_id, seed=42):
+    """Gera dicionários prontos para inserção em massa na tabela Estudante."""
+    rng = random.Random(seed)
+    agora = datetime.utcnow()
+    return [{
+        'nome': f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}",
+        'idade': rng.randint(16, 55) if rng.random() > 0.05 else None,
+        'cidade': _cidade_texto_livre(rng).strip() or None,
+        'curso_interesse': rng.choice(CURSOS),
+        'timestamp_cadastro': agora - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1440)),
+        'dispositivo_acesso': rng.choice(DISPOSITIVOS),
+        'planilha_origem_id': planilha_id,
+        'user_id': user_id,
+    } for _ in range(n)]
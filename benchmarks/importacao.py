@@ -0,0 +1,67 @@
+"""
+Verificação do orçamento de tempo de inicialização.
+
+Em um interpretador novo, importa a aplicação, chama create_app() e importa o
+sync_sheets.py, medindo o tempo e conferindo que nenhuma das bibliotecas em
+app.DEPENDENCIAS_PESADAS foi carregada nesse caminho. Sai com código 1 se o
+tempo passar do orçamento ou se alguma importação pesada voltar ao boot.
+
+Uso:
+    python -m benchmarks.importacao                  # orçamento padrão de 1,0 s
+    python -m benchmarks.importacao --orcamento 0.6 --repeticoes 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODIGO_FILHO = """
+import json, sys, time
+inicio = time.perf_counter()
+from app import create_app, DEPENDENCIAS_PESADAS
+create_app()
+import sync_sheets
+duracao = time.perf_counter() - inicio
+carregadas = [m for m in DEPENDENCIAS_PESADAS if m in sys.modules]
+print(json.dumps({'segundos': duracao, 'carregadas': carregadas}))
+"""
+
+
+def medir_uma_vez():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    env.setdefault('SECRET_KEY', 'importacao')
+    saida = subprocess.run([sys.executable, '-c', CODIGO_FILHO], cwd=RAIZ, env=env,
+                           capture_output=True, text=True, check=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Confere o tempo de importação da aplicação.')
+    parser.add_argument('--orcamento', type=float, default=float(os.environ.get('IMPORT_BUDGET_SECONDS', 1.0)),
+                        help='Tempo máximo (s) para importar a aplicação e chamar create_app().')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    medidas = [medir_uma_vez() for _ in range(args.repeticoes)]
+    melhor = min(m['segundos'] for m in medidas)
+    carregadas = sorted({m for medida in medidas for m in medida['carregadas']})
+
+    print(f"Importação + create_app(): {melhor:.3f} s (melhor de {args.repeticoes}; orçamento {args.orcamento:.3f} s)")
+    falhou = False
+    if carregadas:
+        print(f"ERRO: bibliotecas pesadas carregadas no boot: {', '.join(carregadas)}")
+        falhou = True
+    if melhor > args.orcamento:
+        print("ERRO: o tempo de inicialização passou do orçamento.")
+        falhou = True
+    if falhou:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
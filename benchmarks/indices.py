@@ -0,0 +1,236 @@
+"""
+Benchmark dos índices de Estudante em escala (migração 0002).
+
+Gera uma tabela estudante grande (10 milhões de linhas por padrão), repartida
+entre vários usuários e formulários, e mede as consultas reais das rotas sem os
+índices da migração 0002 e depois de criá-los: plano de execução (EXPLAIN QUERY
+PLAN no SQLite, EXPLAIN no PostgreSQL) e latência mediana. Mede também quanto a
+inserção de um lote da sincronização fica mais cara com os índices e quanto
+tempo leva para criá-los.
+
+Por padrão usa um SQLite temporário; para números de produção rode contra o
+PostgreSQL com BENCH_DATABASE_URL (a tabela é recriada, use um banco descartável).
+
+Uso:
+    python -m benchmarks.indices                            # 10.000.000 de linhas
+    python -m benchmarks.indices --linhas 1000000 --usuarios 50
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, text
+
+from app import create_app, db
+from app.dados import COLUNAS_SEGMENTACAO, consulta_contagem, consulta_estudantes
+from app.models import Cidade, Curso, Estudante, Planilha, User
+from app.remocao import estudantes_visiveis
+from benchmarks.geradores import CIDADES, CURSOS, DISPOSITIVOS, NOMES, SOBRENOMES
+from benchmarks.run import BenchConfig
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRETORIO_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+LOTE_INSERCAO = 100000
+LINHAS_LOTE_SYNC = 5000
+
+
+class IndicesConfig(BenchConfig):
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'BENCH_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'meu_app_bench_indices.sqlite'))
+
+
+def indices_da_migracao():
+    """Os índices criados pela migração 0002, como declarados em app/models.py."""
+    nomes = {'ix_estudante_user_id_id', 'ix_estudante_planilha_origem_id',
+             'ix_estudante_user_id_nome_id', 'ix_planilha_user_id_data_cadastro'}
+    return [i for tabela in (Estudante.__table__, Planilha.__table__) for i in tabela.indexes if i.name in nomes]
+
+
+def gerar_linhas(n, planilhas, cidades, cursos, seed):
+    """
+    Linhas de estudante em blocos por formulário, em ordem aleatória entre os
+    usuários, como a sincronização as grava (cada formulário de uma vez).
+    """
+    rng = random.Random(seed)
+    inicio = datetime(2024, 1, 1)
+    nomes = [f"{n} {s}" for n in NOMES for s in SOBRENOMES]
+    ordem = [(user_id, planilha_id) for user_id, ids in planilhas.items() for planilha_id in ids]
+    rng.shuffle(ordem)
+    por_planilha = -(-n // len(ordem))
+    for i in range(n):
+        user_id, planilha_id = ordem[i // por_planilha]
+        yield {
+            'nome': f"{rng.choice(nomes)} {i}",
+            'idade': rng.randint(16, 55),
+            'cidade_id': rng.choice(cidades),
+            'curso_id': rng.choice(cursos),
+            'timestamp_cadastro': inicio + timedelta(minutes=i),
+            'dispositivo_acesso': rng.choice(DISPOSITIVOS),
+            'planilha_origem_id': planilha_id,
+            'user_id': user_id,
+        }
+
+
+def preparar_base(linhas, n_usuarios, planilhas_por_usuario):
+    """Recria as tabelas sem os índices da migração 0002 e insere `linhas` estudantes."""
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as conexao:
+        for indice in indices_da_migracao():
+            indice.drop(conexao)
+
+    db.session.add_all([User(username=f'indices{i}', email=f'indices{i}@exemplo.com', password_hash='x',
+                             confirmed=True) for i in range(n_usuarios)])
+    db.session.add_all([Cidade(nome=c, chave=c.lower()) for c in CIDADES])
+    db.session.add_all([Curso(nome=c, chave=c.lower()) for c in CURSOS])
+    db.session.commit()
+    usuarios = db.session.scalars(select(User.id).order_by(User.id)).all()
+    db.session.add_all([Planilha(nome_amigavel=f'Formulário {j}', spreadsheet_id=f'indices-{u}-{j}',
+                                 range_name='A:Z', user_id=u)
+                        for u in usuarios for j in range(planilhas_por_usuario)])
+    db.session.commit()
+    planilhas = {}
+    for planilha_id, user_id in db.session.execute(select(Planilha.id, Planilha.user_id)).all():
+        planilhas.setdefault(user_id, []).append(planilha_id)
+    cidades = db.session.scalars(select(Cidade.id)).all()
+    cursos = db.session.scalars(select(Curso.id)).all()
+
+    inicio = time.perf_counter()
+    linhas_geradas = gerar_linhas(linhas, planilhas, cidades, cursos, seed=42)
+    for feitas in range(0, linhas, LOTE_INSERCAO):
+        lote = [next(linhas_geradas) for _ in range(min(LOTE_INSERCAO, linhas - feitas))]
+        with db.engine.begin() as conexao:
+            conexao.execute(insert(Estudante.__table__), lote)
+        if (feitas // LOTE_INSERCAO) % 10 == 9:
+            print(f"  {feitas + len(lote)} linhas ({time.perf_counter() - inicio:.0f} s)")
+    analisar()
+    alvo = usuarios[len(usuarios) // 2]
+    return alvo, planilhas[alvo][0], planilhas, cidades, cursos
+
+
+def analisar():
+    with db.engine.begin() as conexao:
+        conexao.execute(text('ANALYZE'))
+
+
+def consultas(user_id):
+    """As consultas das rotas, na forma em que a aplicação as executa."""
+    dados_processados = (select(Estudante.__table__)
+                         .where(Estudante.user_id == user_id, estudantes_visiveis())
+                         .order_by(Estudante.nome))
+    planilhas = (select(Planilha.id, Planilha.nome_amigavel)
+                 .where(Planilha.user_id == user_id, Planilha.removida_em.is_(None))
+                 .order_by(Planilha.data_cadastro.desc()).limit(5))
+    return [
+        ('dashboard: total de estudantes', consulta_contagem(user_id)),
+        ('dashboard: formulários recentes', planilhas),
+        ('analysis', consulta_estudantes(user_id, ('curso_interesse', 'idade'))),
+        ('api: série de cursos', consulta_estudantes(user_id, ('curso_interesse',))),
+        ('ml_analysis', consulta_estudantes(user_id, COLUNAS_SEGMENTACAO)),
+        ('view_processed_data', dados_processados),
+    ]
+
+
+def plano(conexao, consulta):
+    sql = str(consulta.compile(dialect=conexao.dialect, compile_kwargs={'literal_binds': True}))
+    if conexao.dialect.name == 'sqlite':
+        return [linha[-1] for linha in conexao.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+    return [linha[0] for linha in conexao.execute(text('EXPLAIN ' + sql))]
+
+
+def cronometrar(executar, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        executar()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos)
+
+
+def medir(user_id, planilha_id, planilhas, cidades, cursos, repeticoes):
+    """Latência e plano de cada consulta, mais as escritas da sincronização (desfeitas com rollback)."""
+    resultados = {}
+    with db.engine.connect() as conexao:
+        for nome, consulta in consultas(user_id):
+            resultados[nome] = {
+                'segundos': cronometrar(lambda: conexao.execute(consulta).fetchall(), repeticoes),
+                'plano': plano(conexao, consulta),
+            }
+
+    def apagar_formulario():
+        with db.engine.connect() as conexao:
+            transacao = conexao.begin()
+            conexao.execute(delete(Estudante).where(Estudante.planilha_origem_id == planilha_id))
+            transacao.rollback()
+
+    lote = list(gerar_linhas(LINHAS_LOTE_SYNC, {user_id: [planilha_id]}, cidades, cursos, seed=7))
+
+    def inserir_lote():
+        with db.engine.connect() as conexao:
+            transacao = conexao.begin()
+            conexao.execute(insert(Estudante.__table__), lote)
+            transacao.rollback()
+
+    with db.engine.connect() as conexao:
+        consulta = delete(Estudante).where(Estudante.planilha_origem_id == planilha_id)
+        resultados['sync: apagar um formulário'] = {
+            'segundos': cronometrar(apagar_formulario, repeticoes),
+            'plano': plano(conexao, consulta),
+        }
+    resultados[f'sync: inserir {LINHAS_LOTE_SYNC} linhas'] = {
+        'segundos': cronometrar(inserir_lote, repeticoes), 'plano': [],
+    }
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Consultas de Estudante com e sem os índices da migração 0002.')
+    parser.add_argument('--linhas', type=int, default=10_000_000)
+    parser.add_argument('--usuarios', type=int, default=100)
+    parser.add_argument('--planilhas', type=int, default=5, help='Formulários por usuário.')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(IndicesConfig)
+    with app.app_context():
+        print(f"Gerando {args.linhas} estudantes de {args.usuarios} usuários ({db.engine.dialect.name})...")
+        user_id, planilha_id, planilhas, cidades, cursos = preparar_base(args.linhas, args.usuarios, args.planilhas)
+        contexto = (user_id, planilha_id, planilhas, cidades, cursos, args.repeticoes)
+
+        print("Medindo sem os índices...")
+        antes = medir(*contexto)
+        print("Criando os índices...")
+        inicio = time.perf_counter()
+        with db.engine.begin() as conexao:
+            for indice in indices_da_migracao():
+                indice.create(conexao)
+        analisar()
+        criacao = time.perf_counter() - inicio
+        print("Medindo com os índices...")
+        depois = medir(*contexto)
+
+    print(f"\nÍndices criados em {criacao:.1f} s. Usuário medido: {args.linhas // args.usuarios} linhas.\n")
+    print(f"{'consulta':<34}{'antes':>11}{'depois':>11}{'ganho':>9}")
+    for nome in antes:
+        a, d = antes[nome]['segundos'], depois[nome]['segundos']
+        print(f"{nome:<34}{a * 1000:>8.1f} ms{d * 1000:>8.1f} ms{a / d:>8.1f}x")
+    for nome in antes:
+        if antes[nome]['plano'] != depois[nome]['plano']:
+            print(f"\n{nome}\n  antes:  " + '\n          '.join(antes[nome]['plano'])
+                  + "\n  depois: " + '\n          '.join(depois[nome]['plano']))
+
+    os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+    arquivo = os.path.join(DIRETORIO_RESULTADOS, 'indices-' + datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(arquivo, 'w') as f:
+        json.dump({'parametros': vars(args), 'banco': IndicesConfig.SQLALCHEMY_DATABASE_URI.split(':')[0],
+                   'criacao_indices_segundos': criacao, 'antes': antes, 'depois': depois},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em {arquivo}")
+
+
+if __name__ == '__main__':
+    main()
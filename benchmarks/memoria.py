@@ -0,0 +1,104 @@
+"""
+Benchmark de memória do carregamento dos DataFrames de análise.
+
+Compara a leitura antiga (pd.read_sql de todas as colunas de Estudante, com
+textos como object) com carregar_estudantes_df() (projeção de colunas,
+categorias, idade em Int16 e leitura em blocos). Para cada variante mede o
+tamanho final do DataFrame (memory_usage(deep=True)) e o pico de memória
+durante a leitura (tracemalloc).
+
+Uso:
+    python -m benchmarks.memoria                    # 1.000.000 de linhas
+    python -m benchmarks.memoria --linhas 200000 --chunksize 20000
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.dados import COLUNAS_ANALISE, COLUNAS_SEGMENTACAO, carregar_estudantes_df
+from app.dimensoes import CacheDimensoes
+from app.models import User, Planilha, Estudante
+from benchmarks.geradores import gerar_estudantes
+from benchmarks.run import BenchConfig
+
+LOTE_INSERCAO = 50000
+
+
+class MemoriaConfig(BenchConfig):
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'BENCH_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'meu_app_bench_memoria.sqlite'))
+
+
+def preparar_base(linhas):
+    """Recria as tabelas com `linhas` estudantes de um único usuário (inseridos em lotes)."""
+    db.drop_all()
+    db.create_all()
+    user = User(username='memoria', email='memoria@exemplo.com', password_hash='x', confirmed=True)
+    db.session.add(user)
+    db.session.commit()
+    planilha = Planilha(nome_amigavel='Memória', spreadsheet_id='memoria', range_name='A:Z', user_id=user.id)
+    db.session.add(planilha)
+    db.session.commit()
+    dimensoes = CacheDimensoes()
+    for inicio in range(0, linhas, LOTE_INSERCAO):
+        tamanho = min(LOTE_INSERCAO, linhas - inicio)
+        lote = dimensoes.converter_linhas(gerar_estudantes(tamanho, user.id, planilha.id, seed=inicio))
+        db.session.execute(insert(Estudante), lote)
+        db.session.commit()
+    return user.id
+
+
+def medir(nome, carregar):
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    df = carregar()
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tamanho = int(df.memory_usage(deep=True).sum())
+    del df
+    return {'variante': nome, 'dataframe_mb': tamanho / 2**20, 'pico_mb': pico / 2**20, 'segundos': duracao}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memória dos DataFrames de análise.')
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--chunksize', type=int, default=50000)
+    args = parser.parse_args()
+
+    app = create_app(MemoriaConfig)
+    with app.app_context():
+        print(f"Gerando {args.linhas} estudantes...")
+        user_id = preparar_base(args.linhas)
+
+        def antigo():
+            import pandas as pd
+            return pd.read_sql(Estudante.query.filter_by(user_id=user_id).statement, db.engine)
+
+        variantes = [
+            ('antigo: todas as colunas', antigo),
+            ('novo: colunas de análise', lambda: carregar_estudantes_df(user_id, COLUNAS_ANALISE, chunksize=args.chunksize)),
+            ('novo: segmentação', lambda: carregar_estudantes_df(user_id, COLUNAS_SEGMENTACAO, chunksize=args.chunksize)),
+            ('novo: analysis', lambda: carregar_estudantes_df(user_id, ('curso_interesse', 'idade'), chunksize=args.chunksize)),
+            ('novo: gráfico de cidades', lambda: carregar_estudantes_df(user_id, ('cidade',), chunksize=args.chunksize)),
+        ]
+        resultados = [medir(nome, carregar) for nome, carregar in variantes]
+
+    referencia = resultados[0]
+    print(f"\n{'variante':<28} {'DataFrame':>12} {'pico':>12} {'tempo':>9}")
+    for r in resultados:
+        linha = f"{r['variante']:<28} {r['dataframe_mb']:>9.1f} MB {r['pico_mb']:>9.1f} MB {r['segundos']:>7.2f} s"
+        if r is not referencia:
+            linha += f"  (DataFrame {1 - r['dataframe_mb'] / referencia['dataframe_mb']:.0%} menor, " \
+                     f"pico {1 - r['pico_mb'] / referencia['pico_mb']:.0%} menor)"
+        print(linha)
+
+
+if __name__ == '__main__':
+    main()
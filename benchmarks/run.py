@@ -0,0 +1,216 @@
+"""
+Suíte de benchmarks reprodutíveis da aplicação.
+
+Roda process_sheet, sync_all_sheets (com a planilha alterada no Drive e sem
+alterações), analysis, dashboard e ml_analysis com dados sintéticos e fakes dos
+serviços externos, em vários tamanhos de base.
+
+Uso:
+    python -m benchmarks.run                          # tamanhos 100, 1000 e 10000
+    python -m benchmarks.run --tamanhos 500 5000 --repeticoes 5
+    python -m benchmarks.run --salvar-baseline        # grava o resultado como referência
+
+Os resultados vão para benchmarks/resultados/<data>.json e são comparados com
+benchmarks/resultados/baseline.json, se existir. Por padrão usa um SQLite
+temporário; defina BENCH_DATABASE_URL para medir contra o PostgreSQL.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from sqlalchemy import insert
+
+from config import Config, opcoes_engine
+from app import create_app, db, bcrypt
+from app.dimensoes import CacheDimensoes
+from app.models import User, Planilha, Estudante
+from app import tarefas, utils
+from benchmarks.fakes import CREDENCIAIS_FALSAS, FakeGoogleBackend, instalar_fakes
+from benchmarks.geradores import gerar_estudantes, gerar_valores_planilha
+import sync_sheets
+
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(__file__), 'resultados')
+BASELINE = os.path.join(DIRETORIO_RESULTADOS, 'baseline.json')
+SENHA = 'senha-benchmark'
+
+
+class BenchConfig(Config):
+    SECRET_KEY = 'benchmark'
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'BENCH_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'meu_app_bench.sqlite'))
+    SQLALCHEMY_ENGINE_OPTIONS = opcoes_engine(SQLALCHEMY_DATABASE_URI, 5, 5)
+    METRICS_LOG_REQUESTS = False
+    # Mede o custo de gerar as páginas, não o de servi-las do cache
+    CACHE_PAGINAS_ATIVO = False
+    # Cada repetição do sync_all_sheets processa todas as planilhas de novo
+    SYNC_INTERVALO_SEGUNDOS = 0
+
+
+def preparar_base(app, backend, tamanho):
+    """Recria as tabelas com um usuário, uma planilha e `tamanho` estudantes."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='bench', email='bench@exemplo.com', confirmed=True,
+                    password_hash=bcrypt.generate_password_hash(SENHA).decode('utf-8'),
+                    google_credentials=CREDENCIAIS_FALSAS)
+        db.session.add(user)
+        db.session.commit()
+        planilha = Planilha(nome_amigavel=f'Formulário {tamanho}', spreadsheet_id=f'bench-{tamanho}',
+                            range_name='Respostas ao formulário 1!A:Z', user_id=user.id)
+        db.session.add(planilha)
+        db.session.commit()
+        linhas = CacheDimensoes().converter_linhas(gerar_estudantes(tamanho, user.id, planilha.id))
+        db.session.execute(insert(Estudante), linhas)
+        db.session.commit()
+        backend.adicionar_planilha(planilha.spreadsheet_id, gerar_valores_planilha(tamanho))
+        return planilha.id
+
+
+def cliente_logado(app):
+    cliente = app.test_client()
+    cliente.post('/login', data={'email': 'bench@exemplo.com', 'password': SENHA})
+    return cliente
+
+
+def cenarios(app, cliente, planilha_id, backend):
+    """Cada cenário é uma função sem argumentos que devolve o status HTTP (ou None)."""
+    def process_sheet():
+        # Enfileira pela rota e executa a tarefa aqui mesmo, como o worker_tarefas.py faria
+        utils.column_mapping_cache.clear()
+        status = cliente.get(f'/process_sheet/{planilha_id}').status_code
+        with app.app_context():
+            tarefas.processar_pendentes('benchmark')
+        return status
+
+    def sync_all_sheets():
+        # Nova versão no Drive a cada repetição: mede o caminho completo (baixar, mapear e gravar)
+        backend.alterar_planilhas()
+        utils.column_mapping_cache.clear()
+        sync_sheets.sync_all_sheets(app)
+
+    def sync_sem_alteracoes():
+        # Logo depois do anterior, a versão no Drive é a já gravada: só a conferência dos metadados
+        sync_sheets.sync_all_sheets(app)
+
+    return {
+        'process_sheet': process_sheet,
+        'sync_all_sheets': sync_all_sheets,
+        'sync_sem_alteracoes': sync_sem_alteracoes,
+        'analysis': lambda: cliente.get('/analysis').status_code,
+        'dashboard': lambda: cliente.get('/dashboard').status_code,
+        'ml_analysis': lambda: cliente.get('/ml_analysis').status_code,
+    }
+
+
+def medir(funcao, repeticoes):
+    tempos, status = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            status = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {
+        'mediana_ms': round(statistics.median(tempos) * 1000, 2),
+        'min_ms': round(min(tempos) * 1000, 2),
+        'max_ms': round(max(tempos) * 1000, 2),
+        'repeticoes': repeticoes,
+        'status': status,
+    }
+
+
+def executar(tamanhos, repeticoes, filtro=None):
+    app = create_app(BenchConfig)
+    backend = FakeGoogleBackend()
+    resultados = []
+    with instalar_fakes(backend):
+        for tamanho in tamanhos:
+            planilha_id = preparar_base(app, backend, tamanho)
+            cliente = cliente_logado(app)
+            for nome, funcao in cenarios(app, cliente, planilha_id, backend).items():
+                if filtro and nome not in filtro:
+                    continue
+                medida = medir(funcao, repeticoes)
+                medida.update({'cenario': nome, 'tamanho': tamanho})
+                resultados.append(medida)
+                print(f"{nome:<16} n={tamanho:<8} mediana={medida['mediana_ms']:>10.2f} ms  "
+                      f"min={medida['min_ms']:>10.2f} ms  status={medida['status']}")
+    return resultados
+
+
+def metadados():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'plataforma': platform.platform(),
+        'banco': BenchConfig.SQLALCHEMY_DATABASE_URI.split(':', 1)[0],
+    }
+
+
+def comparar(resultados, referencia, tolerancia):
+    """Imprime a variação em relação à referência e devolve as regressões encontradas."""
+    anteriores = {(r['cenario'], r['tamanho']): r for r in referencia['resultados']}
+    regressoes = []
+    print(f"\nComparação com a referência ({referencia['metadados'].get('commit')}):")
+    for r in resultados:
+        anterior = anteriores.get((r['cenario'], r['tamanho']))
+        if not anterior or not anterior['mediana_ms']:
+            continue
+        variacao = r['mediana_ms'] / anterior['mediana_ms'] - 1
+        marca = ''
+        if variacao > tolerancia:
+            marca = '  <-- REGRESSÃO'
+            regressoes.append((r['cenario'], r['tamanho'], variacao))
+        print(f"{r['cenario']:<16} n={r['tamanho']:<8} {anterior['mediana_ms']:>10.2f} -> "
+              f"{r['mediana_ms']:>10.2f} ms ({variacao:+.1%}){marca}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks da aplicação com dados sintéticos.')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--cenarios', nargs='+', help='Roda apenas os cenários indicados.')
+    parser.add_argument('--salvar-baseline', action='store_true', help='Grava o resultado como referência.')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Piora aceita antes de acusar regressão.')
+    parser.add_argument('--falhar-em-regressao', action='store_true')
+    args = parser.parse_args()
+
+    resultados = executar(args.tamanhos, args.repeticoes, args.cenarios)
+    saida = {'metadados': metadados(), 'resultados': resultados}
+
+    os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+    arquivo = os.path.join(DIRETORIO_RESULTADOS, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(arquivo, 'w') as f:
+        json.dump(saida, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em {arquivo}")
+
+    regressoes = []
+    if args.salvar_baseline:
+        with open(BASELINE, 'w') as f:
+            json.dump(saida, f, indent=2, ensure_ascii=False)
+        print(f"Referência atualizada em {BASELINE}")
+    elif os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia)
+
+    if regressoes and args.falhar_em_regressao:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
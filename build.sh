@@ -8,8 +8,13 @@ set -o errexit
 echo "Instalando dependências..."
 pip install -r requirements.txt
 
-# 2. Cria as tabelas do banco de dados diretamente
-echo "Criando tabelas do banco de dados..."
-python -c "from app import create_app, db; app = create_app(); app.app_context().push(); db.create_all()"
+# 2. Cria/atualiza as tabelas com as migrações (migrations/). Bancos criados antes
+#    delas são convertidos por migrar_dimensoes.py e migrar_remocao.py e marcados na revisão inicial
+echo "Aplicando as migrações do banco de dados..."
+python migrar_banco.py
+
+# 3. Gera o manifesto dos arquivos estáticos versionados (app/assets.py)
+echo "Gerando manifesto dos arquivos estáticos..."
+FLASK_APP=run.py flask gerar-manifesto
 
 echo "Build finalizado com sucesso!"
\ No newline at end of file
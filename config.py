@@ -4,6 +4,22 @@ from dotenv import load_dotenv
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
+def opcoes_engine(url, pool_size, max_overflow):
+    """
+    Opções do engine do SQLAlchemy. pool_recycle/pool_pre_ping evitam timeouts;
+    o tamanho do pool só vale para bancos de servidor (o SQLite usa pools sem tamanho).
+    Cada worker do Gunicorn tem seu pool: workers * (pool_size + max_overflow)
+    precisa caber no max_connections do banco.
+    """
+    opcoes = {
+        'pool_recycle': 280,
+        'pool_pre_ping': True
+    }
+    if url and not url.startswith('sqlite'):
+        opcoes.update(pool_size=pool_size, max_overflow=max_overflow,
+                      pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', '10')))
+    return opcoes
+
 class Config:
     """
     Classe de configuração que busca as variáveis do ambiente.
@@ -12,12 +28,89 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-    # Adiciona opções para o engine do SQLAlchemy para evitar timeouts
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_recycle': 280,
-        'pool_pre_ping': True
-    }
+    # Banco principal: recebe as escritas da importação e as consultas do dia a dia
+    SQLALCHEMY_ENGINE_OPTIONS = opcoes_engine(SQLALCHEMY_DATABASE_URI,
+                                              int(os.environ.get('DB_POOL_SIZE', '5')),
+                                              int(os.environ.get('DB_MAX_OVERFLOW', '5')))
+
+    # Réplica de leitura opcional para as consultas de análise (app/replica.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {
+        'replica': {
+            'url': DATABASE_REPLICA_URL,
+            **opcoes_engine(DATABASE_REPLICA_URL,
+                            int(os.environ.get('REPLICA_POOL_SIZE', '5')),
+                            int(os.environ.get('REPLICA_MAX_OVERFLOW', '10'))),
+        }
+    } if DATABASE_REPLICA_URL else {}
+    # Atraso máximo aceito na réplica; acima disso as análises leem do banco principal
+    REPLICA_ATRASO_MAXIMO_SEGUNDOS = float(os.environ.get('REPLICA_ATRASO_MAXIMO_SEGUNDOS', '30'))
 
     # Credenciais do Google
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
-    GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
\ No newline at end of file
+    GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
+    # Cliente assíncrono da rota search_sheets (app/google_async.py):
+    # chamadas simultâneas por requisição e tempo máximo de cada uma
+    GOOGLE_CONCORRENCIA = int(os.environ.get('GOOGLE_CONCORRENCIA', '10'))
+    GOOGLE_TIMEOUT_SEGUNDOS = float(os.environ.get('GOOGLE_TIMEOUT_SEGUNDOS', '30'))
+
+    # Métricas (/metrics). Se METRICS_TOKEN estiver definido, a rota exige 'Authorization: Bearer <token>';
+    # sem ele, só responde a requisições feitas da própria máquina (127.0.0.1/::1, sem proxy) e nega as demais
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_LOG_REQUESTS = os.environ.get('METRICS_LOG_REQUESTS', '1') == '1'
+    # Execuções do mesmo comando SQL numa requisição/tarefa a partir das quais ele é candidato a N+1
+    CONSULTAS_REPETIDAS_LIMITE = int(os.environ.get('CONSULTAS_REPETIDAS_LIMITE', '5'))
+
+    # Cache das páginas de análise e dos cálculos por versão dos dados do usuário (app/cache.py)
+    CACHE_PAGINAS_ATIVO = os.environ.get('CACHE_PAGINAS_ATIVO', '1') == '1'
+    CACHE_PAGINAS_MAX = int(os.environ.get('CACHE_PAGINAS_MAX', '256'))
+    # Linhas lidas por bloco ao montar os DataFrames de análise (app/dados.py)
+    ANALISE_CHUNKSIZE = int(os.environ.get('ANALISE_CHUNKSIZE', '50000'))
+    # Identifica o deploy nos ETags; o Render define RENDER_GIT_COMMIT automaticamente
+    APP_VERSION = os.environ.get('RENDER_GIT_COMMIT')
+
+    # Arquivos estáticos com hash no nome e cache immutable (app/assets.py)
+    ASSETS_VERSIONADOS = os.environ.get('ASSETS_VERSIONADOS', '1') == '1'
+
+    # Confiança mínima do mapeador local de colunas (app/mapeamento.py) para dispensar o Gemini
+    MAPEAMENTO_CONFIANCA_MINIMA = float(os.environ.get('MAPEAMENTO_CONFIANCA_MINIMA', '0.8'))
+    # Cabeçalhos por prompt quando o sync_sheets.py pede vários mapeamentos ao Gemini de uma vez
+    MAPEAMENTO_LOTE_MAXIMO = int(os.environ.get('MAPEAMENTO_LOTE_MAXIMO', '20'))
+
+    # Workers de sincronização com lease por planilha (app/sincronizacao.py)
+    SYNC_LEASE_SEGUNDOS = int(os.environ.get('SYNC_LEASE_SEGUNDOS', '300'))
+    SYNC_HEARTBEAT_SEGUNDOS = int(os.environ.get('SYNC_HEARTBEAT_SEGUNDOS', '60'))
+    # Uma planilha sincronizada há menos que isso (por qualquer worker) não é processada de novo
+    SYNC_INTERVALO_SEGUNDOS = int(os.environ.get('SYNC_INTERVALO_SEGUNDOS', '300'))
+    # Planilhas reivindicadas por vez; os cabeçalhos do lote são mapeados juntos
+    SYNC_LOTE_PLANILHAS = int(os.environ.get('SYNC_LOTE_PLANILHAS', '20'))
+
+    # Processamento de planilhas em segundo plano (app/tarefas.py, worker_tarefas.py)
+    TAREFAS_LOTE_LINHAS = int(os.environ.get('TAREFAS_LOTE_LINHAS', '500'))
+    # Tarefa 'executando' sem atualização há mais que isso é retomada por outro worker
+    TAREFAS_TIMEOUT_SEGUNDOS = int(os.environ.get('TAREFAS_TIMEOUT_SEGUNDOS', '300'))
+    TAREFAS_INTERVALO_SEGUNDOS = float(os.environ.get('TAREFAS_INTERVALO_SEGUNDOS', '2'))
+    # Fluxo SSE do progresso: frequência de consulta e duração máxima de cada conexão
+    TAREFAS_SSE_INTERVALO_SEGUNDOS = float(os.environ.get('TAREFAS_SSE_INTERVALO_SEGUNDOS', '0.5'))
+    TAREFAS_SSE_DURACAO_MAXIMA = int(os.environ.get('TAREFAS_SSE_DURACAO_MAXIMA', '55'))
+
+    # Segmentação do ml_analysis (app/clusters.py). Com SEGMENTOS_K_AUTOMATICO=0 usa sempre SEGMENTOS_NUM_CLUSTERS
+    SEGMENTOS_K_AUTOMATICO = os.environ.get('SEGMENTOS_K_AUTOMATICO', '1') == '1'
+    SEGMENTOS_NUM_CLUSTERS = int(os.environ.get('SEGMENTOS_NUM_CLUSTERS', '3'))
+    SEGMENTOS_K_MIN = int(os.environ.get('SEGMENTOS_K_MIN', '2'))
+    SEGMENTOS_K_MAX = int(os.environ.get('SEGMENTOS_K_MAX', '8'))
+    # 'silhueta' ou 'cotovelo' (joelho da curva de inércia)
+    SEGMENTOS_CRITERIO = os.environ.get('SEGMENTOS_CRITERIO', 'silhueta')
+    # Linhas da amostra estratificada por curso em que cada k é avaliado
+    SEGMENTOS_AMOSTRA = int(os.environ.get('SEGMENTOS_AMOSTRA', '5000'))
+    # Tempo máximo da escolha de k; vale o melhor k avaliado até lá
+    SEGMENTOS_ORCAMENTO_SEGUNDOS = float(os.environ.get('SEGMENTOS_ORCAMENTO_SEGUNDOS', '2'))
+    # Processos do pool de avaliação por worker do Gunicorn (0 = número de CPUs; 1 = sem pool).
+    # São processos novos, sem a memória compartilhada por copy-on-write com o master:
+    # cada um custa um interpretador com o scikit-learn, multiplicado pelo número de workers
+    SEGMENTOS_PROCESSOS = int(os.environ.get('SEGMENTOS_PROCESSOS', '2'))
+
+    # Remoção de formulários em segundo plano (app/remocao.py): estudantes apagados por transação
+    REMOCAO_LOTE_LINHAS = int(os.environ.get('REMOCAO_LOTE_LINHAS', '5000'))
+    # Lotes de remoção por ciclo do worker, para não atrasar as tarefas de processamento
+    REMOCAO_LOTES_POR_CICLO = int(os.environ.get('REMOCAO_LOTES_POR_CICLO', '20'))
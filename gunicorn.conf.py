@@ -0,0 +1,55 @@
+# gunicorn.conf.py
+# Configuração do Gunicorn. Uso: gunicorn -c gunicorn.conf.py run:app
+import gc
+import os
+import shutil
+
+# Diretório onde cada worker grava suas métricas; a rota /metrics soma todos eles.
+# Precisa existir antes de o prometheus_client ser importado pela aplicação
+# (com preload isso acontece no master, antes de qualquer hook), então é
+# preparado aqui, na leitura da configuração, descartando execuções anteriores.
+_diretorio_metricas = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/meu_app_metrics')
+shutil.rmtree(_diretorio_metricas, ignore_errors=True)
+os.makedirs(_diretorio_metricas, exist_ok=True)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+timeout = 120
+# Threads por worker (gthread). O fluxo SSE do progresso das tarefas ocupa uma
+# thread enquanto a página da tarefa está aberta; com uma thread só, cada página
+# aberta travaria um worker inteiro.
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Carrega a aplicação (e as bibliotecas pesadas) uma vez no master; os workers
+# nascem por fork já prontos e compartilham essa memória por copy-on-write.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    """No master, após carregar a aplicação: importa pandas, sklearn, clientes Google etc."""
+    if server.cfg.preload_app:
+        from app import precarregar_dependencias
+        precarregar_dependencias()
+        # Move os objetos já criados para fora do GC, evitando que ele os toque
+        # nos workers e quebre o compartilhamento das páginas de memória.
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    """
+    Descarta conexões de banco herdadas do master; cada worker abre as suas.
+    Também sobe, sem esperar, o pool de processos da escolha de k do ml_analysis.
+    """
+    if server.cfg.preload_app:
+        from app import db
+        from app.clusters import aquecer_pool
+        with server.app.wsgi().app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+            aquecer_pool()
+
+
+def child_exit(server, worker):
+    """Marca o worker como encerrado para que seus gauges não sejam mais somados."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,39 @@
+"""
+Atualiza o esquema do banco com as migrações do Flask-Migrate (pasta migrations/).
+
+Bancos criados antes das migrações, com db.create_all(), não têm a tabela
+alembic_version: eles passam primeiro por migrar_dimensoes.py e
+migrar_remocao.py, que os levam ao esquema da revisão inicial, e são marcados
+nela. Daí em diante o esquema só muda por migrações.
+
+Uso:
+    python migrar_banco.py
+
+Depois de alterar app/models.py, gere a migração nova com:
+    flask db migrate -m "descrição"
+"""
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
+from app import create_app, db
+import migrar_dimensoes
+import migrar_remocao
+
+REVISAO_INICIAL = '0001'
+
+
+def migrar(app=None):
+    app = app or create_app()
+    with app.app_context():
+        tabelas = set(inspect(db.engine).get_table_names())
+        if 'estudante' in tabelas and 'alembic_version' not in tabelas:
+            print(f"Banco criado sem migrações: convertendo e marcando a revisão {REVISAO_INICIAL}...")
+            migrar_dimensoes.migrar(app)
+            migrar_remocao.migrar(app)
+            stamp(revision=REVISAO_INICIAL)
+        print("--- APLICANDO MIGRAÇÕES ---")
+        upgrade()
+        print("--- MIGRAÇÕES APLICADAS ---")
+
+
+if __name__ == '__main__':
+    migrar()
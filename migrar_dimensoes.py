@@ -0,0 +1,110 @@
+"""
+Migra bancos antigos, com cidade e curso_interesse em texto na tabela estudante,
+para as tabelas de dimensão Cidade/Curso (app/dimensoes.py).
+
+Etapas (o script pode ser executado de novo sem efeito se já foi aplicado):
+  1. cria as tabelas cidade/curso e as colunas estudante.cidade_id/curso_id;
+  2. cria uma linha de dimensão por texto canônico distinto; a grafia mais
+     frequente de cada cidade/curso vira o nome exibido;
+  3. preenche os ids em lotes de linhas, usando uma tabela temporária texto -> id;
+  4. confere que todo texto com dimensão recebeu seu id e remove as colunas de texto.
+
+No PostgreSQL, rode VACUUM FULL estudante depois para devolver o espaço liberado.
+
+Uso:
+    python migrar_dimensoes.py
+    python migrar_dimensoes.py --lote 20000
+"""
+import argparse
+from sqlalchemy import Column, Integer, MetaData, String, Table, inspect, insert, text
+from app import create_app, db
+from app.dimensoes import CacheDimensoes
+from app.models import Cidade, Curso
+
+COLUNAS = (('cidade', 'cidade_id', Cidade), ('curso_interesse', 'curso_id', Curso))
+
+
+def _colunas_estudante():
+    return {c['name'] for c in inspect(db.engine).get_columns('estudante')}
+
+
+def adicionar_colunas_de_id(colunas):
+    with db.engine.begin() as conexao:
+        for _, coluna_id, modelo in COLUNAS:
+            if coluna_id not in colunas:
+                print(f"Adicionando a coluna estudante.{coluna_id}...")
+                conexao.execute(text(
+                    f"ALTER TABLE estudante ADD COLUMN {coluna_id} INTEGER REFERENCES {modelo.__tablename__}(id)"))
+
+
+def preencher_ids(coluna_texto, coluna_id, modelo, lote):
+    """Cria as linhas da dimensão e preenche estudante.<coluna_id>. Devolve as linhas que ficaram sem id."""
+    distintos = db.session.execute(text(
+        f"SELECT {coluna_texto}, COUNT(*) AS total FROM estudante WHERE {coluna_texto} IS NOT NULL "
+        f"GROUP BY {coluna_texto} ORDER BY total DESC")).all()
+    dimensoes = CacheDimensoes()
+    mapa = [{'texto': texto, 'dimensao_id': dimensoes.resolver(modelo, texto)} for texto, _ in distintos]
+    db.session.commit()
+    print(f"{len(distintos)} textos distintos de '{coluna_texto}' viraram "
+          f"{len({m['dimensao_id'] for m in mapa if m['dimensao_id']})} linhas de {modelo.__tablename__}.")
+
+    metadados = MetaData()
+    tabela_mapa = Table(f'mapa_{coluna_id}', metadados,
+                        Column('texto', String(255), primary_key=True),
+                        Column('dimensao_id', Integer))
+    metadados.drop_all(db.engine)
+    metadados.create_all(db.engine)
+    try:
+        with db.engine.begin() as conexao:
+            if mapa:
+                conexao.execute(insert(tabela_mapa), mapa)
+            maior_id = conexao.execute(text("SELECT MAX(id) FROM estudante")).scalar() or 0
+
+        for inicio in range(0, maior_id + 1, lote):
+            with db.engine.begin() as conexao:
+                conexao.execute(text(
+                    f"UPDATE estudante SET {coluna_id} = "
+                    f"(SELECT m.dimensao_id FROM {tabela_mapa.name} m WHERE m.texto = estudante.{coluna_texto}) "
+                    f"WHERE id >= :inicio AND id < :fim AND {coluna_id} IS NULL AND {coluna_texto} IS NOT NULL"),
+                    {'inicio': inicio, 'fim': inicio + lote})
+            print(f"  {coluna_id}: linhas até o id {min(inicio + lote, maior_id + 1) - 1} preenchidas.")
+
+        with db.engine.connect() as conexao:
+            return conexao.execute(text(
+                f"SELECT COUNT(*) FROM estudante e JOIN {tabela_mapa.name} m ON m.texto = e.{coluna_texto} "
+                f"WHERE m.dimensao_id IS NOT NULL AND e.{coluna_id} IS NULL")).scalar()
+    finally:
+        metadados.drop_all(db.engine)
+
+
+def migrar(app=None, lote=50000):
+    app = app or create_app()
+    with app.app_context():
+        print("--- MIGRAÇÃO PARA AS TABELAS DE DIMENSÃO ---")
+        db.create_all()
+        colunas = _colunas_estudante()
+        adicionar_colunas_de_id(colunas)
+
+        pendentes = [c for c in COLUNAS if c[0] in colunas]
+        if not pendentes:
+            print("As colunas de texto já foram removidas. Nada a fazer.")
+            return
+
+        for coluna_texto, coluna_id, modelo in pendentes:
+            sem_id = preencher_ids(coluna_texto, coluna_id, modelo, lote)
+            if sem_id:
+                print(f"ERRO: {sem_id} linhas ficaram sem {coluna_id}. As colunas de texto foram mantidas.")
+                return
+
+        with db.engine.begin() as conexao:
+            for coluna_texto, _, _ in pendentes:
+                print(f"Removendo a coluna estudante.{coluna_texto}...")
+                conexao.execute(text(f"ALTER TABLE estudante DROP COLUMN {coluna_texto}"))
+        print("--- MIGRAÇÃO FINALIZADA ---")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migra cidade/curso em texto para as tabelas de dimensão.')
+    parser.add_argument('--lote', type=int, default=50000, help='Linhas de estudante atualizadas por transação.')
+    args = parser.parse_args()
+    migrar(lote=args.lote)
@@ -0,0 +1,61 @@
+"""
+Prepara bancos antigos para a remoção de formulários em segundo plano (app/remocao.py).
+
+Etapas (o script pode ser executado de novo sem efeito se já foi aplicado):
+  1. cria a coluna planilha.removida_em e seu índice;
+  2. no PostgreSQL, recria a chave estrangeira estudante.planilha_origem_id com
+     ON DELETE CASCADE. A constraint nova entra como NOT VALID e é validada em
+     seguida, o que não bloqueia as escritas na tabela estudante durante a varredura.
+
+No SQLite a chave estrangeira não pode ser alterada; lá a purga já apaga os
+estudantes antes da planilha.
+
+Uso:
+    python migrar_remocao.py
+"""
+from sqlalchemy import inspect, text
+from app import create_app, db
+
+
+def adicionar_coluna_removida_em():
+    colunas = {c['name'] for c in inspect(db.engine).get_columns('planilha')}
+    with db.engine.begin() as conexao:
+        if 'removida_em' not in colunas:
+            print("Adicionando a coluna planilha.removida_em...")
+            conexao.execute(text("ALTER TABLE planilha ADD COLUMN removida_em TIMESTAMP"))
+        conexao.execute(text("CREATE INDEX IF NOT EXISTS ix_planilha_removida_em ON planilha (removida_em)"))
+
+
+def recriar_chave_com_cascade():
+    if db.engine.dialect.name != 'postgresql':
+        print(f"Banco {db.engine.dialect.name}: a chave estrangeira de estudante.planilha_origem_id fica como está.")
+        return
+    chaves = [fk for fk in inspect(db.engine).get_foreign_keys('estudante')
+              if fk['referred_table'] == 'planilha' and fk['constrained_columns'] == ['planilha_origem_id']]
+    if any((fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE' for fk in chaves):
+        print("A chave estrangeira de estudante.planilha_origem_id já tem ON DELETE CASCADE.")
+        return
+    nome = chaves[0]['name'] if chaves else 'estudante_planilha_origem_id_fkey'
+    print(f"Recriando a chave estrangeira {nome} com ON DELETE CASCADE...")
+    with db.engine.begin() as conexao:
+        for fk in chaves:
+            conexao.execute(text(f'ALTER TABLE estudante DROP CONSTRAINT "{fk["name"]}"'))
+        conexao.execute(text(
+            f'ALTER TABLE estudante ADD CONSTRAINT "{nome}" FOREIGN KEY (planilha_origem_id) '
+            f'REFERENCES planilha (id) ON DELETE CASCADE NOT VALID'))
+    with db.engine.begin() as conexao:
+        conexao.execute(text(f'ALTER TABLE estudante VALIDATE CONSTRAINT "{nome}"'))
+
+
+def migrar(app=None):
+    app = app or create_app()
+    with app.app_context():
+        print("--- MIGRAÇÃO PARA A REMOÇÃO EM SEGUNDO PLANO ---")
+        db.create_all()
+        adicionar_coluna_removida_em()
+        recriar_chave_com_cascade()
+        print("--- MIGRAÇÃO FINALIZADA ---")
+
+
+if __name__ == '__main__':
+    migrar()
@@ -0,0 +1,56 @@
+"""índices de estudante e planilha
+
+Índices para os acessos reais das rotas: análises e API por (user_id, id),
+exclusões da sincronização/purga por planilha_origem_id e a lista de dados
+processados por (user_id, nome, id). No PostgreSQL o primeiro cobre as colunas
+da contagem e da página de análise (INCLUDE), o de planilha é parcial e todos
+são criados com CREATE INDEX CONCURRENTLY, sem bloquear as escritas em tabelas
+grandes. Índices que já existem (banco criado com db.create_all()) são mantidos.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 19:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDICES = (
+    ('ix_estudante_user_id_id', 'estudante', ['user_id', 'id'],
+     {'postgresql_include': ['curso_id', 'cidade_id', 'idade', 'planilha_origem_id']}),
+    ('ix_estudante_planilha_origem_id', 'estudante', ['planilha_origem_id'], {}),
+    ('ix_estudante_user_id_nome_id', 'estudante', ['user_id', 'nome', 'id'], {}),
+    ('ix_planilha_user_id_data_cadastro', 'planilha', ['user_id', 'data_cadastro'],
+     {'postgresql_where': sa.text('removida_em IS NULL')}),
+)
+
+
+def _existentes(tabela):
+    return {indice['name'] for indice in sa.inspect(op.get_bind()).get_indexes(tabela)}
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    existentes = {tabela: _existentes(tabela) for tabela in ('estudante', 'planilha')}
+    # CONCURRENTLY não roda dentro de transação
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas, opcoes in INDICES:
+            if nome not in existentes[tabela]:
+                op.create_index(nome, tabela, colunas, unique=False,
+                                postgresql_concurrently=postgres, **opcoes)
+        if postgres:
+            op.execute('ANALYZE estudante')
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for nome, tabela, _, _ in reversed(INDICES):
+            op.drop_index(nome, table_name=tabela, postgresql_concurrently=postgres)
@@ -0,0 +1,32 @@
+"""metadados do drive na planilha
+
+version e modifiedTime do arquivo no Drive na última sincronização, usados
+pelo sync_sheets.py para pular planilhas que não mudaram. Colunas anuláveis e
+sem valor padrão: no PostgreSQL a inclusão não reescreve a tabela.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('planilha', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('drive_versao', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('drive_modificada_em', sa.String(length=40), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('planilha', schema=None) as batch_op:
+        batch_op.drop_column('drive_modificada_em')
+        batch_op.drop_column('drive_versao')
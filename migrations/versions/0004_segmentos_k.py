@@ -0,0 +1,31 @@
+"""k da segmentação na versão dos dados
+
+Número de segmentos escolhido automaticamente (app/clusters.py) para a versão
+atual dos dados do usuário. A escolha depende do que termina dentro do
+orçamento de tempo; guardada aqui, a página ml_analysis e a API de gráficos de
+qualquer worker segmentam com o mesmo k. Coluna anulável e sem valor padrão.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-20 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('versao_dados', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('segmentos_k', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('versao_dados', schema=None) as batch_op:
+        batch_op.drop_column('segmentos_k')
@@ -17,7 +17,9 @@ else:
             # --- CORREÇÃO AQUI ---
             # Apagamos todas as tabelas usando CASCADE para remover dependências.
             # O SQLAlchemy criará todas novamente na ordem correta.
-            sql_command = text('DROP TABLE IF EXISTS estudante, planilha, "user" CASCADE;')
+            # alembic_version também sai, para que o migrar_banco.py recrie tudo do zero
+            sql_command = text('DROP TABLE IF EXISTS estudante, cidade, curso, lease_sincronizacao, '
+                               'tarefa_processamento, versao_dados, planilha, "user", alembic_version CASCADE;')
             
             print(f"Executando comando para apagar tabelas: {sql_command}")
             connection.execute(sql_command)
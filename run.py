@@ -1,5 +1,5 @@
 # run.py
-from app import create_app, db
+from app import create_app
 
 # Cria a instância da aplicação a partir da factory
 app = create_app()
@@ -8,7 +8,7 @@ app = create_app()
 if __name__ == '__main__':
     # Este bloco só será executado se você rodar 'python run.py' diretamente
     # Para produção, o Gunicorn é recomendado
-    with app.app_context():
-        # Garante que as tabelas do banco de dados sejam criadas se não existirem
-        db.create_all()
+    # Cria/atualiza as tabelas com as migrações (migrations/) antes de subir
+    from migrar_banco import migrar
+    migrar(app)
     app.run(debug=False)
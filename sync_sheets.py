@@ -1,86 +1,226 @@
 import os
 import json
 import random
+import argparse
+from datetime import datetime
+from sqlalchemy import insert, update
+from sqlalchemy.orm import joinedload
 from app import create_app, db
-from app.models import User, Planilha, Estudante
-from app.utils import get_column_mapping_from_ai
+from app.models import Planilha, Estudante
+from app.utils import get_column_mapping_from_ai, mapear_cabecalhos_em_lote
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from app.google_credentials import build_google_service
+from app.cache import incrementar_versao_dados
+from app.dimensoes import CacheDimensoes
+from app.metrics import medir_google, perfil_consultas
+from app.sincronizacao import (Heartbeat, finalizar_lease, garantir_leases, gerar_worker_id, liberar_leases,
+                               reivindicar_planilhas)
 
-def sync_all_sheets():
+# Máximo de chamadas num lote da API do Drive
+LIMITE_LOTE_DRIVE = 100
+
+def buscar_metadados_drive(planilhas):
+    """
+    Busca version e modifiedTime das planilhas no Drive, com uma chamada em lote
+    por usuário (cada um tem suas credenciais). Devolve {planilha.id: (versão,
+    modifiedTime)} só das que responderam; as demais são tratadas como alteradas.
+    """
+    metadados = {}
+
+    def registrar(request_id, resposta, erro):
+        if erro is None and resposta.get('version'):
+            metadados[int(request_id)] = (int(resposta['version']), resposta.get('modifiedTime'))
+
+    por_usuario = {}
+    for planilha in planilhas:
+        if planilha.author and planilha.author.google_credentials:
+            por_usuario.setdefault(planilha.user_id, []).append(planilha)
+    for grupo in por_usuario.values():
+        try:
+            creds = Credentials.from_authorized_user_info(json.loads(grupo[0].author.google_credentials))
+            service = build_google_service('drive', 'v3', creds)
+            for inicio in range(0, len(grupo), LIMITE_LOTE_DRIVE):
+                lote = service.new_batch_http_request(callback=registrar)
+                for planilha in grupo[inicio:inicio + LIMITE_LOTE_DRIVE]:
+                    lote.add(service.files().get(fileId=planilha.spreadsheet_id, fields='id,version,modifiedTime'),
+                             request_id=str(planilha.id))
+                with medir_google('drive.files.get_lote'):
+                    lote.execute()
+        except Exception as e:
+            print(f"AVISO: metadados do Drive indisponíveis ({e}). As planilhas serão buscadas por inteiro.")
+    return metadados
+
+def planilha_inalterada(planilha, metadados):
+    """True se o arquivo no Drive ainda é o da última sincronização gravada."""
+    atual = metadados.get(planilha.id)
+    return (atual is not None and planilha.drive_versao is not None
+            and atual == (planilha.drive_versao, planilha.drive_modificada_em))
+
+def buscar_valores_planilha(planilha, worker_id):
+    """
+    Busca os valores de uma planilha no Google. Devolve None (e libera o lease
+    registrando o motivo) se não houver credenciais, dados ou se a chamada falhar.
+    """
+    print(f"\n--- Buscando planilha: '{planilha.nome_amigavel}' (ID: {planilha.id}) ---")
+
+    user = planilha.author
+    if not user or not user.google_credentials:
+        print(f"Usuário da planilha não encontrado ou não tem credenciais Google. Pulando...")
+        finalizar_lease(planilha.id, worker_id, 'Usuário sem credenciais Google')
+        db.session.commit()
+        return None
+
+    try:
+        creds = Credentials.from_authorized_user_info(json.loads(user.google_credentials))
+        service = build_google_service('sheets', 'v4', creds)
+        sheet = service.spreadsheets()
+        result = sheet.values().get(spreadsheetId=planilha.spreadsheet_id,
+                                    range=planilha.range_name).execute()
+        values = result.get('values', [])
+    except Exception as e:
+        print(f"ERRO ao buscar dados da planilha no Google. Pulando. Detalhes: {e}")
+        finalizar_lease(planilha.id, worker_id, str(e))
+        db.session.commit()
+        return None
+
+    if not values or len(values) < 2:
+        print("Planilha vazia ou sem dados suficientes. Pulando.")
+        finalizar_lease(planilha.id, worker_id)
+        db.session.commit()
+        return None
+    return values
+
+def gravar_planilha(planilha, values, worker_id, column_map=None, dimensoes=None, metadados_drive=None):
+    """
+    Substitui os estudantes da planilha pelos `values` buscados no Google.
+    `dimensoes` pode ser compartilhado entre as planilhas de um lote.
+    `metadados_drive` (versão, modifiedTime), lidos antes de buscar os valores,
+    ficam registrados na planilha para a próxima execução poder pulá-la.
+    """
+    print(f"\n--- Processando planilha: '{planilha.nome_amigavel}' (ID: {planilha.id}) ---")
+    print("Dados encontrados. Iniciando processamento e salvamento...")
+    Estudante.query.filter_by(planilha_origem_id=planilha.id).delete(synchronize_session=False)
+    
+    header = values[0]
+    data_rows = values[1:]
+    
+    if column_map is None:
+        column_map = get_column_mapping_from_ai(header)
+    if not column_map or column_map.get('nome') is None:
+        print("IA não conseguiu mapear colunas. Usando fallback manual.")
+        # Este mapeamento assume a ordem: Nome, Idade, Cidade, Curso. Ajuste se necessário.
+        column_map = {'nome': 0, 'idade': 1, 'cidade': 2, 'curso_interesse': 3}
+
+    dimensoes = dimensoes or CacheDimensoes()
+    dimensoes.precarregar_respostas(data_rows, column_map)
+    novos = []
+    for row in data_rows:
+        try:
+            novos.append({
+                'nome': row[column_map['nome']],
+                'idade': int(row[column_map['idade']]) if column_map.get('idade') is not None and row[column_map['idade']] else None,
+                'cidade_id': dimensoes.id_cidade(row[column_map['cidade']]) if column_map.get('cidade') is not None and row[column_map['cidade']] else None,
+                'curso_id': dimensoes.id_curso(row[column_map['curso_interesse']] if column_map.get('curso_interesse') is not None else "Não informado"),
+                'dispositivo_acesso': random.choice(['Desktop', 'Mobile']),
+                'planilha_origem_id': planilha.id,
+                'user_id': planilha.user_id,
+            })
+        except (IndexError, ValueError, KeyError) as e:
+            print(f"Linha ignorada por erro de formato ou mapeamento: {row} | Erro: {e}")
+            continue
+    # Um único INSERT em lote; render_nulls evita quebrá-lo em vários pelos campos vazios
+    if novos:
+        db.session.execute(insert(Estudante).execution_options(render_nulls=True), novos)
+    
+    # Só grava se o lease ainda for deste worker (ele pode ter expirado e sido retomado por outro)
+    if not finalizar_lease(planilha.id, worker_id):
+        db.session.rollback()
+        # Dimensões criadas nesta transação foram desfeitas junto
+        dimensoes.limpar()
+        print(f"Lease da planilha '{planilha.nome_amigavel}' perdido para outro worker. Dados descartados.")
+        return
+    if metadados_drive:
+        versao, modificada_em = metadados_drive
+        db.session.execute(update(Planilha).where(Planilha.id == planilha.id)
+                           .values(drive_versao=versao, drive_modificada_em=modificada_em))
+    incrementar_versao_dados(planilha.user_id)
+    db.session.commit()
+    print(f"SUCESSO: {len(novos)} registros processados para a planilha '{planilha.nome_amigavel}'.")
+
+def sincronizar_planilha(planilha, worker_id):
+    """Busca os dados de uma planilha no Google e substitui seus estudantes no banco."""
+    values = buscar_valores_planilha(planilha, worker_id)
+    if values is not None:
+        gravar_planilha(planilha, values, worker_id)
+
+def sync_all_sheets(app=None, worker_id=None):
     """
     Esta função busca todas as planilhas cadastradas no sistema
     e atualiza os dados de estudantes no banco de dados.
+    Recebe opcionalmente uma aplicação já criada (usado pelos benchmarks).
+
+    Vários workers (em máquinas diferentes) podem rodar ao mesmo tempo: cada um
+    reivindica um lote de planilhas com leases (app/sincronizacao.py).
+
+    Antes de baixar os valores, os metadados do lote são conferidos no Drive;
+    planilhas sem alterações desde a última sincronização são puladas (só o
+    lease é liberado). Devolve {'processadas': ..., 'puladas': ...}.
     """
-    app = create_app()
-    with app.app_context():
-        print("--- INICIANDO SCRIPT DE SINCRONIZAÇÃO ---")
-        
-        todas_as_planilhas = Planilha.query.all()
-        if not todas_as_planilhas:
-            print("Nenhuma planilha cadastrada para sincronizar. Finalizando.")
-            return
-
-        print(f"Encontradas {len(todas_as_planilhas)} planilhas para verificar.")
-
-        for planilha in todas_as_planilhas:
-            print(f"\n--- Processando planilha: '{planilha.nome_amigavel}' (ID: {planilha.id}) ---")
-            
-            user = User.query.get(planilha.user_id)
-            if not user or not user.google_credentials:
-                print(f"Usuário da planilha não encontrado ou não tem credenciais Google. Pulando...")
-                continue
-
-            try:
-                creds = Credentials.from_authorized_user_info(json.loads(user.google_credentials))
-                service = build('sheets', 'v4', credentials=creds)
-                sheet = service.spreadsheets()
-                result = sheet.values().get(spreadsheetId=planilha.spreadsheet_id,
-                                            range=planilha.range_name).execute()
-                values = result.get('values', [])
-            except Exception as e:
-                print(f"ERRO ao buscar dados da planilha no Google. Pulando. Detalhes: {e}")
-                continue
-
-            if not values or len(values) < 2:
-                print("Planilha vazia ou sem dados suficientes. Pulando.")
-                continue
-
-            print("Dados encontrados. Iniciando processamento e salvamento...")
-            Estudante.query.filter_by(planilha_origem_id=planilha.id).delete()
-            
-            header = values[0]
-            data_rows = values[1:]
-            
-            column_map = get_column_mapping_from_ai(header)
-            if not column_map or column_map.get('nome') is None:
-                print("IA não conseguiu mapear colunas. Usando fallback manual.")
-                # Este mapeamento assume a ordem: Nome, Idade, Cidade, Curso. Ajuste se necessário.
-                column_map = {'nome': 0, 'idade': 1, 'cidade': 2, 'curso_interesse': 3}
-
-            estudantes_processados = 0
-            for row in data_rows:
-                try:
-                    novo_estudante = Estudante(
-                        nome=row[column_map['nome']],
-                        idade=int(row[column_map['idade']]) if column_map.get('idade') is not None and row[column_map['idade']] else None,
-                        cidade=row[column_map['cidade']] if column_map.get('cidade') is not None and row[column_map['cidade']] else None,
-                        curso_interesse=row[column_map['curso_interesse']] if column_map.get('curso_interesse') is not None else "Não informado",
-                        dispositivo_acesso=random.choice(['Desktop', 'Mobile']),
-                        planilha_origem_id=planilha.id,
-                        user_id=user.id
-                    )
-                    db.session.add(novo_estudante)
-                    estudantes_processados += 1
-                except (IndexError, ValueError, KeyError) as e:
-                    print(f"Linha ignorada por erro de formato ou mapeamento: {row} | Erro: {e}")
-                    continue
-            
-            db.session.commit()
-            print(f"SUCESSO: {estudantes_processados} registros processados para a planilha '{planilha.nome_amigavel}'.")
+    app = app or create_app()
+    worker_id = worker_id or gerar_worker_id()
+    with app.app_context(), perfil_consultas('sync_all_sheets'):
+        print(f"--- INICIANDO SCRIPT DE SINCRONIZAÇÃO (worker '{worker_id}') ---")
+        inicio = datetime.utcnow()
+
+        garantir_leases()
+        processadas = puladas = 0
+        with Heartbeat(db.engine, worker_id, app.config['SYNC_HEARTBEAT_SEGUNDOS'], app.config['SYNC_LEASE_SEGUNDOS']):
+            while True:
+                ids = reivindicar_planilhas(worker_id, inicio, app.config['SYNC_LOTE_PLANILHAS'])
+                if not ids:
+                    break
+                # Uma consulta para o lote, já com os usuários, em vez de duas por planilha. Planilhas
+                # removidas (soft delete) depois de reivindicadas ficam de fora e têm o lease liberado
+                planilhas = (Planilha.query.options(joinedload(Planilha.author))
+                             .filter(Planilha.id.in_(ids), Planilha.removida_em.is_(None))
+                             .order_by(Planilha.id).all())
+                removidas = set(ids) - {p.id for p in planilhas}
+                # Fora da sessão, os commits de cada planilha (pulada ou gravada) não expiram as
+                # demais, que seriam recarregadas uma a uma
+                for objeto in {*planilhas, *(p.author for p in planilhas if p.author)}:
+                    db.session.expunge(objeto)
+                # Uma chamada ao Drive por usuário decide quais planilhas precisam ser baixadas
+                metadados = buscar_metadados_drive(planilhas)
+                inalteradas = {p.id for p in planilhas if planilha_inalterada(p, metadados)}
+                if inalteradas or removidas:
+                    liberar_leases(inalteradas | removidas, worker_id)
+                    db.session.commit()
+                if removidas:
+                    print(f"{len(removidas)} planilhas removidas depois de reivindicadas. Ignoradas.")
+                if inalteradas:
+                    print(f"{len(inalteradas)} planilhas sem alterações no Drive. Puladas.")
+                    puladas += len(inalteradas)
+                buscadas = [(p, v) for p, v in ((p, buscar_valores_planilha(p, worker_id))
+                                                for p in planilhas if p.id not in inalteradas)
+                            if v is not None]
+                # Os cabeçalhos do lote inteiro vão juntos para a IA (poucos prompts em vez de um por planilha)
+                mapeamentos = mapear_cabecalhos_em_lote([values[0] for _, values in buscadas])
+                dimensoes = CacheDimensoes()
+                for planilha, values in buscadas:
+                    gravar_planilha(planilha, values, worker_id, mapeamentos.get(tuple(values[0])), dimensoes,
+                                    metadados.get(planilha.id))
+                processadas += len(planilhas) - len(inalteradas)
 
+        if not processadas and not puladas:
+            print("Nenhuma planilha pendente para este worker. Finalizando.")
+        else:
+            print(f"\n{processadas} planilhas processadas e {puladas} puladas (sem alterações) por este worker.")
         print("\n--- SCRIPT DE SINCRONIZAÇÃO FINALIZADO ---")
+        return {'processadas': processadas, 'puladas': puladas}
 
 # Esta parte permite que o script seja executado diretamente pelo terminal
 if __name__ == '__main__':
-    sync_all_sheets()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Sincroniza as planilhas cadastradas com o Google Sheets.')
+    parser.add_argument('--worker-id', help='Identificador deste worker (padrão: <hostname>-<pid>).')
+    args = parser.parse_args()
+    sync_all_sheets(worker_id=args.worker_id)
@@ -0,0 +1,47 @@
+"""
+Worker que executa os processamentos de planilha enfileirados pela rota
+process_sheet (app/tarefas.py) e apaga, em lotes, os dados dos formulários
+removidos pela rota remove_sheet (app/remocao.py). Vários workers podem rodar ao
+mesmo tempo, na mesma máquina ou em máquinas diferentes; no SQLite rode um único worker.
+
+Uso:
+    python worker_tarefas.py                 # fica consultando a fila
+    python worker_tarefas.py --uma-vez       # esvazia a fila e as remoções e sai
+"""
+import argparse
+import time
+from app import create_app
+from app.remocao import purgar_removidas
+from app.sincronizacao import gerar_worker_id
+from app.tarefas import processar_pendentes
+
+
+def executar(app=None, worker_id=None, uma_vez=False):
+    app = app or create_app()
+    worker_id = worker_id or gerar_worker_id()
+    intervalo = app.config['TAREFAS_INTERVALO_SEGUNDOS']
+    lotes_por_ciclo = None if uma_vez else app.config['REMOCAO_LOTES_POR_CICLO']
+    print(f"--- WORKER DE TAREFAS '{worker_id}' INICIADO ---")
+    try:
+        while True:
+            with app.app_context():
+                executadas = processar_pendentes(worker_id)
+                lotes = purgar_removidas(lotes_por_ciclo)
+            if executadas:
+                print(f"{executadas} tarefas executadas.")
+            if uma_vez:
+                break
+            # Ainda há remoções pendentes: volta logo, depois de conferir a fila de tarefas
+            if lotes < lotes_por_ciclo:
+                time.sleep(intervalo)
+    except KeyboardInterrupt:
+        pass
+    print(f"--- WORKER DE TAREFAS '{worker_id}' FINALIZADO ---")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Executa os processamentos de planilha enfileirados.')
+    parser.add_argument('--worker-id', help='Identificador deste worker (padrão: <hostname>-<pid>).')
+    parser.add_argument('--uma-vez', action='store_true', help='Esvazia a fila e as remoções e sai, sem esperar novas tarefas.')
+    args = parser.parse_args()
+    executar(worker_id=args.worker_id, uma_vez=args.uma_vez)